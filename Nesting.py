@@ -1,32 +1,195 @@
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QGraphicsView, QGraphicsScene, QGraphicsRectItem, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QGraphicsView, QGraphicsScene,
                             QVBoxLayout, QWidget, QPushButton, QHBoxLayout, QLabel, QGridLayout, 
                             QScrollArea, QCheckBox, QGroupBox, QFileDialog, QFrame, QComboBox,
-                            QMessageBox)
-from PyQt5.QtCore import Qt, QSizeF
-from PyQt5.QtGui import QPen, QColor, QPainter
-from PyQt5.QtPrintSupport import QPrinter
+                            QMessageBox, QGraphicsItem, QStyleOptionGraphicsItem)
+from PyQt5.QtCore import Qt, QRectF, QPointF, QThread, pyqtSignal
+from PyQt5.QtGui import QPen, QColor, QStaticText
+from collections import OrderedDict
+import html
 import json
+import os
 import random
 
+from NestingEngine import (TICKS_POR_PULGADA, SORT_CRITERIA, Sheet, NestOptions, NestCancelled,
+                           load_json, load_pieces, load_stock, apply_grain, nest_best, renest, group_pieces,
+                           nest_by_material, nest_each_group, lower_bounds)
+from NestingOptimizer import optimize
+from NestingCache import CARPETA_CACHE, NestCache
+from NestingPdf import export_pdf
+from NestingDxf import export_dxf
+from NestingGcode import Router, export_gcode, panel_minutes
+from NestingRemnants import ARCHIVO_RETAZOS, RemnantStore
+
+# Escenas que se mantienen construidas; el resto se construye al mostrarlas
+MAX_ESCENAS = 8
+
+# Escala mínima de la vista a la que se dibujan las etiquetas de las piezas
+LOD_TEXTO = 0.4
+
+# Materiales en existencia de MaterialManager (medidas de lámina y precios)
+ARCHIVO_MATERIALES = "materiales.json"
+
+
+class PanelItem(QGraphicsItem):
+    """Dibuja un panel completo (piezas, etiquetas, huecos y borde) en un solo paint().
+
+    Sustituye a un QGraphicsRectItem y un texto por pieza: las piezas se
+    guardan como rectángulos agrupados por tipo y se pintan con una
+    llamada a drawRects por grupo. Las etiquetas se preparan una vez por
+    texto distinto con QStaticText y no se dibujan con la vista alejada.
+    """
+
+    def __init__(self, placements, rows, utilization, width, height, k):
+        super().__init__()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.width = width
+        self.height = height
+        self.utilization_text = QStaticText(f"Utilización: {utilization:.1f}%")
+
+        # Rectángulos por tipo de pieza y etiqueta de cada pieza, en píxeles
+        self.rects_by_name = {}
+        self.labels = []
+        for x, y, pw, ph, aw, ah, nombre, rotated, gabinete_id in placements:
+            rect = QRectF(x * k, y * k, pw * k, ph * k)
+            self.rects_by_name.setdefault(nombre, []).append(rect)
+            rot_text = " (Rotada)" if rotated else ""
+            self.labels.append((rect, f"{nombre}{rot_text}\nGabinete {gabinete_id}\n{aw:.1f} x {ah:.1f}"))
+
+        # Color consistente para cada tipo de pieza
+        self.colors = {nombre: QColor.fromHsv(hash(nombre) % 360, 10, 10, 10) for nombre in self.rects_by_name}
+
+        # Espacios libres de las filas (para depuración)
+        self.spaces = [QRectF(space_x * k, row_y * k, space_width * k, row_height * k)
+                       for row_y, row_height, row_spaces in rows
+                       for space_x, space_width in row_spaces if space_width > 0]
+
+        self.static_texts = {}  # Texto de etiqueta -> QStaticText ya maquetado
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def static_text(self, label):
+        """Devuelve la maquetación de la etiqueta, creándola la primera vez"""
+        static = self.static_texts.get(label)
+        if static is None:
+            static = QStaticText(html.escape(label).replace("\n", "<br>"))
+            static.setTextFormat(Qt.RichText)
+            self.static_texts[label] = static
+        return static
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+
+        # Piezas: una llamada por tipo
+        painter.setPen(QPen(Qt.black, 1))
+        for nombre, rects in self.rects_by_name.items():
+            painter.setBrush(self.colors[nombre])
+            painter.drawRects(rects)
+
+        # Espacios libres
+        painter.setBrush(Qt.NoBrush)
+        painter.setPen(QPen(Qt.blue, 1, Qt.DotLine))
+        painter.drawRects(self.spaces)
+
+        # Etiquetas centradas, solo si se pueden leer y están a la vista
+        painter.setPen(Qt.black)
+        if lod >= LOD_TEXTO:
+            for rect, label in self.labels:
+                if not rect.intersects(exposed):
+                    continue
+                static = self.static_text(label)
+                size = static.size()
+                painter.drawStaticText(QPointF(rect.center().x() - size.width() / 2,
+                                               rect.center().y() - size.height() / 2), static)
+
+        painter.drawStaticText(QPointF(10, 10), self.utilization_text)
+
+        # Borde del panel
+        painter.setPen(QPen(Qt.red, 1))
+        painter.drawRect(self.boundingRect())
+
+
+class NestingWorker(QThread):
+    """Ejecuta una tarea de nesting fuera del hilo de la interfaz.
+
+    La tarea recibe el propio worker: avisa del progreso con ``report``,
+    que lanza ``NestCancelled`` si se pidió cancelar, y el optimizador
+    consulta ``is_cancelled`` para terminar con la mejor solución hallada.
+    """
+    progress = pyqtSignal(int, int, int, float)  # Hechas, total, paneles, utilización
+    improved = pyqtSignal(object)  # Mejor NestResult del optimizador hasta ahora
+    finished_result = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.cancel_requested = False
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def is_cancelled(self):
+        return self.cancel_requested
+
+    def report(self, done, total, panels, utilization):
+        if self.cancel_requested:
+            raise NestCancelled()
+        self.progress.emit(done, total, panels, utilization)
+
+    def run(self):
+        try:
+            result = self.job(self)
+        except NestCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished_result.emit(result)
+
+
 class NestingWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Panel Nesting Optimizer")
         
         self.inches_to_pixels = 16
-        self.panel_width = 96.5 * self.inches_to_pixels
-        self.panel_height = 48.5 * self.inches_to_pixels
+        self.sheet = Sheet(96.5, 48.5)
+        self.stock = self.load_stock(ARCHIVO_MATERIALES)  # Láminas en existencia por material
+        self.remnant_store = RemnantStore(ARCHIVO_RETAZOS)  # Sobrantes de trabajos anteriores
 
-        self.panels = []
+        self.scenes = OrderedDict()  # Escenas construidas por panel, de la menos a la más usada
+        self.router_minutes = {}  # Minutos de router de cada panel ya mostrado
         self.panel_pieces = []  # Lista de piezas para cada panel
         self.panel_free_spaces = []  # Lista de espacios libres para cada panel
         self.panel_utilization = []  # Porcentaje de utilización de cada panel
         self.panel_rows = []  # Lista de filas para cada panel
+        self.panel_cut_length = []  # Longitud de corte de cada panel (guillotina)
+        self.panel_repositionings = []  # Reposicionamientos de sierra de cada panel
+        self.nest_variant = {}  # Criterio y rotación ganadores en modo "Mejor de todos"
+        self.nest_result = None  # Último resultado, para el reanidado incremental
+        self.nest_settings = None  # Criterio, estrategia y tiempo con que se obtuvo
+        self.nest_cache = NestCache(CARPETA_CACHE)  # Resultados ya calculados
+        self.worker = None  # NestingWorker en marcha
+        self.export_worker = None  # NestingWorker de la exportación en marcha
+        self.router = Router()  # Parámetros del router CNC para el G-code
+        self.refresh_pending = None  # Repetir el nesting al terminar el actual; True si puede ser incremental
+        self.pending_cache_key = None  # Clave y ajustes del nesting en marcha
+        self.pending_settings = None
         self.current_panel_index = 0
 
         # Criterio de ordenación de piezas
         self.sort_criteria = "area_desc"  # Por defecto, ordenar por área descendente
 
+        # Estrategia de colocación (ver NestingEngine.ESTRATEGIAS)
+        self.strategy = "filas"
+
+        # Segundos del optimizador de orden y rotación (0 = desactivado)
+        self.time_budget = 0
+
         # Diccionarios para las selecciones de piezas
         self.all_pieces = set()  # Nombres únicos de todas las piezas
         self.add_pieces = set([
@@ -84,10 +247,64 @@ class NestingWindow(QMainWindow):
         self.sort_combo.addItem("Ancho (Menor a mayor)", "width_asc")
         self.sort_combo.addItem("Alto (Mayor a menor)", "height_desc")
         self.sort_combo.addItem("Alto (Menor a mayor)", "height_asc")
+        self.sort_combo.addItem("Mejor de todos (paralelo)", "best_of")
         self.sort_combo.currentIndexChanged.connect(self.update_sort_criteria)
         sort_layout.addWidget(self.sort_combo)
         left_layout.addLayout(sort_layout)
 
+        # ComboBox para seleccionar la estrategia de colocación
+        strategy_layout = QHBoxLayout()
+        strategy_layout.addWidget(QLabel("Estrategia:"))
+        self.strategy_combo = QComboBox()
+        self.strategy_combo.addItem("Filas y columnas", "filas")
+        self.strategy_combo.addItem("MaxRects (lado corto)", "maxrects_bssf")
+        self.strategy_combo.addItem("MaxRects (área)", "maxrects_baf")
+        self.strategy_combo.addItem("MaxRects (abajo-izquierda)", "maxrects_bl")
+        self.strategy_combo.addItem("Skyline (pedidos grandes)", "skyline")
+        self.strategy_combo.addItem("Guillotina (sierra de paneles)", "guillotina")
+        self.strategy_combo.currentIndexChanged.connect(self.update_strategy)
+        strategy_layout.addWidget(self.strategy_combo)
+        left_layout.addLayout(strategy_layout)
+
+        # ComboBox para el tiempo del optimizador (0 = solo nesting voraz)
+        optimizer_layout = QHBoxLayout()
+        optimizer_layout.addWidget(QLabel("Optimizar:"))
+        self.optimizer_combo = QComboBox()
+        self.optimizer_combo.addItem("No", 0)
+        self.optimizer_combo.addItem("5 segundos", 5)
+        self.optimizer_combo.addItem("60 segundos", 60)
+        self.optimizer_combo.currentIndexChanged.connect(self.update_time_budget)
+        optimizer_layout.addWidget(self.optimizer_combo)
+        left_layout.addLayout(optimizer_layout)
+
+        # Al cambiar gabinetes o piezas, reanidar solo los paneles afectados
+        self.incremental_checkbox = QCheckBox("Reanidado incremental")
+        self.incremental_checkbox.setChecked(True)
+        left_layout.addWidget(self.incremental_checkbox)
+
+        # Elegir entre las láminas de materiales.json la combinación más barata
+        self.stock_checkbox = QCheckBox("Láminas y precios de materiales.json")
+        self.stock_checkbox.setEnabled(bool(self.stock))
+        self.stock_checkbox.stateChanged.connect(self.refresh_panels)
+        left_layout.addWidget(self.stock_checkbox)
+
+        # Dejar que el motor gire las piezas de materiales sin veta (Grano)
+        self.grain_checkbox = QCheckBox("Giro automático en materiales sin veta")
+        self.grain_checkbox.setEnabled(bool(self.stock))
+        self.grain_checkbox.stateChanged.connect(self.refresh_panels)
+        left_layout.addWidget(self.grain_checkbox)
+
+        # Llenar primero los retazos guardados de trabajos anteriores
+        self.remnants_checkbox = QCheckBox(f"Usar retazos guardados ({len(self.remnant_store)})")
+        self.remnants_checkbox.setChecked(True)
+        self.remnants_checkbox.stateChanged.connect(self.refresh_panels)
+        left_layout.addWidget(self.remnants_checkbox)
+
+        # Contar fases y validaciones del motor de filas para ver por qué un trabajo es lento
+        self.stats_checkbox = QCheckBox("Estadísticas del motor")
+        self.stats_checkbox.stateChanged.connect(self.refresh_panels)
+        left_layout.addWidget(self.stats_checkbox)
+
         # Grupo de selección de gabinetes
         gabinete_group = QGroupBox("Selección de Gabinetes")
         self.gabinete_layout = QGridLayout()
@@ -112,6 +329,12 @@ class NestingWindow(QMainWindow):
         self.next_button = QPushButton("Siguiente Panel")
         self.refresh_button = QPushButton("Refrescar")
         self.export_button = QPushButton("Exportar")
+        self.cancel_button = QPushButton("Cancelar")
+        self.cancel_button.setEnabled(False)
+        self.remnants_button = QPushButton("Trabajo cortado: guardar retazos")
+        self.remnants_button.setEnabled(False)
+        self.stats_button = QPushButton("Guardar estadísticas")
+        self.stats_button.setEnabled(False)
         self.exit_button = QPushButton("Salir")
         self.load_json_button = QPushButton("Cargar JSON")
 
@@ -119,8 +342,11 @@ class NestingWindow(QMainWindow):
         action_layout.addWidget(self.next_button, 0, 1)
         action_layout.addWidget(self.refresh_button, 1, 0)
         action_layout.addWidget(self.export_button, 1, 1)
-        action_layout.addWidget(self.exit_button, 2, 0, 1, 2)
-        action_layout.addWidget(self.load_json_button, 3, 0, 1, 2)
+        action_layout.addWidget(self.remnants_button, 2, 0, 1, 2)
+        action_layout.addWidget(self.stats_button, 3, 0, 1, 2)
+        action_layout.addWidget(self.cancel_button, 4, 0, 1, 2)
+        action_layout.addWidget(self.exit_button, 5, 0, 1, 2)
+        action_layout.addWidget(self.load_json_button, 6, 0, 1, 2)
 
         left_layout.addLayout(action_layout)
 
@@ -128,6 +354,10 @@ class NestingWindow(QMainWindow):
         self.next_button.clicked.connect(self.show_next_panel)
         self.refresh_button.clicked.connect(self.refresh_panels)
         self.export_button.clicked.connect(self.export_panels)
+        self.remnants_button.clicked.connect(self.register_remnants)
+        self.stats_button.clicked.connect(self.save_stats)
+        self.cancel_button.clicked.connect(self.cancel_nesting)
+        self.cancel_button.clicked.connect(self.cancel_export)
         self.exit_button.clicked.connect(self.close)
         self.load_json_button.clicked.connect(self.load_new_json_file)
 
@@ -158,6 +388,8 @@ class NestingWindow(QMainWindow):
                 "Trasera",
             ]
             self.selected_gabinetes.clear()
+            self.cancel_nesting()  # El nesting en marcha es del proyecto anterior
+            self.nest_result = None  # Proyecto nuevo: anidar desde cero
             self.extract_piece_names()
             self.extract_gabinete_ids()
             self.update_piece_checkboxes()
@@ -217,6 +449,14 @@ class NestingWindow(QMainWindow):
         self.sort_criteria = self.sort_combo.currentData()
         # Opcionalmente, puedes refrescar los paneles automáticamente
         # self.refresh_panels()
+
+    def update_strategy(self, index):
+        """Actualiza la estrategia de colocación cuando se cambia en el ComboBox"""
+        self.strategy = self.strategy_combo.currentData()
+
+    def update_time_budget(self, index):
+        """Actualiza el tiempo del optimizador cuando se cambia en el ComboBox"""
+        self.time_budget = self.optimizer_combo.currentData()
         
     def update_selected_gabinetes(self):
         """Actualiza la lista de gabinetes seleccionados basado en checkboxes"""
@@ -224,6 +464,7 @@ class NestingWindow(QMainWindow):
         for gabinete_id, checkbox in self.gabinete_checkboxes.items():
             if checkbox.isChecked():
                 self.selected_gabinetes.add(gabinete_id)
+        self.refresh_incremental()
 
     def load_json_data(self, filepath):
         """Carga datos del archivo JSON"""
@@ -238,6 +479,59 @@ class NestingWindow(QMainWindow):
             print(f"Error al cargar archivo JSON: {e}")
             return []
 
+    def load_stock(self, filepath):
+        """Carga las láminas en existencia; sin archivo se usa solo la lámina por defecto"""
+        if not os.path.exists(filepath):
+            return []
+        try:
+            return load_stock(load_json(filepath))
+        except (OSError, ValueError) as e:
+            print(f"Error al cargar los materiales: {e}")
+            return []
+
+    def register_remnants(self):
+        """Da por cortado el trabajo actual: gasta sus retazos y guarda sus sobrantes"""
+        if self.nest_result is None:
+            return
+        used, added = self.remnant_store.register(self.nest_result)
+        self.remnants_button.setEnabled(False)
+        self.remnants_checkbox.setText(f"Usar retazos guardados ({len(self.remnant_store)})")
+        QMessageBox.information(self, "Retazos Guardados",
+                                f"Retazos usados: {used}\nRetazos nuevos: {added}\n"
+                                f"En inventario: {len(self.remnant_store)}")
+
+    def save_stats(self):
+        """Guarda en JSON las estadísticas del motor del resultado actual"""
+        if self.nest_result is None or self.nest_result.stats is None:
+            return
+        file_name, _ = QFileDialog.getSaveFileName(self, "Guardar estadísticas", "estadisticas_nesting.json",
+                                                   "Archivos JSON (*.json)")
+        if not file_name:
+            return
+        report = {
+            'estrategia': self.strategy,
+            'sort_criteria': self.sort_criteria,
+            'piezas': self.nest_result.piece_count,
+            'paneles': self.nest_result.panel_count,
+            'utilizacion': self.nest_result.total_utilization,
+            **self.nest_result.stats.to_dict(),
+        }
+        try:
+            with open(file_name, 'w') as file:
+                json.dump(report, file, indent=2)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"No se pudieron guardar las estadísticas: {e}")
+
+    def selected_remnants(self, pieces):
+        """Retazos a llenar antes de abrir láminas, o None si no se usan"""
+        if not self.remnants_checkbox.isChecked():
+            return None
+        return self.remnant_store.remnants_for(group_pieces(pieces)) or None
+
+    def selected_stock(self):
+        """Láminas entre las que elegir, o None para anidar todo en self.sheet"""
+        return self.stock if self.stock_checkbox.isChecked() else None
+
     def extract_piece_names(self):
         """Extrae todos los nombres únicos de piezas del JSON"""
         for pieza in self.piezas:
@@ -260,6 +554,7 @@ class NestingWindow(QMainWindow):
         
         # Actualizar checkboxes de piezas girables para mostrar solo piezas incluidas
         self.update_rotatable_checkboxes()
+        self.refresh_incremental()
 
     def update_rotatable_checkboxes(self):
         """Actualiza visibilidad de checkboxes para piezas girables"""
@@ -273,502 +568,366 @@ class NestingWindow(QMainWindow):
         for piece_name, checkbox in self.rotatable_checkboxes.items():
             if checkbox.isChecked() and piece_name not in self.add_pieces:
                 self.piezas_girables.append(piece_name)
+        self.refresh_incremental()
+
+    def refresh_incremental(self):
+        """Refresca al momento tras un cambio de selección si el modo incremental está activo"""
+        if self.incremental_checkbox.isChecked() and self.nest_result is not None:
+            self.start_nesting(incremental=True)
 
     def load_pieces_from_json(self, json_data):
         """Procesa los datos JSON para extraer las piezas considerando selecciones de usuario"""
-        pieces = []
-        
-        # Crear un diccionario para mapear el ID del gabinete a su cantidad
-        cantidad_por_gabinete = {gabinete['ID']: gabinete['Cantidad'] for gabinete in self.gabinetes}
-        
-        for pieza in self.piezas:
-            nombre = pieza.get('nombre')
-            if nombre in self.add_pieces:
-                continue
-            ancho = pieza.get('ancho')
-            alto = pieza.get('alto')
-            gabinete_id = pieza.get('gabinete_id')
-            
-            # Obtener la cantidad de piezas para este gabinete
-            cantidad = cantidad_por_gabinete.get(gabinete_id, 1)  # Si no existe, se asume 1
-            
-            if ancho and alto and gabinete_id in self.selected_gabinetes:
-                # Verificar si se debe rotar la pieza
-                if nombre in self.piezas_girables:
-                    ancho, alto = alto, ancho
-                
-                # Multiplicar la pieza por la cantidad del gabinete
-                for _ in range(cantidad):
-                    pieces.append({
-                        "width": ancho,
-                        "height": alto,
-                        "nombre": nombre,
-                        "gabinete_id": gabinete_id
-                    })
-        
+        pieces = load_pieces(
+            {"gabinetes": self.gabinetes, "piezas": self.piezas},
+            ignored_pieces=self.add_pieces,
+            selected_gabinetes=self.selected_gabinetes,
+            piezas_girables=self.piezas_girables,
+        )
+        if self.grain_checkbox.isChecked():
+            # El motor decide el giro de las piezas de materiales sin veta
+            pieces = apply_grain(pieces, self.stock)
         return pieces
 
     def refresh_panels(self):
-        """Actualiza los paneles según las selecciones actuales"""
-        # Reiniciar datos de paneles
-        self.panels = []
-        self.panel_pieces = []
-        self.panel_utilization = []
-        self.panel_rows = []
-        self.panel_structure = []
-        
+        """Actualiza los paneles según las selecciones actuales, anidando desde cero"""
+        self.start_nesting(incremental=False)
+
+    def start_nesting(self, incremental):
+        """Anida las piezas seleccionadas; ``incremental`` permite reempacar solo los paneles afectados"""
+        if self.worker is not None:
+            # Ya hay un nesting en marcha: repetirlo con las selecciones nuevas al
+            # terminar, desde cero si alguna de las peticiones lo era
+            self.refresh_pending = incremental and self.refresh_pending is not False
+            return
+
         # Procesar piezas del JSON con las selecciones actuales
         pieces = self.load_pieces_from_json(self.json_data)
         
         # Ejecutar algoritmo de optimización
-        self.optimize_panels(pieces)
-        self.update_panels()
-        
-        # Mostrar primer panel
-        if self.panels:
-            self.show_panel(0)
-        else:
-            self.info_label.setText("No hay paneles para mostrar")
+        self.optimize_panels(pieces, incremental)
             
     def export_panels(self):
-        """Exporta los paneles actuales a un archivo PDF"""
+        """Exporta los paneles actuales a PDF, DXF o G-code (router CNC) en segundo plano"""
+        if self.nest_result is None or self.export_worker is not None:
+            return
         options = QFileDialog.Options()
-        fileName, _ = QFileDialog.getSaveFileName(self, "Guardar PDF", "", 
-                                                "Archivos PDF (*.pdf);;Todos los archivos (*)", 
+        fileName, selected_filter = QFileDialog.getSaveFileName(self, "Exportar paneles", "", 
+                                                "Archivos PDF (*.pdf);;Archivos DXF (*.dxf);;G-code, un archivo por panel (*.nc);;Todos los archivos (*)", 
                                                 options=options)
         if fileName:
-            # Asegurarse de que el nombre del archivo termine en .pdf
-            if not fileName.lower().endswith('.pdf'):
-                fileName += '.pdf'
-            
-            # Importar los módulos necesarios para generar PDF
-            from PyQt5.QtPrintSupport import QPrinter
-            from PyQt5.QtGui import QPainter
-            from PyQt5.QtCore import QSizeF  # Importación correcta para QSizeF
-            
-            # Crear una instancia de QPrinter configurada para PDF
-            printer = QPrinter(QPrinter.HighResolution)
-            printer.setOutputFormat(QPrinter.PdfFormat)
-            printer.setOutputFileName(fileName)
-            
-            # Configurar el tamaño de página para que se ajuste a nuestros paneles
-            # Convertir de píxeles a milímetros (QPrinter usa milímetros)
-            width_mm = self.panel_width / self.inches_to_pixels * 25.4  # 1 pulgada = 25.4 mm
-            height_mm = self.panel_height / self.inches_to_pixels * 25.4
-            
-            printer.setPageSize(QPrinter.Custom)
-            printer.setPageSizeMM(QSizeF(width_mm, height_mm))  # Usando QSizeF sin QtCore.
-            
-            # Crear un QPainter para dibujar en el PDF
-            painter = QPainter()
-            success = painter.begin(printer)
-            
-            if success:
-                try:
-                    # Dibujar cada panel en una página diferente
-                    for i, scene in enumerate(self.panels):
-                        # Si no es la primera página, añadir una nueva página
-                        if i > 0:
-                            printer.newPage()
-                        
-                        # Dibujar la escena actual
-                        scene.render(painter)
-                        
-                        # Añadir información adicional en la parte superior
-                        painter.save()
-                        font = painter.font()
-                        font.setPointSize(12)
-                        painter.setFont(font)
-                        
-                        utilization = self.panel_utilization[i] if i < len(self.panel_utilization) else 0
-                        title_text = f"Panel {i+1} de {len(self.panels)} | Utilización: {utilization:.1f}%"
-                        
-                        # Dibujar el texto de información en la parte superior
-                        painter.drawText(10, 20, title_text)
-                        painter.restore()
-                    
-                    # Finalizar la operación de dibujo
-                    painter.end()
-                    
-                    # Mostrar mensaje de éxito
-                    from PyQt5.QtWidgets import QMessageBox
-                    QMessageBox.information(self, "Exportación Exitosa", 
-                                        f"Los paneles han sido exportados exitosamente a:\n{fileName}")
-                    
-                except Exception as e:
-                    painter.end()
-                    from PyQt5.QtWidgets import QMessageBox
-                    QMessageBox.critical(self, "Error de Exportación", 
-                                    f"Error al generar el PDF: {e}")
-            else:
-                from PyQt5.QtWidgets import QMessageBox
-                QMessageBox.critical(self, "Error", "No se pudo iniciar la generación del PDF.")
-
-    def optimize_panels(self, pieces):
-        # Ordenar las piezas según el criterio seleccionado
-        if self.sort_criteria == "area_desc":
-            pieces.sort(key=lambda p: (p['height'] * p['width'], p['width']), reverse=True)
-        elif self.sort_criteria == "area_asc":
-            pieces.sort(key=lambda p: (p['height'] * p['width'], p['height']), reverse=False)
-        elif self.sort_criteria == "width_desc":
-            pieces.sort(key=lambda p: p['width'], reverse=True)
-        elif self.sort_criteria == "width_asc":
-            pieces.sort(key=lambda p: p['width'], reverse=False)
-        elif self.sort_criteria == "height_desc":
-            pieces.sort(key=lambda p: p['height'], reverse=True)
-        elif self.sort_criteria == "height_asc":
-            pieces.sort(key=lambda p: p['height'], reverse=False)
-        
-        # Inicializamos las listas para paneles
-        self.panel_pieces = []  # Lista para almacenar las piezas colocadas en cada panel
-        self.panel_utilization = []  # Lista para almacenar el porcentaje de utilización de cada panel
-        self.panel_structure = []
-
-        for piece in pieces:
-            # Convertir dimensiones de pulgadas a píxeles
-            separator = 0.125 * self.inches_to_pixels
-            piece_width = piece['width'] * self.inches_to_pixels
-            piece_height = piece['height'] * self.inches_to_pixels
-            nombre = piece['nombre']
-            gabinete_id = piece['gabinete_id']
-            rotated = nombre in self.piezas_girables
-
-            # Variables para el mejor lugar encontrado
-            best_fit = {
-                'panel_idx': -1,
-                'row_idx': -1,
-                'col_idx': -1,
-                'position': None,
-                'y': float('inf')  # Priorizar posiciones más altas
-            }
-            
-        
-            # 1. Buscar en espacios existentes PRIORIZANDO COLUMNAS
-            for panel_idx, panel in enumerate(self.panel_structure):
-                for row_idx, row in enumerate(panel):
-                    row_y = row['y']
-                    row_height = row['height']
-                    
-                    # Verificar si la pieza cabe en la altura de la fila
-                    if piece_height <= row_height:
-                        for col_idx, col in enumerate(row['columns']):
-                            col_x = col['x']
-                            col_width = self.panel_width
-                            
-                            # Verificar si la pieza cabe en el ancho de la columna
-                            if piece_width <= col_width:
-                                # Verificar si la posición es válida sin colisiones
-                                if self.is_position_valid(panel_idx, col_x, row_y, piece_width, piece_height, col_limit=(col_x, col_width), row_limit=(row_y, row_height)):
-                                    # Evaluar si es la mejor posición encontrada
-                                    if row_y < best_fit['y']:
-                                        best_fit = {
-                                            'panel_idx': panel_idx,
-                                            'row_idx': row_idx,
-                                            'col_idx': col_idx,
-                                            'position': (col_x, row_y, piece_width, piece_height),
-                                            'y': row_y
-                                        }
-
-                                break
-                    
-                    
-                    if best_fit['panel_idx'] != -1:
-                        break
-                
-                # Si ya encontramos un espacio, salir del bucle de paneles
-                if best_fit['panel_idx'] != -1:
-                    break
-            
-            # 2. Si no encontramos espacio en columnas existentes
-            if best_fit['panel_idx'] == -1:
-                # Intentar crear una nueva columna en filas existentes
-                for panel_idx, panel in enumerate(self.panel_structure):
-                    for row_idx, row in enumerate(panel):
-                        # Calcular espacio disponible para nueva columna
-                        total_columns_width = sum(col['width'] for col in row['columns'])
-                        if total_columns_width + piece_width <= self.panel_width:
-                            # Crear nueva columna en la fila
-                            nueva_columna_x = (row['columns'][-1]['x'] + row['columns'][-1]['width']) if row['columns'] else 0
-                            
-                            if self.is_position_valid(panel_idx, nueva_columna_x, row_y, piece_width, piece_height, col_limit=(nueva_columna_x, piece_width), row_limit=(row_y, row_height)):
-                                best_fit = {
-                                    'panel_idx': panel_idx,
-                                    'row_idx': row_idx,
-                                    'col_idx': -1,  # Nueva columna
-                                    'position': (nueva_columna_x, row['y'], piece_width, piece_height),
-                                    'y': row['y']
-                                }
-                                break
-                    
-                    if best_fit['panel_idx'] != -1:
-                        break
-            
-            # 3. Si aún no encontramos espacio, crear nueva fila
-            if best_fit['panel_idx'] == -1:
-                for panel_idx, panel in enumerate(self.panel_structure):
-                    # Calcular posición Y para nueva fila
-                    max_y = max(row['y'] + row['height'] + separator for row in panel) if panel else 0
-                    
-                    if max_y + piece_height <= self.panel_height:
-                        if self.is_position_valid(panel_idx, 0, max_y, piece_width, piece_height):
-                            best_fit = {
-                                'panel_idx': panel_idx,
-                                'row_idx': -1,  # Nueva fila
-                                'col_idx': -1,
-                                'position': (0, max_y, piece_width, piece_height),
-                                'y': max_y
-                            }
-                            break
-            
-            # 4. Si no hay espacio, crear nuevo panel
-            if best_fit['panel_idx'] == -1:
-                self.panel_pieces.append([])
-                self.panel_utilization.append(0)
-                self.panel_structure.append([])
-                
-                best_fit = {
-                    'panel_idx': len(self.panel_pieces) - 1,
-                    'row_idx': -1,
-                    'col_idx': -1,
-                    'position': (0, 0, piece_width, piece_height),
-                    'y': 0
-                }
-            
-            # Colocar pieza
-            panel_idx = best_fit['panel_idx']
-            x, y, pw, ph = best_fit['position']
-            
-            # Añadir pieza al panel
-            self.panel_pieces[panel_idx].append((x, y, pw, ph, piece['width'], piece['height'], piece['nombre'], rotated, gabinete_id))
-            
-            # Actualizar estructura
-            if best_fit['row_idx'] >= 0 and best_fit['col_idx'] >= 0:
-                # Pieza en columna existente
-                self._update_existing_space(panel_idx, best_fit['row_idx'], best_fit['col_idx'], x, y, pw, ph)
-            elif best_fit['row_idx'] >= 0:
-                # Nueva columna en fila existente
-                row = self.panel_structure[panel_idx][best_fit['row_idx']]
-                row['columns'].append({
-                    'x': x,
-                    'width': pw,
-                    'max_height': ph
-                })
+            # El formato sale de la extensión o, si no la tiene, del filtro elegido
+            extension = os.path.splitext(fileName)[1].lower()
+            if extension not in ('.pdf', '.dxf', '.nc'):
+                extension = '.dxf' if 'DXF' in selected_filter else '.nc' if 'G-code' in selected_filter else '.pdf'
+                fileName += extension
+            if extension == '.nc':
+                # Un archivo <nombre>_NNN.nc por panel
+                router = self.router
+                basename = fileName[:-len(extension)]
+                def export(result, fileName, progress):
+                    return export_gcode(result, basename, router, progress)
             else:
-                # Nueva fila
-                self._create_new_row(panel_idx, x, y, pw, ph)
-            
-        # Calcular utilización y convertir estructura
-        self._calculate_utilization()
-        self._convert_structure_to_panel_rows()
-        
-    def is_position_valid(self, panel_idx, x, y, width, height, col_limit=None, row_limit=None):
-        """Verifica si una posición está libre de colisiones y dentro de los límites de su fila y columna."""
-        
-        if panel_idx >= len(self.panel_pieces):
-            return True  # Panel nuevo, siempre válido
-        
-        # Validar límites del panel completo
-        if x < 0 or y < 0 or x + width > self.panel_width or y + height > self.panel_height:
-            return False
-
-        # Validar límites de la columna
-        if col_limit:
-            col_x, col_width = col_limit
-            if x < col_x or x + width > col_x + col_width:
-                return False
-
-        # Validar límites de la fila
-        if row_limit:
-            row_y, row_height = row_limit
-            if y < row_y or y + height > row_y + row_height:
-                return False
-
-        # Verificar colisiones con otras piezas
-        for px, py, pw, ph, _, _, _, _, _ in self.panel_pieces[panel_idx]:
-            if (x < px + pw and x + width > px and
-                y < py + ph and y + height > py):
-                return False
-
-        return True
-
-    def _update_existing_space(self, panel_idx, row_idx, col_idx, x, y, piece_width, piece_height):
-        """Actualiza los espacios después de colocar una pieza en un espacio existente."""
-        row = self.panel_structure[panel_idx][row_idx]
-        col = row['columns'][col_idx]
-        # Convertir 0.125 pulgadas a píxeles
-        separator = 0.125 * self.inches_to_pixels
-        
-        # 1. Actualizar columnas - espacios horizontales
-        new_columns = []
-        
-        # Espacio a la izquierda de la pieza
-        if x > col['x']:
-            new_columns.append({
-                'x': col['x'],
-                'width': x - col['x'],
-                'max_height': col['max_height']
-            })
-        
-        # Espacio a la derecha de la pieza
-        right_x = x + piece_width + separator
-        if right_x < col['x'] + col['width']:
-            new_columns.append({
-                'x': right_x,
-                'width': (col['x'] + col['width']) - right_x,
-                'max_height': col['max_height']
-            })
-        
-        # Mantener otras columnas en la fila
-        for i, other_col in enumerate(row['columns']):
-            if i != col_idx:
-                new_columns.append(other_col)
-        
-        # Actualizar columnas de la fila
-        row['columns'] = new_columns
-        
-        # 2. Crear espacio debajo de la pieza (nueva fila)
-        space_below_y = y + piece_height + separator
-        space_below_height = row['y'] + row['height'] - space_below_y
-        
-        if space_below_height > 0:
-            # Buscar si existe una fila en esa posición Y
-            existing_row_idx = -1
-            for idx, exist_row in enumerate(self.panel_structure[panel_idx]):
-                if abs(exist_row['y'] - space_below_y) < 1:  # Margen de error
-                    existing_row_idx = idx
-                    break
-            
-            if existing_row_idx >= 0:
-                # Añadir columna a la fila existente
-                self.panel_structure[panel_idx][existing_row_idx]['columns'].append({
-                    'x': x,
-                    'width': piece_width,
-                    'max_height': space_below_height
-                })
-            else:
-                # Crear nueva fila para el espacio debajo
-                new_row = {
-                    'y': space_below_y,
-                    'height': space_below_height,
-                    'columns': [{
-                        'x': x,
-                        'width': piece_width,
-                        'max_height': space_below_height
-                    }]
-                }
-                self.panel_structure[panel_idx].append(new_row)
-
-    def _create_new_row(self, panel_idx, x, y, piece_width, piece_height):
-        """Crea una nueva fila después de colocar una pieza, incluyendo una fila de 0.125 pulgadas."""
-        
-        # Convertir 0.125 pulgadas a píxeles
-        separator = 0.125 * self.inches_to_pixels
-
-        # 1. Crear la fila principal con la pieza
-        new_row = {
-            'y': y,
-            'height': piece_height,
-            'columns': []
-        }
-        
-        # Añadir espacio a la derecha de la pieza
-        remaining_width = self.panel_width - (x + piece_width)
-        if remaining_width > 0:
-            new_row['columns'].append({
-                'x': x + piece_width + separator,
-                'width': remaining_width,
-                'max_height': piece_height
-            })
-        
-        self.panel_structure[panel_idx].append(new_row)
-
-    def _calculate_utilization(self):
-        """Calcula el porcentaje de utilización de cada panel."""
-        self.panel_utilization = []  # Reiniciar para evitar duplicados
-        for i, pieces in enumerate(self.panel_pieces):
-            total_area = self.panel_width * self.panel_height
-            used_area = sum(p[2] * p[3] for p in pieces)  # Suma de áreas
-            utilization = (used_area / total_area) * 100
-            self.panel_utilization.append(utilization)
-
-    def _convert_structure_to_panel_rows(self):
-        """Convierte la estructura interna a formato panel_rows para compatibilidad."""
-        self.panel_rows = []
-        
-        for panel in self.panel_structure:
-            panel_rows = []
-            
-            for row in panel:
-                # Convertir columnas al formato esperado (x, width) para compatibilidad
-                compatible_columns = [(col['x'], col['width']) for col in row['columns']]
-                panel_rows.append((row['y'], row['height'], compatible_columns))
-            
-            self.panel_rows.append(panel_rows)
-        
-    def update_panels(self):
-        self.panels = []
-        for i, panel_pieces in enumerate(self.panel_pieces):
-            scene = QGraphicsScene()
-            scene.setSceneRect(0, 0, self.panel_width, self.panel_height)
-
-            # Asignar colores aleatorios para cada tipo de pieza
-            piece_colors = {}
-            
-            for x, y, pw, ph, aw, ah, nombre, rotated, gabinete_id in panel_pieces:
-                # Asignar un color consistente para cada tipo de pieza
-                if nombre not in piece_colors:
-                    h = hash(nombre) % 360
-                    piece_colors[nombre] = QColor.fromHsv(h, 10, 10, 10)
-                
-                rect = QGraphicsRectItem(x, y, pw, ph)
-                rect.setBrush(piece_colors[nombre])
-                rect.setPen(QPen(Qt.black, 1))
-                scene.addItem(rect)
-
-                rot_text = " (Rotada)" if rotated else ""
-                text = f"{nombre}{rot_text}\nGabinete {gabinete_id}\n{aw:.1f} x {ah:.1f}"
-                text_item = scene.addText(text)
-                text_item.setPos(x + pw / 2 - text_item.boundingRect().width() / 2,
-                                y + ph / 2 - text_item.boundingRect().height() / 2)
-
-            # Visualizar filas (opcional, para depuración)
-            if i < len(self.panel_rows):
-                for row_y, row_height, row_spaces in self.panel_rows[i]:
-                    # Dibujar el contorno de la fila
-                    row_rect = QGraphicsRectItem(0, row_y, self.panel_width, row_height)
-                    row_rect.setPen(QPen(Qt.blue, 1, Qt.DashLine))
-                    #scene.addItem(row_rect)
-                    
-                    # Dibujar los espacios libres en la fila
-                    for space_x, space_width in row_spaces:
-                        if space_width > 0:
-                            space_rect = QGraphicsRectItem(space_x, row_y, space_width, row_height)
-                            space_rect.setPen(QPen(Qt.blue, 1, Qt.DotLine))
-                            scene.addItem(space_rect)
-
-            # Mostrar porcentaje de utilización en cada panel
-            util_text = f"Utilización: {self.panel_utilization[i]:.1f}%"
-            util_item = scene.addText(util_text)
-            util_item.setPos(10, 10)  # Esquina superior izquierda
-
-            # Borde del panel
-            border = QGraphicsRectItem(0, 0, self.panel_width, self.panel_height)
-            border.setPen(QPen(Qt.red, 1))
-            scene.addItem(border)
-
-            self.panels.append(scene)
+                export = export_dxf if extension == '.dxf' else export_pdf
+
+            # Se escribe directamente desde las colocaciones, panel a panel,
+            # sin construir las escenas de los paneles
+            result = self.nest_result
+            self.export_file_name = fileName
+            self.export_worker = NestingWorker(
+                lambda worker: export(result, fileName,
+                                      lambda done, total: worker.report(done, total, total, 0.0)))
+            self.export_worker.progress.connect(self.show_export_progress)
+            self.export_worker.finished_result.connect(self.export_finished)
+            self.export_worker.cancelled.connect(self.export_cancelled)
+            self.export_worker.failed.connect(self.export_failed)
+            self.export_worker.finished.connect(self.export_worker_finished)
+            self.export_button.setEnabled(False)
+            self.cancel_button.setEnabled(True)
+            self.export_worker.start()
+
+    def show_export_progress(self, done, total, panels, utilization):
+        self.info_label.setText(f"Exportando... panel {done} de {total}")
+
+    def export_finished(self, stats):
+        self.show_panel(self.current_panel_index)
+        message = f"Los paneles han sido exportados exitosamente a:\n{self.export_file_name}"
+        if stats:
+            # G-code: tiempo de máquina estimado de todo el trabajo
+            message += f"\nTiempo estimado de router: {sum(s['minutos'] for s in stats):.1f} min"
+        QMessageBox.information(self, "Exportación Exitosa", message)
+
+    def export_cancelled(self):
+        self.show_panel(self.current_panel_index)
+        QMessageBox.warning(self, "Exportación Cancelada",
+                            f"El archivo quedó incompleto:\n{self.export_file_name}")
+
+    def export_failed(self, message):
+        QMessageBox.critical(self, "Error de Exportación", 
+                        f"Error al exportar los paneles: {message}")
+
+    def cancel_export(self):
+        """Pide a la exportación en marcha que se detenga"""
+        if self.export_worker is not None:
+            self.export_worker.cancel()
+
+    def export_worker_finished(self):
+        self.export_worker = None
+        self.export_button.setEnabled(True)
+        self.cancel_button.setEnabled(self.worker is not None)
+
+    def optimize_panels(self, pieces, incremental=False):
+        """Toma el resultado de la caché o lanza el motor de nesting en segundo plano"""
+        options = NestOptions(
+            sort_criteria=self.sort_criteria,
+            piezas_girables=self.piezas_girables,
+            strategy=self.strategy,
+            stats=self.stats_checkbox.isChecked(),
+        )
+        stock = self.selected_stock()
+        remnants = self.selected_remnants(pieces)
+        settings = (self.sort_criteria, self.strategy, self.time_budget, stock is not None,
+                    self.grain_checkbox.isChecked(), self.remnants_checkbox.isChecked(), options.stats)
+        mode = f"optimize:{self.time_budget}" if self.time_budget > 0 else self.sort_criteria
+        cache_key = self.nest_cache.key(pieces, self.sheet, options, mode, stock, remnants)
+
+        # Con las mismas entradas que un nesting anterior no hay nada que calcular
+        result = self.nest_cache.get(cache_key)
+        if result is not None:
+            self.apply_result(result, settings)
+            return
+
+        self.pending_cache_key = cache_key
+        self.pending_settings = settings
+        job = self.nesting_job(pieces, options, settings, remnants, incremental)
+        # El optimizador y "mejor de todos" anidan en self.sheet, no en las láminas del inventario
+        bound_stock = stock if self.time_budget <= 0 and self.sort_criteria != "best_of" else None
+        sheet = self.sheet
+
+        def complete_job(worker):
+            result = job(worker)
+            result.lower_bounds = lower_bounds(pieces, sheet, options, bound_stock)
+            return result
+
+        self.worker = NestingWorker(complete_job)
+        self.worker.progress.connect(self.show_nesting_progress)
+        self.worker.improved.connect(self.show_optimizer_progress)
+        self.worker.finished_result.connect(self.finish_nesting)
+        self.worker.cancelled.connect(self.nesting_cancelled)
+        self.worker.failed.connect(self.nesting_failed)
+        self.worker.finished.connect(self.worker_finished)
+        self.cancel_button.setEnabled(True)
+        self.info_label.setText("Anidando...")
+        self.worker.start()
+
+    def nesting_job(self, pieces, options, settings, remnants=None, incremental=False):
+        """Elige entre reanidado incremental, optimizador, "mejor de todos" o nesting simple.
+
+        El reanidado incremental solo se usa si se pide con ``incremental``
+        (cambios de selección); el botón Refrescar siempre anida desde cero.
+        Devuelve la tarea que ejecutará el NestingWorker; todo lo que lee de
+        la ventana se toma aquí, en el hilo de la interfaz.
+        """
+        sheet = self.sheet
+        stock = self.selected_stock()
+        if incremental and self.nest_result is not None and self.nest_settings == settings:
+            # Solo cambiaron gabinetes o piezas: reempacar los paneles afectados
+            if self.sort_criteria not in SORT_CRITERIA:
+                options.sort_criteria = "area_desc"
+            previous = self.nest_result
+            return lambda worker: renest(previous, pieces, sheet, options, worker.report, stock)
+        # Cada material y grosor se anida en sus propias láminas. El
+        # optimizador y "mejor de todos" no eligen medida ni usan retazos:
+        # anidan en self.sheet
+        if self.time_budget > 0:
+            # Buscar mejores órdenes y giros durante el tiempo elegido, repartido entre los grupos
+            time_budget = self.time_budget / len(group_pieces(pieces))
+            return lambda worker: nest_each_group(pieces, lambda group: optimize(
+                group, sheet, options, time_budget=time_budget, workers=os.cpu_count() or 1,
+                on_improve=worker.improved.emit, cancel=worker.is_cancelled))
+        if self.sort_criteria == "best_of":
+            # Probar todos los criterios y rotaciones usando todos los núcleos
+            return lambda worker: nest_each_group(pieces, lambda group: nest_best(
+                group, sheet, options, progress=worker.report))
+        return lambda worker: nest_by_material(pieces, sheet, options, progress=worker.report,
+                                               stock=stock, remnants=remnants)
+
+    def finish_nesting(self, result):
+        """Recibe el resultado del NestingWorker"""
+        # El reanidado incremental depende del resultado anterior, y el
+        # optimizador cancelado no buscó todo el tiempo pedido: no se guardan
+        cancelled = any(group.get('variant', {}).get('cancelado') for group in result.variant.get('grupos', []))
+        if result.variant.get('paneles_conservados') is None and not cancelled:
+            self.nest_cache.put(self.pending_cache_key, result)
+        self.apply_result(result, self.pending_settings)
+
+    def apply_result(self, result, settings):
+        """Guarda el resultado en la ventana y muestra los paneles"""
+        # Las escenas anteriores sirven para los paneles que el reanidado incremental conserva
+        previous_scenes = self.scenes
+        previous_minutes = self.router_minutes
+        self.nest_result = result
+        self.nest_settings = settings
+        self.nest_variant = result.variant
+        self.panel_pieces = result.panel_pieces
+        self.panel_utilization = result.panel_utilization
+        self.panel_structure = result.panel_structure
+        self.panel_rows = result.panel_rows
+        self.panel_cut_length = result.panel_cut_length
+        self.panel_repositionings = result.panel_repositionings
+        self.remnants_button.setEnabled(True)
+        self.stats_button.setEnabled(result.stats is not None)
+        self.update_panels(previous_scenes, previous_minutes)
+
+        # Tras un reanidado incremental seguir en el mismo panel
+        index = self.current_panel_index if 'paneles_conservados' in result.variant else 0
+        if self.panel_pieces:
+            self.show_panel(min(index, len(self.panel_pieces) - 1))
+        else:
+            self.info_label.setText("No hay paneles para mostrar")
+
+    def cancel_nesting(self):
+        """Pide al NestingWorker que se detenga"""
+        if self.worker is not None:
+            self.refresh_pending = None
+            self.worker.cancel()
+            self.info_label.setText("Cancelando...")
+
+    def nesting_cancelled(self):
+        """Vuelve a mostrar el último resultado tras cancelar"""
+        if self.panel_pieces:
+            self.show_panel(min(self.current_panel_index, len(self.panel_pieces) - 1))
+        else:
+            self.info_label.setText("Nesting cancelado")
+
+    def nesting_failed(self, message):
+        QMessageBox.critical(self, "Error de Nesting", f"Error al anidar las piezas: {message}")
+
+    def worker_finished(self):
+        """Libera el worker y, si hubo cambios mientras anidaba, vuelve a anidar"""
+        self.worker = None
+        self.cancel_button.setEnabled(self.export_worker is not None)
+        if self.refresh_pending is not None:
+            incremental = self.refresh_pending
+            self.refresh_pending = None
+            self.start_nesting(incremental)
+
+    def show_nesting_progress(self, done, total, panels, utilization):
+        """Muestra el avance del nesting en segundo plano"""
+        self.info_label.setText(f"Anidando... {done} de {total} | Paneles: {panels} | "
+                                f"Utilización: {utilization:.1f}%")
+
+    def show_optimizer_progress(self, result):
+        """Muestra la mejor solución encontrada hasta ahora por el optimizador"""
+        self.info_label.setText(f"Optimizando... mejor: {result.panel_count} paneles | "
+                                f"Utilización media: {result.total_utilization:.1f}%")
+
+    def closeEvent(self, event):
+        """Detiene el nesting y la exportación en marcha antes de cerrar la ventana"""
+        if self.worker is not None:
+            self.cancel_nesting()
+            self.worker.wait()
+        if self.export_worker is not None:
+            self.cancel_export()
+            self.export_worker.wait()
+        super().closeEvent(event)
+
+    def update_panels(self, previous_scenes=None, previous_minutes=None):
+        """Prepara las escenas tras un nesting; cada una se construye al mostrarla"""
+        self.scenes = OrderedDict()
+        self.router_minutes = {}
+        # Reutilizar las escenas y tiempos de los paneles que el reanidado incremental conservó
+        kept = self.nest_variant.get('paneles_conservados', [])
+        new_index = {old_idx: i for i, old_idx in enumerate(kept)}
+        for old_idx, scene in (previous_scenes or {}).items():
+            if old_idx in new_index:
+                self.scenes[new_index[old_idx]] = scene
+        for old_idx, minutes in (previous_minutes or {}).items():
+            if old_idx in new_index:
+                self.router_minutes[new_index[old_idx]] = minutes
+
+    def get_scene(self, index):
+        """Devuelve la escena del panel, construyéndola si no está entre las recientes"""
+        if index in self.scenes:
+            self.scenes.move_to_end(index)
+        else:
+            self.scenes[index] = self.build_scene(index)
+            # Liberar las escenas usadas hace más tiempo
+            while len(self.scenes) > MAX_ESCENAS:
+                self.scenes.popitem(last=False)
+        return self.scenes[index]
+
+    def get_router_minutes(self, index):
+        """Minutos de router del panel, planificando su recorrido solo la primera vez que se muestra"""
+        if index not in self.router_minutes:
+            self.router_minutes[index] = panel_minutes(self.nest_result, index, self.router)
+        return self.router_minutes[index]
+
+    def build_scene(self, i):
+        """Construye la escena de un panel"""
+        # El motor trabaja en 1/64 de pulgada; escalar a píxeles solo al dibujar
+        k = self.inches_to_pixels / TICKS_POR_PULGADA
+        panel_width, panel_height = self.nest_result.panel_size(i)
+
+        scene = QGraphicsScene()
+        scene.setSceneRect(0, 0, panel_width * k, panel_height * k)
+        rows = self.panel_rows[i] if i < len(self.panel_rows) else []
+        scene.addItem(PanelItem(self.panel_pieces[i], rows, self.panel_utilization[i],
+                                panel_width * k, panel_height * k, k))
+        return scene
 
     def show_panel(self, index):
-        if 0 <= index < len(self.panels):
+        if 0 <= index < len(self.panel_pieces):
             self.current_panel_index = index
-            self.view.setScene(self.panels[index])
+            self.view.setScene(self.get_scene(index))
             
             # Actualizar etiqueta de información
             utilization = self.panel_utilization[index] if index < len(self.panel_utilization) else 0
-            self.info_label.setText(f"Panel {index+1} de {len(self.panels)} | Utilización: {utilization:.1f}%")
+            info_text = f"Panel {index+1} de {len(self.panel_pieces)} | Utilización: {utilization:.1f}%"
+            bounds = self.nest_result.lower_bounds
+            if bounds:
+                optimal = " (óptimo)" if len(self.panel_pieces) <= bounds['l2'] else ""
+                info_text += f"\nCota inferior: {bounds['l2']} paneles (área: {bounds['area']}){optimal}"
+            info_text += f"\nRouter: {self.get_router_minutes(index):.1f} min estimados"
+            sheet = self.nest_result.panel_sheets[index] if index < len(self.nest_result.panel_sheets) else None
+            if sheet is not None and sheet.remnant:
+                info_text += f"\nRetazo {sheet.remnant}: {sheet.width:g} x {sheet.height:g} in"
+            elif sheet is not None and self.nest_result.total_cost:
+                info_text += (f"\nLámina: {sheet.width:g} x {sheet.height:g} in (${sheet.price:.2f}) | "
+                              f"Costo total: ${self.nest_result.total_cost:.2f}")
+            if index < len(self.panel_cut_length):
+                info_text += (f"\nCorte: {self.panel_cut_length[index]:.1f} in | "
+                              f"Reposicionamientos: {self.panel_repositionings[index]}")
+
+            # Grupo de material del panel y cómo se anidó
+            variant = {}
+            if index < len(self.nest_result.panel_materials):
+                material, grosor = self.nest_result.panel_materials[index]
+                for group in self.nest_variant.get('grupos', []):
+                    if (group['material'], group['grosor']) == (material, grosor):
+                        info_text += (f"\nMaterial: {material or 'Sin material'} ({grosor}) | "
+                                      f"{group['paneles']} paneles | Utilización: {group['utilizacion']:.1f}%")
+                        variant = group.get('variant', {})
+            if 'sort_criteria' in variant:
+                info_text += (f"\nMejor: {variant['sort_criteria']} | "
+                              f"Rotación: {variant['rotacion']}")
+            elif 'optimizador' in variant:
+                cancelled = " (cancelado)" if variant.get('cancelado') else ""
+                info_text += f"\nOptimizador: {variant['iteraciones']} iteraciones{cancelled}"
+            stats = self.nest_result.stats
+            if stats is not None:
+                phases = ", ".join(f"{phase} {count}" for phase, count in stats.piezas.items())
+                info_text += (f"\nMotor: {phases} | Validaciones: {stats.validaciones} "
+                              f"({stats.rechazos} rechazos) | {sum(stats.segundos.values()):.2f} s")
+                if index < len(stats.panel_espacios):
+                    spaces = stats.panel_espacios[index]
+                    info_text += (f"\nEspacios libres: {spaces['filas']} filas, {spaces['columnas']} columnas "
+                                  f"(máximo {spaces['columnas_max']})")
+            if 'paneles_reempacados' in self.nest_variant:
+                info_text += f"\nIncremental: {self.nest_variant['paneles_reempacados']} paneles reempacados"
+            self.info_label.setText(info_text)
 
     def show_next_panel(self):
-        if self.current_panel_index < len(self.panels) - 1:
+        if self.current_panel_index < len(self.panel_pieces) - 1:
             self.show_panel(self.current_panel_index + 1)
 
     def show_previous_panel(self):
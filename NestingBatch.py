@@ -0,0 +1,248 @@
+"""Nesting por lotes desde la línea de comandos, sin interfaz gráfica.
+
+Anida uno o varios proyectos de gabinetes (los JSON de la aplicación) en
+paralelo, un proyecto por proceso, y escribe en una carpeta por proyecto
+las colocaciones, el reporte de utilización y los archivos para el taller::
+
+    python NestingBatch.py pedidos/*.json -o salida --estrategia skyline --workers 4
+    python NestingBatch.py obra.json -o salida --materiales materiales.json --veta --formatos dxf,pdf,nc
+
+Por defecto solo se escribe el DXF. El nesting no usa Qt; solo el PDF lo
+necesita, se pide con ``--formatos`` y se escribe al final en el proceso
+principal. Cada carpeta de proyecto lleva el nombre del archivo; si dos
+entradas se llaman igual, las siguientes reciben un sufijo ``_2``, ``_3``... Al terminar se deja ``resumen.json`` en la carpeta de
+salida con una línea por proyecto.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import os
+import sys
+import time
+
+from NestingEngine import (TICKS_POR_PULGADA, SEPARADOR, SORT_CRITERIA, ESTRATEGIAS, PIEZAS_IGNORADAS, Sheet,
+                           NestOptions, load_json, load_pieces, load_stock, apply_grain, group_pieces,
+                           nest_by_material, nest_each_group, nest_best, lower_bounds)
+from NestingOptimizer import optimize
+from NestingDxf import export_dxf
+from NestingGcode import export_gcode
+
+
+# Formatos de salida que se pueden pedir con --formatos
+FORMATOS = ("dxf", "pdf", "nc")
+
+# Archivos que se escriben en la carpeta de cada proyecto
+ARCHIVO_COLOCACIONES = "colocaciones.json"
+ARCHIVO_REPORTE = "reporte.json"
+ARCHIVO_RESUMEN = "resumen.json"
+
+
+def _inches(ticks):
+    return ticks / TICKS_POR_PULGADA
+
+
+def placements_data(result):
+    """Colocaciones de ``result`` por panel, con medidas en pulgadas."""
+    panels = []
+    for i, placements in enumerate(result.panel_pieces):
+        panel_width, panel_height = result.panel_size(i)
+        panel = {
+            'panel': i + 1,
+            'lamina': [_inches(panel_width), _inches(panel_height)],
+            'utilizacion': result.panel_utilization[i] if i < len(result.panel_utilization) else 0,
+            'piezas': [{'x': _inches(x), 'y': _inches(y), 'ancho': ancho, 'alto': alto, 'nombre': nombre,
+                        'rotada': rotada, 'gabinete_id': gabinete_id}
+                       for x, y, _, _, ancho, alto, nombre, rotada, gabinete_id in placements],
+        }
+        if i < len(result.panel_materials):
+            panel['material'], panel['grosor'] = result.panel_materials[i]
+        if i < len(result.panel_sheets) and result.panel_sheets[i].remnant:
+            panel['retazo'] = result.panel_sheets[i].remnant
+        panels.append(panel)
+    return panels
+
+
+def report_data(project, result, seconds):
+    """Reporte de utilización de un proyecto para ``reporte.json`` y el resumen."""
+    return {
+        'proyecto': project,
+        'piezas': result.piece_count,
+        'paneles': result.panel_count,
+        'utilizacion': result.total_utilization,
+        'costo': result.total_cost,
+        'cotas': result.lower_bounds,
+        'segundos': seconds,
+        'grupos': result.variant.get('grupos', []),
+        'panel_utilizacion': result.panel_utilization,
+    }
+
+
+def project_names(paths):
+    """Nombre de la carpeta de salida de cada proyecto, sin repetidos.
+
+    Es el nombre del archivo sin extensión; si ya lo usa otra entrada (el
+    mismo nombre en otra carpeta) se le añade ``_2``, ``_3``...
+    """
+    names = []
+    used = set()
+    for path in paths:
+        base = name = os.path.splitext(os.path.basename(path))[0]
+        suffix = 2
+        while name in used:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def nest_project(path, project, output_dir, sheet, options, mode, time_budget, stock, grain, formats,
+                 ignored=PIEZAS_IGNORADAS):
+    """Anida un proyecto y escribe sus archivos; se ejecuta en un proceso del lote.
+
+    Escribe colocaciones, reporte, DXF y G-code en
+    ``output_dir/<project>``. Devuelve ``(reporte, NestResult)`` si se pide
+    el PDF, que lo escribe el proceso principal, y ``(reporte, None)`` si
+    no, para no enviar el resultado de vuelta.
+    """
+    project_dir = os.path.join(output_dir, project)
+
+    start = time.perf_counter()
+    pieces = load_pieces(load_json(path), ignored_pieces=ignored, piezas_girables=options.piezas_girables)
+    if grain:
+        pieces = apply_grain(pieces, stock)
+    if time_budget > 0:
+        # El tiempo del optimizador se reparte entre los grupos de material
+        group_budget = time_budget / max(1, len(group_pieces(pieces)))
+        result = nest_each_group(pieces, lambda group: optimize(group, sheet, options, time_budget=group_budget,
+                                                               workers=1))
+        result.lower_bounds = lower_bounds(pieces, sheet, options)
+    elif mode == "best_of":
+        result = nest_each_group(pieces, lambda group: nest_best(group, sheet, options, workers=1))
+        result.lower_bounds = lower_bounds(pieces, sheet, options)
+    else:
+        # Cada proyecto ya ocupa un proceso: sus grupos se anidan en secuencia
+        result = nest_by_material(pieces, sheet, options, workers=1, stock=stock)
+        result.lower_bounds = lower_bounds(pieces, sheet, options, stock)
+    seconds = time.perf_counter() - start
+
+    report = report_data(project, result, seconds)
+    report['archivo'] = path
+    os.makedirs(project_dir, exist_ok=True)
+    with open(os.path.join(project_dir, ARCHIVO_COLOCACIONES), 'w') as file:
+        json.dump(placements_data(result), file, indent=2)
+    with open(os.path.join(project_dir, ARCHIVO_REPORTE), 'w') as file:
+        json.dump(report, file, indent=2)
+    if "dxf" in formats:
+        export_dxf(result, os.path.join(project_dir, f"{project}.dxf"))
+    if "nc" in formats:
+        export_gcode(result, os.path.join(project_dir, project))
+    return report, result if "pdf" in formats else None
+
+
+def write_pdf(report, result, output_dir, app=None):
+    """Escribe el PDF de un proyecto con Qt sin pantalla.
+
+    Devuelve la aplicación Qt (``app``, o una nueva la primera vez), que
+    debe seguir viva y pasarse a las siguientes llamadas.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtGui import QGuiApplication
+    from NestingPdf import export_pdf
+
+    if app is None:
+        app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    project = report['proyecto']
+    export_pdf(result, os.path.join(output_dir, project, f"{project}.pdf"))
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Nesting por lotes de proyectos de gabinetes.")
+    parser.add_argument("proyectos", nargs="+", help="Archivos JSON de proyectos (gabinetes y piezas)")
+    parser.add_argument("-o", "--salida", default="nesting_lote", help="Carpeta de salida")
+    parser.add_argument("--estrategia", choices=sorted(ESTRATEGIAS), default="filas")
+    parser.add_argument("--orden", choices=SORT_CRITERIA + ("best_of",), default="area_desc",
+                        help="Criterio de ordenación; best_of prueba todos los criterios y rotaciones")
+    parser.add_argument("--optimizar", type=float, default=0, metavar="SEGUNDOS",
+                        help="Segundos del optimizador de orden y rotación por proyecto (0 = desactivado)")
+    parser.add_argument("--ancho", type=float, default=Sheet.width, help="Lado largo de la lámina (pulgadas)")
+    parser.add_argument("--alto", type=float, default=Sheet.height, help="Lado corto de la lámina (pulgadas)")
+    parser.add_argument("--separador", type=float, default=SEPARADOR, help="Separación entre piezas (pulgadas)")
+    parser.add_argument("--girable", action="append", default=[], metavar="NOMBRE",
+                        help="Pieza que se coloca girada; se puede repetir")
+    parser.add_argument("--incluir", action="append", default=[], metavar="NOMBRE",
+                        help=f"Anidar también una pieza ignorada por defecto ({', '.join(sorted(PIEZAS_IGNORADAS))})")
+    parser.add_argument("--materiales", help="materiales.json con las láminas y precios en existencia")
+    parser.add_argument("--veta", action="store_true",
+                        help="Girar automáticamente las piezas de materiales sin veta (necesita --materiales)")
+    parser.add_argument("--formatos", default="dxf",
+                        help=f"Archivos a escribir, separados por comas: {', '.join(FORMATOS)} (pdf necesita PyQt5)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Proyectos anidados a la vez")
+    args = parser.parse_args(argv)
+
+    args.formatos = [fmt.strip().lower() for fmt in args.formatos.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in args.formatos if fmt not in FORMATOS]
+    if unknown:
+        parser.error(f"Formato desconocido: {', '.join(unknown)}")
+    if args.veta and not args.materiales:
+        parser.error("--veta necesita --materiales")
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+    if "pdf" in args.formatos:
+        try:
+            import PyQt5.QtGui  # noqa: F401
+        except ImportError:
+            parser.error("El PDF necesita PyQt5; use --formatos dxf,nc")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sheet = Sheet(args.ancho, args.alto)
+    options = NestOptions(
+        sort_criteria=args.orden if args.orden in SORT_CRITERIA else "area_desc",
+        piezas_girables=args.girable,
+        separator=args.separador,
+        strategy=args.estrategia,
+    )
+    ignored = PIEZAS_IGNORADAS - set(args.incluir)
+    stock = load_stock(load_json(args.materiales)) if args.materiales else None
+    os.makedirs(args.salida, exist_ok=True)
+
+    reports = []
+    failed = []
+    qt_app = None  # Se crea con el primer PDF, ya lanzados los procesos
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(nest_project, path, project, args.salida, sheet, options, args.orden,
+                                   args.optimizar, stock, args.veta, args.formatos, ignored): path
+                   for path, project in zip(args.proyectos, project_names(args.proyectos))}
+        for future in as_completed(futures):
+            # Soltar el futuro, que guarda el resultado, en cuanto se procesa
+            path = futures.pop(future)
+            try:
+                report, result = future.result()
+            except Exception as e:  # Un proyecto dañado no detiene el lote
+                failed.append({'proyecto': path, 'error': str(e)})
+                print(f"ERROR {path}: {e}", file=sys.stderr)
+                continue
+            reports.append(report)
+            print(f"{report['proyecto']}: {report['paneles']} paneles, {report['utilizacion']:.1f}% "
+                  f"en {report['segundos']:.1f} s")
+            if result is not None:
+                # Solo hay resultado si se pidió el PDF: se escribe ya y se descarta
+                qt_app = write_pdf(report, result, args.salida, qt_app)
+
+    # El resumen tiene una línea por proyecto; el detalle está en el reporte de cada uno
+    summary = {
+        'proyectos': sorted(({key: value for key, value in report.items() if key not in ('grupos', 'panel_utilizacion')}
+                             for report in reports), key=lambda report: report['proyecto']),
+        'errores': failed,
+    }
+    with open(os.path.join(args.salida, ARCHIVO_RESUMEN), 'w') as file:
+        json.dump(summary, file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
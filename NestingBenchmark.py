@@ -0,0 +1,286 @@
+"""Benchmark del motor de nesting.
+
+Mide cómo escala el tiempo de colocación con el número de piezas, con y
+sin el índice espacial en ``is_position_valid``, y el rendimiento del
+skyline con pedidos de piezas pequeñas::
+
+    python NestingBenchmark.py
+    python NestingBenchmark.py 500 1000 2000
+    python NestingBenchmark.py skyline 20000
+
+La suite de cocinas genera proyectos con las reglas ``calcular_piezas_*``
+de la aplicación de gabinetes, anida cada uno con todas las estrategias y
+criterios de ordenación, y guarda tiempo, memoria pico, paneles y
+utilización en un JSON que se puede comparar entre versiones::
+
+    python NestingBenchmark.py cocinas
+    python NestingBenchmark.py cocinas 10 100 1000 10000
+    python NestingBenchmark.py comparar antes.json despues.json
+"""
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from NestingEngine import (SORT_CRITERIA, ESTRATEGIAS, Sheet, NestOptions, NestCancelled, nest, load_pieces, count_pieces,
+                           nest_by_material, lower_bounds)
+
+
+# Piezas pequeñas de gavetas: frentes, rieles y zócalos
+MEDIDAS_PEQUENAS = [
+    (28.5, 3), (30, 4), (15.25, 5.875), (12, 3), (18, 4),
+    (10, 6), (21, 11), (17.875, 24.375),
+]
+
+# Medidas típicas de piezas de cocina (ancho, alto) en pulgadas
+MEDIDAS_COCINA = [
+    (22.75, 34.5), (23, 30), (11, 30), (33, 29.5), (34.5, 29.5),
+    (16.5, 22.75), (28.5, 22.75), (18, 4), (30, 4), (36, 4),
+    (17.875, 24.375), (14.875, 30), (28.5, 3), (15.25, 5.875), (21, 11),
+]
+
+
+# Aplicación de gabinetes con las reglas calcular_piezas_*
+ARCHIVO_REGLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Cabinet_Pieces_1.3.py")
+
+# Grosores de AplicacionGabinetes.__init__, que no se ejecuta sin ventana
+MATERIALES_GROSORES = {
+    "Plywood 3/4": 0.75,
+    "Plywood 5/8": 0.625,
+    "Plywood 1/2": 0.5,
+    "Plywood 3/8": 0.375,
+    "Plywood 1/4": 0.25,
+    "Medex 3/4": 0.75,
+    "Medex 1/4": 0.25,
+}
+
+# Archivo de resultados de la suite de cocinas
+ARCHIVO_RESULTADOS = "benchmark_nesting.json"
+
+# Un caso que tarda más que esto (segundos) no se repite con más gabinetes
+TIEMPO_MAXIMO_CASO = 120
+
+
+def cargar_reglas(path=ARCHIVO_REGLAS):
+    """Instancia de ``AplicacionGabinetes`` sin ventana, solo para calcular piezas.
+
+    Importa el archivo de la aplicación (necesita tkinter y matplotlib) y
+    crea el objeto sin llamar a ``__init__``; las reglas solo usan
+    ``materiales_grosores``.
+    """
+    spec = importlib.util.spec_from_file_location("Cabinet_Pieces", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    app = module.AplicacionGabinetes.__new__(module.AplicacionGabinetes)
+    app.materiales_grosores = dict(MATERIALES_GROSORES)
+    return app
+
+
+def generar_gabinete(rnd, numero):
+    """Gabinete aleatorio con las medidas y opciones de la pantalla de ingreso."""
+    estilo = rnd.choice(["Base_normal", "Base_Drawer", "Wall_cabinet"])
+    if estilo == "Wall_cabinet":
+        alto, profundidad = rnd.choice([30, 36, 42]), rnd.choice([12, 14])
+    else:
+        alto, profundidad = 34.5, rnd.choice([21, 24])
+    gabinete = {
+        "ID": f"G{numero}",
+        "Alto": alto,
+        "Ancho": rnd.choice([12, 15, 18, 21, 24, 27, 30, 33, 36]),
+        "Profundidad": profundidad,
+        "Cantidad": rnd.randint(1, 3),
+        "Espesor": 0.75,
+        "Estilo": estilo,
+        "Slider": rnd.choice(["Undermount", "Sidemount"]),
+    }
+    if estilo == "Base_Drawer":
+        gabinete["num_gavetas"] = rnd.randint(2, 4)
+    return gabinete
+
+
+def generar_cocina(gabinetes, seed=0, reglas=None):
+    """Proyecto sintético con ``gabinetes`` gabinetes, como el JSON de la aplicación.
+
+    Las piezas salen de ``reglas.calcular_piezas`` y reciben el
+    ``gabinete_id`` y el ``grosor`` igual que en ``agregar_gabinete``.
+    """
+    reglas = reglas or cargar_reglas()
+    rnd = random.Random(seed)
+    data = {"gabinetes": [], "piezas": []}
+    for numero in range(gabinetes):
+        gabinete = generar_gabinete(rnd, numero)
+        for pieza in reglas.calcular_piezas(gabinete):
+            pieza["gabinete_id"] = gabinete["ID"]
+            pieza["grosor"] = MATERIALES_GROSORES.get(pieza["material"], 0.75)
+            data["piezas"].append(pieza)
+        data["gabinetes"].append(gabinete)
+    return data
+
+
+def _limite(segundos):
+    """``progress`` que cancela el nesting cuando pasan ``segundos``."""
+    final = time.perf_counter() + segundos
+
+    def progress(*_):
+        if time.perf_counter() > final:
+            raise NestCancelled()
+    return progress
+
+
+def medir_caso(pieces, options, limite=TIEMPO_MAXIMO_CASO):
+    """Anida por material y devuelve las medidas de un caso.
+
+    Los grupos se anidan en este proceso (``workers=1``) para que tiempo y
+    memoria sean los del motor y no los del reparto entre procesos. El
+    tiempo se toma sin ``tracemalloc``, que lo distorsiona; la memoria
+    pico sale de una segunda ejecución con el rastreo activo. Si una
+    ejecución pasa de ``limite`` segundos se cancela y el caso queda
+    omitido.
+    """
+    try:
+        inicio = time.perf_counter()
+        result = nest_by_material(pieces, Sheet(), options, workers=1, progress=_limite(limite))
+        segundos = time.perf_counter() - inicio
+
+        tracemalloc.start()
+        try:
+            nest_by_material(pieces, Sheet(), options, workers=1, progress=_limite(limite))
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except NestCancelled:
+        return {'omitido': True}
+
+    return {
+        'segundos': round(segundos, 4),
+        'memoria_pico_mb': round(pico / 2 ** 20, 2),
+        'paneles': result.panel_count,
+        'utilizacion': round(result.total_utilization, 2),
+    }
+
+
+def benchmark_cocinas(tamanos=(10, 100, 1000), estrategias=tuple(ESTRATEGIAS), criterios=SORT_CRITERIA,
+                      archivo=ARCHIVO_RESULTADOS, seed=0):
+    """Mide todas las estrategias y criterios con cocinas de cada tamaño.
+
+    Un caso que supera ``TIEMPO_MAXIMO_CASO`` se cancela, y su
+    combinación se marca como omitida en ese tamaño y en los siguientes.
+    Escribe los resultados en ``archivo`` y los devuelve.
+    """
+    reglas = cargar_reglas()
+    lentas = set()
+    casos = []
+    print(f"{'Gabinetes':>10} {'Piezas':>8} {'Estrategia':>14} {'Criterio':>12} "
+          f"{'Paneles':>8} {'Utilización':>12} {'Tiempo (s)':>11} {'Memoria (MB)':>13}")
+    for gabinetes in tamanos:
+        pieces = load_pieces(generar_cocina(gabinetes, seed, reglas))
+        piezas = count_pieces(pieces)
+        cota = lower_bounds(pieces)['l2']
+        for strategy in estrategias:
+            for sort_criteria in criterios:
+                caso = {'gabinetes': gabinetes, 'piezas': piezas, 'cota': cota,
+                        'estrategia': strategy, 'criterio': sort_criteria}
+                if (strategy, sort_criteria) in lentas:
+                    caso['omitido'] = True
+                else:
+                    caso.update(medir_caso(pieces, NestOptions(sort_criteria=sort_criteria, strategy=strategy)))
+                    if caso.get('omitido'):
+                        lentas.add((strategy, sort_criteria))
+                        print(f"{gabinetes:>10} {piezas:>8} {strategy:>14} {sort_criteria:>12} "
+                              f"más de {TIEMPO_MAXIMO_CASO} s, omitido")
+                    else:
+                        print(f"{gabinetes:>10} {piezas:>8} {strategy:>14} {sort_criteria:>12} {caso['paneles']:>8} "
+                              f"{caso['utilizacion']:>11.1f}% {caso['segundos']:>11.3f} "
+                              f"{caso['memoria_pico_mb']:>13.1f}")
+                casos.append(caso)
+
+    resultados = {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'seed': seed,
+        'casos': casos,
+    }
+    with open(archivo, 'w') as file:
+        json.dump(resultados, file, indent=2)
+    print(f"Resultados guardados en {archivo}")
+    return resultados
+
+
+def comparar(antes, despues):
+    """Imprime la variación de tiempo, memoria y paneles entre dos archivos de resultados."""
+    with open(antes) as file:
+        previos = {(c['gabinetes'], c['estrategia'], c['criterio']): c for c in json.load(file)['casos']}
+    with open(despues) as file:
+        actuales = json.load(file)['casos']
+    print(f"{'Gabinetes':>10} {'Estrategia':>14} {'Criterio':>12} {'Tiempo':>9} {'Memoria':>9} {'Paneles':>8}")
+    for caso in actuales:
+        previo = previos.get((caso['gabinetes'], caso['estrategia'], caso['criterio']))
+        if previo is None or caso.get('omitido') or previo.get('omitido'):
+            continue
+        tiempo = caso['segundos'] / previo['segundos'] if previo['segundos'] else 1
+        memoria = caso['memoria_pico_mb'] / previo['memoria_pico_mb'] if previo['memoria_pico_mb'] else 1
+        print(f"{caso['gabinetes']:>10} {caso['estrategia']:>14} {caso['criterio']:>12} {tiempo:>8.2f}x "
+              f"{memoria:>8.2f}x {caso['paneles'] - previo['paneles']:>+8}")
+
+
+def generar_piezas(cantidad, seed=0, medidas=MEDIDAS_COCINA):
+    """Genera ``cantidad`` piezas sintéticas con medidas de cocina."""
+    rnd = random.Random(seed)
+    pieces = []
+    for i in range(cantidad):
+        ancho, alto = rnd.choice(medidas)
+        pieces.append({
+            "width": ancho,
+            "height": alto,
+            "nombre": f"Pieza {i % 15}",
+            "gabinete_id": f"G{i // 15}",
+        })
+    return pieces
+
+
+def medir(cantidad, spatial_index, sheet=None, sort_criteria="area_desc"):
+    """Devuelve (segundos, paneles) al anidar ``cantidad`` piezas sintéticas."""
+    pieces = generar_piezas(cantidad)
+    options = NestOptions(sort_criteria=sort_criteria, spatial_index=spatial_index)
+    inicio = time.perf_counter()
+    result = nest(pieces, sheet or Sheet(), options)
+    return time.perf_counter() - inicio, result.panel_count
+
+
+def benchmark_indice(tamanos=(250, 500, 1000, 2000)):
+    """Imprime la tabla de tiempos con y sin índice espacial."""
+    print(f"{'Piezas':>8} {'Paneles':>8} {'Sin índice (s)':>15} {'Con índice (s)':>15} {'Mejora':>8}")
+    for cantidad in tamanos:
+        t_lineal, paneles = medir(cantidad, spatial_index=False)
+        t_indice, _ = medir(cantidad, spatial_index=True)
+        print(f"{cantidad:>8} {paneles:>8} {t_lineal:>15.3f} {t_indice:>15.3f} {t_lineal / t_indice:>7.1f}x")
+
+
+def benchmark_skyline(cantidad=20000):
+    """Imprime piezas por segundo del skyline con cada criterio de ordenación."""
+    print(f"{'Criterio':>12} {'Paneles':>8} {'Utilización':>12} {'Piezas/s':>10}")
+    for sort_criteria in SORT_CRITERIA:
+        pieces = generar_piezas(cantidad, medidas=MEDIDAS_PEQUENAS)
+        options = NestOptions(sort_criteria=sort_criteria, strategy="skyline")
+        inicio = time.perf_counter()
+        result = nest(pieces, Sheet(), options)
+        segundos = time.perf_counter() - inicio
+        print(f"{sort_criteria:>12} {result.panel_count:>8} {result.total_utilization:>11.1f}% {cantidad / segundos:>10.0f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["cocinas"]:
+        benchmark_cocinas([int(arg) for arg in sys.argv[2:]] or (10, 100, 1000))
+    elif sys.argv[1:2] == ["comparar"]:
+        comparar(sys.argv[2], sys.argv[3])
+    elif sys.argv[1:2] == ["skyline"]:
+        benchmark_skyline(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        tamanos = [int(arg) for arg in sys.argv[1:]] or [250, 500, 1000, 2000]
+        benchmark_indice(tamanos)
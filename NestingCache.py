@@ -0,0 +1,140 @@
+"""Caché de resultados de nesting direccionada por contenido.
+
+La clave es un hash SHA-256 de las entradas efectivas del nesting: el
+multiconjunto de piezas, las opciones que cambian el resultado, el tamaño
+de la lámina y el modo (nesting simple, "mejor de todos" u optimizador).
+Los resultados se guardan en un LRU en memoria y, si se indica una
+carpeta, también en disco, de modo que sobreviven a reinicios::
+
+    cache = NestCache(CARPETA_CACHE)
+    key = cache.key(pieces, sheet, options)
+    result = cache.get(key)
+    if result is None:
+        result = nest(pieces, sheet, options)
+        cache.put(key, result)
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from NestingEngine import NestResult
+
+
+# Carpeta por defecto de la caché en disco
+CARPETA_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "nesting")
+
+# Cambiar al modificar los motores o NestResult para invalidar lo guardado
+VERSION_CACHE = 9
+
+# Resultados que se mantienen en memoria
+CAPACIDAD_MEMORIA = 32
+
+
+def cache_key(pieces, sheet, options, mode="nest", stock=None, remnants=None):
+    """Hash de las entradas que determinan el resultado del nesting.
+
+    Las piezas se reducen a un multiconjunto ordenado, así que el orden
+    de entrada y el reparto en varias entradas de un mismo tipo no
+    cambian la clave. ``spatial_index`` no influye en el resultado y no
+    forma parte de ella; ``stats`` sí, porque añade los contadores al
+    resultado. ``stock`` son las láminas de ``load_stock`` y
+    ``remnants`` los retazos de ``RemnantStore.remnants_for``.
+    """
+    multiset = {}
+    for piece in pieces:
+        rotada = piece.get('rotada')
+        if rotada is None:
+            rotada = piece['nombre'] in options.piezas_girables
+        key = (piece['width'], piece['height'], piece['nombre'], str(piece['gabinete_id']), rotada,
+               piece.get('material') or "", piece.get('grosor') or 0, bool(piece.get('girable')))
+        multiset[key] = multiset.get(key, 0) + piece.get('cantidad', 1)
+
+    payload = {
+        'version': VERSION_CACHE,
+        'modo': mode,
+        'piezas': sorted([*key, cantidad] for key, cantidad in multiset.items()),
+        'sort_criteria': options.sort_criteria,
+        'piezas_girables': sorted(options.piezas_girables),
+        'separator': options.separator,
+        'strategy': options.strategy,
+        'stats': options.stats,
+        'sheet': [sheet.width, sheet.height],
+        'laminas': sorted([tipo, grosor, s.width, s.height, s.price, s.grain] for tipo, grosor, s in stock or []),
+        'retazos': sorted([material, grosor, s.remnant, s.width, s.height]
+                          for (material, grosor), sheets in (remnants or {}).items() for s in sheets),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class NestCache:
+    """LRU en memoria de ``NestResult`` con copia opcional en disco.
+
+    Los resultados devueltos se comparten con la caché y no deben
+    modificarse.
+    """
+
+    def __init__(self, directory=None, capacity=CAPACIDAD_MEMORIA):
+        self.directory = directory
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, pieces, sheet, options, mode="nest", stock=None, remnants=None):
+        return cache_key(pieces, sheet, options, mode, stock, remnants)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key):
+        """Devuelve el resultado guardado con ``key`` o ``None``."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'rb') as file:
+                result = pickle.load(file)
+        except Exception:
+            # Entrada ausente, incompleta, dañada o de otra versión del motor:
+            # un archivo dañado puede fallar en pickle.load con casi cualquier error
+            return None
+        if not isinstance(result, NestResult):
+            return None
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        """Guarda ``result`` en memoria y, si hay carpeta, en disco."""
+        self._remember(key, result)
+        if not self.directory:
+            return
+        # Escribir en un temporal y renombrar para no dejar entradas a medias
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            print(f"Error al guardar en la caché de nesting: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self):
+        """Vacía la memoria y borra las entradas en disco."""
+        self.entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pickle"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
@@ -0,0 +1,89 @@
+"""Exportación a DXF de un resultado de nesting para el router CNC.
+
+Escribe un DXF R12 (AC1009) en texto, sin dependencias externas, con el
+contorno de cada lámina y el rectángulo de cada pieza en capas separadas
+y una etiqueta con el nombre y el gabinete de la pieza. Las medidas van
+en pulgadas con el origen en la esquina inferior izquierda de cada
+lámina, y las láminas se colocan una encima de otra separadas por
+``SEPARACION_PANELES``; cada lámina tiene su propia medida. El archivo se
+escribe panel a panel::
+
+    export_dxf(result, "paneles.dxf")
+"""
+from NestingEngine import TICKS_POR_PULGADA
+
+
+# Capas del DXF: nombre y color ACI
+CAPA_HOJA = "HOJA"
+CAPA_PIEZAS = "PIEZAS"
+CAPA_ETIQUETAS = "ETIQUETAS"
+CAPAS = (
+    (CAPA_HOJA, 1),  # Rojo
+    (CAPA_PIEZAS, 7),  # Blanco/negro
+    (CAPA_ETIQUETAS, 3),  # Verde
+)
+
+# Separación vertical entre láminas y altura del texto, en pulgadas
+SEPARACION_PANELES = 6
+ALTO_TEXTO = 0.75
+
+
+def _inches(ticks):
+    """Pulgadas exactas como texto (1/64 es exacto en binario)."""
+    return repr(ticks / TICKS_POR_PULGADA)
+
+
+def _rectangle(layer, x0, y0, x1, y1):
+    """Polilínea cerrada de un rectángulo, con coordenadas en unidades del motor."""
+    x0, y0, x1, y1 = _inches(x0), _inches(y0), _inches(x1), _inches(y1)
+    vertices = "".join(f"0\nVERTEX\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0.0\n"
+                       for x, y in ((x0, y0), (x1, y0), (x1, y1), (x0, y1)))
+    return f"0\nPOLYLINE\n8\n{layer}\n66\n1\n70\n1\n{vertices}0\nSEQEND\n8\n{layer}\n"
+
+
+def _text(layer, x, y, text):
+    """Texto centrado en el punto ``(x, y)``, en unidades del motor."""
+    x, y = _inches(x), _inches(y)
+    return (f"0\nTEXT\n8\n{layer}\n10\n{x}\n20\n{y}\n30\n0.0\n40\n{ALTO_TEXTO}\n1\n{text}\n"
+            f"72\n1\n11\n{x}\n21\n{y}\n31\n0.0\n73\n2\n")
+
+
+def _header():
+    layers = "".join(f"0\nLAYER\n2\n{name}\n70\n0\n62\n{color}\n6\nCONTINUOUS\n" for name, color in CAPAS)
+    return ("0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n9\n$DWGCODEPAGE\n3\nANSI_1252\n9\n$INSUNITS\n70\n1\n0\nENDSEC\n"
+            f"0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n{len(CAPAS)}\n{layers}0\nENDTAB\n0\nENDSEC\n"
+            "0\nSECTION\n2\nENTITIES\n")
+
+
+def panel_entities(placements, panel_width, panel_height, offset_y=0):
+    """Entidades DXF de un panel: contorno, piezas y etiquetas.
+
+    El motor mide ``y`` desde el borde superior; en el DXF ``y`` crece
+    hacia arriba desde ``offset_y``.
+    """
+    top = offset_y + panel_height
+    chunks = [_rectangle(CAPA_HOJA, 0, offset_y, panel_width, top)]
+    for x, y, pw, ph, aw, ah, nombre, rotated, gabinete_id in placements:
+        chunks.append(_rectangle(CAPA_PIEZAS, x, top - y - ph, x + pw, top - y))
+        chunks.append(_text(CAPA_ETIQUETAS, x + pw // 2, top - y - ph // 2, f"{nombre} G{gabinete_id}"))
+    return "".join(chunks)
+
+
+def export_dxf(result, filename, progress=None):
+    """Escribe ``result`` en ``filename`` como DXF, un panel cada vez.
+
+    ``progress(hechas, total)`` se llama tras cada panel y puede lanzar
+    ``NestCancelled`` para detener la exportación.
+    """
+    gap = SEPARACION_PANELES * TICKS_POR_PULGADA
+    total = result.panel_count
+    with open(filename, 'w', encoding='cp1252', errors='replace', newline='\r\n') as file:
+        file.write(_header())
+        offset_y = 0
+        for i, placements in enumerate(result.panel_pieces):
+            panel_width, panel_height = result.panel_size(i)
+            file.write(panel_entities(placements, panel_width, panel_height, offset_y))
+            offset_y += panel_height + gap
+            if progress is not None:
+                progress(i + 1, total)
+        file.write("0\nENDSEC\n0\nEOF\n")
@@ -0,0 +1,2051 @@
+"""Motor de nesting sin dependencias de Qt.
+
+Contiene el algoritmo de filas/columnas que antes vivía dentro de
+``NestingWindow`` para poder anidar trabajos desde scripts o servidores
+sin interfaz gráfica::
+
+    from NestingEngine import Sheet, NestOptions, load_pieces, nest
+
+    pieces = load_pieces(datos)
+    result = nest(pieces, Sheet(96.5, 48.5), NestOptions(sort_criteria="area_desc"))
+    print(result.panel_count, result.panel_utilization)
+"""
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+import json
+import time
+
+
+# Separación (kerf) entre piezas, en pulgadas
+SEPARADOR = 0.125
+
+# El motor trabaja en enteros: 1/64 de pulgada por unidad
+TICKS_POR_PULGADA = 64
+
+# Piezas que por defecto no se anidan
+PIEZAS_IGNORADAS = frozenset([
+    "Base",
+    "Lateral Derecho",
+    "Lateral Izquierdo",
+])
+
+# Tamaño de celda del índice espacial, en pulgadas
+CELDA_INDICE = 12
+
+# Cada cuántas piezas el skyline revisa qué paneles cerrar
+SKYLINE_REVISION_CIERRE = 64
+
+# Cada cuántas piezas colocadas se avisa del progreso
+PROGRESO_CADA = 50
+
+# Políticas de rotación de las piezas girables que prueba nest_best:
+# tal como las eligió el operador, sin girar, o con el lado largo a lo
+# largo del panel
+POLITICAS_ROTACION = ("operador", "sin_giro", "horizontal")
+
+# Fases del bucle de colocación de la estrategia filas, en el orden en que se prueban
+FASES_COLOCACION = ("columna", "nueva_columna", "nueva_fila", "nuevo_panel")
+
+# Criterios de ordenación disponibles
+SORT_CRITERIA = (
+    "area_desc",
+    "area_asc",
+    "width_desc",
+    "width_asc",
+    "height_desc",
+    "height_asc",
+)
+
+
+@dataclass
+class Sheet:
+    """Tamaño de la lámina en pulgadas, su precio (0 si no se conoce) y si tiene veta."""
+    width: float = 96.5
+    height: float = 48.5
+    price: float = 0
+    grain: bool = False
+    remnant: str = ""  # Identificador del retazo si la lámina es un sobrante guardado
+
+
+@dataclass
+class NestOptions:
+    """Parámetros del algoritmo de nesting."""
+    sort_criteria: str = "area_desc"
+    piezas_girables: list = field(default_factory=list)
+    separator: float = SEPARADOR
+    spatial_index: bool = False  # Usar rejilla para las consultas de colisión (ver NestingBenchmark)
+    strategy: str = "filas"  # Ver ESTRATEGIAS
+    stats: bool = False  # Contar fases y validaciones en NestResult.stats (solo filas)
+
+
+@dataclass
+class NestStats:
+    """Contadores del bucle de colocación de la estrategia filas.
+
+    ``piezas`` y ``segundos`` van por fase (``FASES_COLOCACION``): piezas
+    colocadas en cada una y tiempo buscando en ella; ``segundos`` incluye
+    también ``actualizar``, el tiempo de actualizar filas y columnas.
+    ``validaciones`` y ``rechazos`` cuentan las llamadas a
+    ``is_position_valid`` y las que devolvieron falso. ``panel_espacios``
+    tiene, por panel, las filas y columnas libres al terminar y el máximo
+    de columnas libres que llegó a tener.
+    """
+    piezas: dict = field(default_factory=lambda: dict.fromkeys(FASES_COLOCACION, 0))
+    segundos: dict = field(default_factory=lambda: dict.fromkeys(FASES_COLOCACION + ("actualizar",), 0.0))
+    validaciones: int = 0
+    rechazos: int = 0
+    panel_espacios: list = field(default_factory=list)
+
+    def lap(self, phase, start):
+        """Suma a ``phase`` el tiempo desde ``start`` y devuelve el instante actual."""
+        now = time.perf_counter()
+        self.segundos[phase] += now - start
+        return now
+
+    def record_panel(self, panel_idx, rows):
+        """Anota las filas y columnas libres del panel tras una colocación."""
+        while len(self.panel_espacios) <= panel_idx:
+            self.panel_espacios.append({'filas': 0, 'columnas': 0, 'columnas_max': 0})
+        spaces = self.panel_espacios[panel_idx]
+        spaces['filas'] = len(rows)
+        spaces['columnas'] = sum(len(row['columns']) for row in rows)
+        spaces['columnas_max'] = max(spaces['columnas_max'], spaces['columnas'])
+
+    def merge(self, other):
+        """Acumula los contadores de ``other``; sus paneles van detrás."""
+        for phase, count in other.piezas.items():
+            self.piezas[phase] = self.piezas.get(phase, 0) + count
+        for phase, seconds in other.segundos.items():
+            self.segundos[phase] = self.segundos.get(phase, 0.0) + seconds
+        self.validaciones += other.validaciones
+        self.rechazos += other.rechazos
+        self.panel_espacios.extend(dict(spaces) for spaces in other.panel_espacios)
+
+    def to_dict(self):
+        """Contadores como diccionario listo para ``json.dump``."""
+        return asdict(self)
+
+
+@dataclass
+class NestResult:
+    """Resultado del nesting.
+
+    ``panel_pieces`` contiene, para cada panel, tuplas
+    ``(x, y, pw, ph, ancho, alto, nombre, rotada, gabinete_id)`` donde las
+    cuatro primeras son enteros en 1/64 de pulgada (``TICKS_POR_PULGADA``)
+    y ``ancho``/``alto`` son las medidas reales en pulgadas. La conversión
+    a píxeles es cosa de quien dibuja el resultado.
+    """
+    panel_pieces: list
+    panel_utilization: list
+    panel_structure: list
+    panel_rows: list
+    panel_width: float
+    panel_height: float
+    # Solo la estrategia guillotina: lista de cortes, longitud de corte
+    # (pulgadas) y reposicionamientos de la sierra de cada panel
+    panel_cuts: list = field(default_factory=list)
+    panel_cut_length: list = field(default_factory=list)
+    panel_repositionings: list = field(default_factory=list)
+    # Criterio y política de rotación que produjeron el resultado (nest_best)
+    variant: dict = field(default_factory=dict)
+    # Grupo (material, grosor) de cada panel al anidar por material
+    panel_materials: list = field(default_factory=list)
+    # Sheet de cada panel; con varias medidas de lámina no todos son iguales
+    panel_sheets: list = field(default_factory=list)
+    # Cotas inferiores del número de paneles, ver lower_bounds()
+    lower_bounds: dict = field(default_factory=dict)
+    # Contadores del motor si se pidieron con NestOptions.stats
+    stats: NestStats = None
+
+    @property
+    def panel_count(self):
+        return len(self.panel_pieces)
+
+    def panel_size(self, index):
+        """Ancho y alto de la lámina del panel ``index`` en unidades del motor."""
+        if index < len(self.panel_sheets):
+            sheet = self.panel_sheets[index]
+            return to_ticks(sheet.width), to_ticks(sheet.height)
+        return self.panel_width, self.panel_height
+
+    @property
+    def total_cost(self):
+        """Precio de todas las láminas usadas."""
+        return sum(sheet.price for sheet in self.panel_sheets)
+
+    @property
+    def piece_count(self):
+        return sum(len(pieces) for pieces in self.panel_pieces)
+
+    @property
+    def total_utilization(self):
+        """Utilización media de todos los paneles, en porcentaje."""
+        if not self.panel_utilization:
+            return 0
+        return sum(self.panel_utilization) / len(self.panel_utilization)
+
+    @property
+    def total_cut_length(self):
+        """Longitud total de corte en pulgadas."""
+        return sum(self.panel_cut_length)
+
+    @property
+    def total_repositionings(self):
+        """Total de reposicionamientos de la sierra."""
+        return sum(self.panel_repositionings)
+
+
+class NestCancelled(Exception):
+    """Se lanza desde un callback de progreso para cancelar el nesting."""
+
+
+def to_ticks(inches):
+    """Convierte pulgadas a unidades enteras del motor."""
+    return int(round(inches * TICKS_POR_PULGADA))
+
+
+def load_json(filepath):
+    """Carga un archivo de proyecto y devuelve el diccionario de datos."""
+    with open(filepath, 'r') as file:
+        return json.load(file)
+
+
+def load_pieces(json_data, ignored_pieces=PIEZAS_IGNORADAS, selected_gabinetes=None, piezas_girables=()):
+    """Extrae las piezas a anidar de los datos de un proyecto.
+
+    Devuelve un diccionario por tipo de pieza con su ``cantidad`` (la
+    ``Cantidad`` de su gabinete) en lugar de repetirlo; las piezas iguales
+    del mismo gabinete se agrupan en un solo tipo. Se conservan el
+    ``material`` y el ``grosor`` de cada pieza para anidar cada material
+    en sus propias láminas (ver ``nest_by_material``). Si
+    ``selected_gabinetes`` es ``None`` se incluyen todos los gabinetes.
+    """
+    pieces = {}
+
+    gabinetes = json_data.get("gabinetes", [])
+    piezas = json_data.get("piezas", [])
+
+    # Crear un diccionario para mapear el ID del gabinete a su cantidad
+    cantidad_por_gabinete = {gabinete['ID']: gabinete['Cantidad'] for gabinete in gabinetes}
+
+    for pieza in piezas:
+        nombre = pieza.get('nombre')
+        if nombre in ignored_pieces:
+            continue
+        ancho = pieza.get('ancho')
+        alto = pieza.get('alto')
+        gabinete_id = pieza.get('gabinete_id')
+        material = pieza.get('material', "")
+        grosor = pieza.get('grosor', 0)
+
+        # Obtener la cantidad de piezas para este gabinete
+        cantidad = cantidad_por_gabinete.get(gabinete_id, 1)  # Si no existe, se asume 1
+
+        if ancho and alto and (selected_gabinetes is None or gabinete_id in selected_gabinetes):
+            # Verificar si se debe rotar la pieza
+            rotada = nombre in piezas_girables
+            if rotada:
+                ancho, alto = alto, ancho
+
+            # Una entrada por tipo de pieza con la cantidad del gabinete
+            key = (ancho, alto, nombre, gabinete_id, material, grosor)
+            if key in pieces:
+                pieces[key]["cantidad"] += cantidad
+            else:
+                pieces[key] = {
+                    "width": ancho,
+                    "height": alto,
+                    "nombre": nombre,
+                    "gabinete_id": gabinete_id,
+                    "rotada": rotada,
+                    "cantidad": cantidad,
+                    "material": material,
+                    "grosor": grosor
+                }
+
+    return list(pieces.values())
+
+
+def sort_pieces(pieces, sort_criteria):
+    """Ordena las piezas en su lugar según el criterio seleccionado.
+
+    Con un criterio que no está en ``SORT_CRITERIA`` (por ejemplo
+    ``"input"``) se conserva el orden recibido.
+    """
+    if sort_criteria == "area_desc":
+        pieces.sort(key=lambda p: (p['height'] * p['width'], p['width']), reverse=True)
+    elif sort_criteria == "area_asc":
+        pieces.sort(key=lambda p: (p['height'] * p['width'], p['height']), reverse=False)
+    elif sort_criteria == "width_desc":
+        pieces.sort(key=lambda p: p['width'], reverse=True)
+    elif sort_criteria == "width_asc":
+        pieces.sort(key=lambda p: p['width'], reverse=False)
+    elif sort_criteria == "height_desc":
+        pieces.sort(key=lambda p: p['height'], reverse=True)
+    elif sort_criteria == "height_asc":
+        pieces.sort(key=lambda p: p['height'], reverse=False)
+
+
+def expand_pieces(pieces):
+    """Recorre las piezas repitiendo cada tipo ``cantidad`` veces, sin copiarlo."""
+    for piece in pieces:
+        for _ in range(piece.get('cantidad', 1)):
+            yield piece
+
+
+def count_pieces(pieces):
+    """Número total de piezas de una lista de tipos con ``cantidad``."""
+    return sum(piece.get('cantidad', 1) for piece in pieces)
+
+
+class SpatialGrid:
+    """Rejilla uniforme sobre un panel para consultas de colisión.
+
+    Cada pieza se registra en todas las celdas que toca, de modo que una
+    consulta solo revisa las piezas cercanas en lugar de todo el panel.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def _cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(x // size), int((x + width) // size),
+                int(y // size), int((y + height) // size))
+
+    def insert(self, x, y, width, height):
+        """Registra el rectángulo en las celdas que ocupa."""
+        rect = (x, y, width, height)
+        cx0, cx1, cy0, cy1 = self._cell_range(x, y, width, height)
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = [rect]
+                else:
+                    cell.append(rect)
+
+    def collides(self, x, y, width, height):
+        """Indica si el rectángulo se solapa con alguna pieza registrada."""
+        cx0, cx1, cy0, cy1 = self._cell_range(x, y, width, height)
+        cells = self.cells
+        right = x + width
+        bottom = y + height
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for px, py, pw, ph in cell:
+                    if (x < px + pw and right > px and
+                        y < py + ph and bottom > py):
+                        return True
+        return False
+
+
+class NestingEngine:
+    """Algoritmo de nesting por filas y columnas."""
+
+    def __init__(self, sheet=None, options=None):
+        sheet = sheet or Sheet()
+        options = options or NestOptions()
+
+        self.sheet = sheet
+        self.panel_width = to_ticks(sheet.width)
+        self.panel_height = to_ticks(sheet.height)
+        self.separator = to_ticks(options.separator)
+
+        self.sort_criteria = options.sort_criteria
+        self.piezas_girables = list(options.piezas_girables)
+        self.spatial_index = options.spatial_index
+        self.cell_size = CELDA_INDICE * TICKS_POR_PULGADA
+
+        # Sin estadísticas el bucle solo paga una comparación con None por fase
+        self.stats = NestStats() if options.stats else None
+        if self.stats is not None:
+            self.is_position_valid = self._counted_position_valid
+
+        self.panel_pieces = []  # Lista de piezas para cada panel
+        self.panel_index = []  # Índice espacial de cada panel (solo con spatial_index)
+        self.panel_utilization = []  # Porcentaje de utilización de cada panel
+        self.panel_structure = []  # Filas y columnas libres de cada panel
+        self.panel_rows = []  # Estructura en formato (y, alto, [(x, ancho)])
+        self.panel_cuts = []  # Secuencia de cortes de cada panel (solo guillotina)
+        self.panel_cut_length = []
+        self.panel_repositionings = []
+
+        # progress(colocadas, total, paneles, utilización), ver nest()
+        self.progress = None
+        self.total = 0
+        self.placed = 0
+        self.placed_area = 0
+
+    def optimize_panels(self, pieces):
+        # Ordenar las piezas según el criterio seleccionado
+        sort_pieces(pieces, self.sort_criteria)
+
+        # Inicializamos las listas para paneles
+        self.panel_pieces = []  # Lista para almacenar las piezas colocadas en cada panel
+        self.panel_utilization = []  # Lista para almacenar el porcentaje de utilización de cada panel
+        self.panel_structure = []
+        self.panel_index = []
+        self.panel_free = []  # Resumen de los huecos de cada panel, ver _free_space_summary
+
+        separator = self.separator
+        stats = self.stats
+
+        for piece in pieces:
+            # Las filas se llenan mejor con las piezas girables tumbadas
+            piece = self._lay_flat(piece)
+
+            # Convertir dimensiones de pulgadas a unidades del motor
+            piece_width = to_ticks(piece['width'])
+            piece_height = to_ticks(piece['height'])
+            gabinete_id = piece['gabinete_id']
+            rotated = self._is_rotated(piece)
+
+            remaining = piece.get('cantidad', 1)
+            while remaining > 0:
+                if stats is not None:
+                    start = time.perf_counter()
+                phase = "columna"
+
+                # Variables para el mejor lugar encontrado
+                best_fit = {
+                    'panel_idx': -1,
+                    'row_idx': -1,
+                    'col_idx': -1,
+                    'position': None,
+                    'y': float('inf')  # Priorizar posiciones más altas
+                }
+
+                # 1. Buscar en espacios existentes PRIORIZANDO COLUMNAS
+                for panel_idx, panel in enumerate(self.panel_structure):
+                    if not any(height >= piece_height and room >= piece_width
+                               for height, room in self.panel_free[panel_idx][0]):
+                        continue  # Ninguna fila del panel admite la pieza
+                    for row_idx, row in enumerate(panel):
+                        row_y = row['y']
+                        row_height = row['height']
+
+                        # Verificar si la pieza cabe en la altura de la fila
+                        if piece_height <= row_height:
+                            for col_idx, col in enumerate(row['columns']):
+                                col_x = col['x']
+                                col_width = self.panel_width
+
+                                # Verificar si la pieza cabe en el ancho de la columna
+                                if piece_width <= col_width:
+                                    # Verificar si la posición es válida sin colisiones
+                                    if self.is_position_valid(panel_idx, col_x, row_y, piece_width, piece_height, col_limit=(col_x, col_width), row_limit=(row_y, row_height)):
+                                        # Evaluar si es la mejor posición encontrada
+                                        if row_y < best_fit['y']:
+                                            best_fit = {
+                                                'panel_idx': panel_idx,
+                                                'row_idx': row_idx,
+                                                'col_idx': col_idx,
+                                                'position': (col_x, row_y, piece_width, piece_height),
+                                                'y': row_y
+                                            }
+
+                                    break
+
+                        if best_fit['panel_idx'] != -1:
+                            break
+
+                    # Si ya encontramos un espacio, salir del bucle de paneles
+                    if best_fit['panel_idx'] != -1:
+                        break
+
+                if stats is not None:
+                    start = stats.lap(phase, start)
+
+                # 2. Si no encontramos espacio en columnas existentes
+                if best_fit['panel_idx'] == -1:
+                    phase = "nueva_columna"
+                    # La nueva columna se valida con la altura de la última fila
+                    # del último panel, la última que recorre la búsqueda anterior
+                    # cuando no se salta ningún panel
+                    if self.panel_structure:
+                        row_y = self.panel_structure[-1][-1]['y']
+                        row_height = self.panel_structure[-1][-1]['height']
+                    # Si la pieza no cabe en esa altura, is_position_valid la rechaza en todas las filas
+                    fits_height = bool(self.panel_structure) and piece_height <= min(row_height, self.panel_height - row_y)
+                    # Intentar crear una nueva columna en filas existentes
+                    for panel_idx, panel in enumerate(self.panel_structure if fits_height else ()):
+                        _, spans, min_span, _ = self.panel_free[panel_idx]
+                        if piece_width + min_span > self.panel_width:
+                            continue  # Todas las filas del panel están llenas a lo ancho
+                        for row_idx, row in enumerate(panel):
+                            # Espacio disponible para nueva columna, tras las columnas y tras la última
+                            if spans[row_idx] + piece_width <= self.panel_width:
+                                # Crear nueva columna en la fila
+                                nueva_columna_x = (row['columns'][-1]['x'] + row['columns'][-1]['width']) if row['columns'] else 0
+
+                                if self.is_position_valid(panel_idx, nueva_columna_x, row_y, piece_width, piece_height, col_limit=(nueva_columna_x, piece_width), row_limit=(row_y, row_height)):
+                                    best_fit = {
+                                        'panel_idx': panel_idx,
+                                        'row_idx': row_idx,
+                                        'col_idx': -1,  # Nueva columna
+                                        'position': (nueva_columna_x, row['y'], piece_width, piece_height),
+                                        'y': row['y']
+                                    }
+                                    break
+
+                        if best_fit['panel_idx'] != -1:
+                            break
+                    if stats is not None:
+                        start = stats.lap(phase, start)
+
+                # 3. Si aún no encontramos espacio, crear nueva fila
+                if best_fit['panel_idx'] == -1:
+                    phase = "nueva_fila"
+                    for panel_idx, panel in enumerate(self.panel_structure):
+                        # Posición Y para nueva fila
+                        max_y = self.panel_free[panel_idx][3]
+
+                        if max_y + piece_height <= self.panel_height:
+                            if self.is_position_valid(panel_idx, 0, max_y, piece_width, piece_height):
+                                best_fit = {
+                                    'panel_idx': panel_idx,
+                                    'row_idx': -1,  # Nueva fila
+                                    'col_idx': -1,
+                                    'position': (0, max_y, piece_width, piece_height),
+                                    'y': max_y
+                                }
+                                break
+                    if stats is not None:
+                        start = stats.lap(phase, start)
+
+                # 4. Si no hay espacio, crear nuevo panel
+                if best_fit['panel_idx'] == -1:
+                    phase = "nuevo_panel"
+                    self.panel_pieces.append([])
+                    self.panel_utilization.append(0)
+                    self.panel_structure.append([])
+                    if self.spatial_index:
+                        self.panel_index.append(SpatialGrid(self.cell_size))
+                    self.panel_free.append(None)
+
+                    best_fit = {
+                        'panel_idx': len(self.panel_pieces) - 1,
+                        'row_idx': -1,
+                        'col_idx': -1,
+                        'position': (0, 0, piece_width, piece_height),
+                        'y': 0
+                    }
+                    if stats is not None:
+                        start = stats.lap(phase, start)
+
+                # Colocar pieza
+                panel_idx = best_fit['panel_idx']
+                x, y, pw, ph = best_fit['position']
+
+                # En una fila nueva se colocan de una vez todas las copias
+                # idénticas que caben a lo ancho
+                copies = 1
+                if best_fit['row_idx'] == -1:
+                    copies = max(1, min(remaining, (self.panel_width + separator) // (pw + separator)))
+                    # Solo se validó la primera copia: la franja de las demás
+                    # debe estar libre, porque una columna nueva puede
+                    # sobresalir de su fila (se valida con otra fila)
+                    while copies > 1 and not self.is_position_valid(
+                            panel_idx, x + pw + separator, y, (copies - 1) * (pw + separator) - separator, ph):
+                        copies -= 1
+
+                # Añadir pieza al panel
+                for n in range(copies):
+                    copy_x = x + n * (pw + separator)
+                    self.panel_pieces[panel_idx].append((copy_x, y, pw, ph, piece['width'], piece['height'], piece['nombre'], rotated, gabinete_id))
+                    if self.spatial_index:
+                        self.panel_index[panel_idx].insert(copy_x, y, pw, ph)
+                remaining -= copies
+                self._report(copies, copies * pw * ph)
+
+                # Actualizar estructura
+                if best_fit['row_idx'] >= 0 and best_fit['col_idx'] >= 0:
+                    # Pieza en columna existente
+                    self._update_existing_space(panel_idx, best_fit['row_idx'], best_fit['col_idx'], x, y, pw, ph)
+                elif best_fit['row_idx'] >= 0:
+                    # Nueva columna en fila existente
+                    row = self.panel_structure[panel_idx][best_fit['row_idx']]
+                    row['columns'].append({
+                        'x': x,
+                        'width': pw,
+                        'max_height': ph
+                    })
+                else:
+                    # Nueva fila con la tira de copias
+                    self._create_new_row(panel_idx, x, y, copies * pw + (copies - 1) * separator, ph)
+                self.panel_free[panel_idx] = self._free_space_summary(self.panel_structure[panel_idx])
+
+                if stats is not None:
+                    stats.piezas[phase] += copies
+                    stats.record_panel(panel_idx, self.panel_structure[panel_idx])
+                    stats.lap("actualizar", start)
+
+        # Calcular utilización y convertir estructura
+        self._calculate_utilization()
+        self._convert_structure_to_panel_rows()
+
+    def _free_space_summary(self, panel):
+        """Resumen de las filas de un panel para descartarlo sin recorrerlas.
+
+        Devuelve ``(frontera, ocupado, ocupado_min, fondo)``. ``frontera``
+        son los ``(alto, ancho)`` de las filas con columnas que no quedan por
+        debajo de otra en las dos medidas, donde ``ancho`` va de la primera
+        columna al borde del panel: si ninguno admite la pieza,
+        ``is_position_valid`` la rechaza en todas las columnas. ``ocupado``
+        tiene, por fila, el ancho de sus columnas o el final de la última si
+        es mayor; una columna nueva solo cabe si su ancho más ese valor no
+        pasa del panel. ``fondo`` es la ``y`` donde empezaría una fila nueva.
+        """
+        frontier = []
+        for height, room in sorted(((row['height'], self.panel_width - row['columns'][0]['x'])
+                                    for row in panel if row['columns']), reverse=True):
+            if not frontier or room > frontier[-1][1]:
+                frontier.append((height, room))
+        spans = [max(sum(col['width'] for col in row['columns']),
+                     row['columns'][-1]['x'] + row['columns'][-1]['width'] if row['columns'] else 0)
+                 for row in panel]
+        bottom = max((row['y'] + row['height'] + self.separator for row in panel), default=0)
+        return frontier, spans, min(spans, default=0), bottom
+
+    def _report(self, count, area):
+        """Cuenta las piezas colocadas y avisa a ``progress`` cada ``PROGRESO_CADA``."""
+        self.placed += count
+        self.placed_area += area
+        if self.progress is not None and (self.placed % PROGRESO_CADA < count or self.placed == self.total):
+            panels = len(self.panel_pieces)
+            utilization = self.placed_area / (panels * self.panel_width * self.panel_height) * 100
+            self.progress(self.placed, self.total, panels, utilization)
+
+    def _lay_flat(self, piece):
+        """Devuelve la pieza girable con el lado largo a lo ancho del panel."""
+        if piece.get('girable') and piece['width'] < piece['height']:
+            return dict(piece, width=piece['height'], height=piece['width'], rotada=not self._is_rotated(piece))
+        return piece
+
+    def _orientations(self, piece):
+        """Medidas en unidades del motor ``[(ancho, alto, girada)]`` en que puede ir la pieza.
+
+        Solo las piezas marcadas ``girable`` (ver ``apply_grain``) admiten
+        el giro de 90 grados además de su orientación.
+        """
+        piece_width = to_ticks(piece['width'])
+        piece_height = to_ticks(piece['height'])
+        orientations = [(piece_width, piece_height, False)]
+        if piece.get('girable') and piece_width != piece_height:
+            orientations.append((piece_height, piece_width, True))
+        return orientations
+
+    def _placement(self, piece, x, y, turned):
+        """Tupla de colocación de la pieza, girada 90 grados si ``turned``."""
+        ancho, alto = piece['width'], piece['height']
+        rotated = self._is_rotated(piece)
+        if turned:
+            ancho, alto, rotated = alto, ancho, not rotated
+        return (x, y, to_ticks(ancho), to_ticks(alto), ancho, alto, piece['nombre'], rotated, piece['gabinete_id'])
+
+    def _is_rotated(self, piece):
+        """Indica si la pieza está girada respecto a su diseño.
+
+        Se usa la marca ``rotada`` de la pieza y, si no la tiene, la lista
+        ``piezas_girables``.
+        """
+        rotada = piece.get('rotada')
+        if rotada is None:
+            return piece['nombre'] in self.piezas_girables
+        return rotada
+
+    def is_position_valid(self, panel_idx, x, y, width, height, col_limit=None, row_limit=None):
+        """Verifica si una posición está libre de colisiones y dentro de los límites de su fila y columna."""
+
+        if panel_idx >= len(self.panel_pieces):
+            return True  # Panel nuevo, siempre válido
+
+        # Validar límites del panel completo
+        if x < 0 or y < 0 or x + width > self.panel_width or y + height > self.panel_height:
+            return False
+
+        # Validar límites de la columna
+        if col_limit:
+            col_x, col_width = col_limit
+            if x < col_x or x + width > col_x + col_width:
+                return False
+
+        # Validar límites de la fila
+        if row_limit:
+            row_y, row_height = row_limit
+            if y < row_y or y + height > row_y + row_height:
+                return False
+
+        # Verificar colisiones con las piezas cercanas
+        if self.spatial_index:
+            return not self.panel_index[panel_idx].collides(x, y, width, height)
+
+        # Verificar colisiones con todas las piezas del panel
+        for px, py, pw, ph, _, _, _, _, _ in self.panel_pieces[panel_idx]:
+            if (x < px + pw and x + width > px and
+                y < py + ph and y + height > py):
+                return False
+
+        return True
+
+    def _counted_position_valid(self, panel_idx, x, y, width, height, col_limit=None, row_limit=None):
+        """``is_position_valid`` que cuenta llamadas y rechazos en ``stats``."""
+        valid = NestingEngine.is_position_valid(self, panel_idx, x, y, width, height, col_limit, row_limit)
+        self.stats.validaciones += 1
+        if not valid:
+            self.stats.rechazos += 1
+        return valid
+
+    def _update_existing_space(self, panel_idx, row_idx, col_idx, x, y, piece_width, piece_height):
+        """Actualiza los espacios después de colocar una pieza en un espacio existente."""
+        row = self.panel_structure[panel_idx][row_idx]
+        col = row['columns'][col_idx]
+        separator = self.separator
+
+        # 1. Actualizar columnas - espacios horizontales
+        new_columns = []
+
+        # Espacio a la izquierda de la pieza
+        if x > col['x']:
+            new_columns.append({
+                'x': col['x'],
+                'width': x - col['x'],
+                'max_height': col['max_height']
+            })
+
+        # Espacio a la derecha de la pieza
+        right_x = x + piece_width + separator
+        if right_x < col['x'] + col['width']:
+            new_columns.append({
+                'x': right_x,
+                'width': (col['x'] + col['width']) - right_x,
+                'max_height': col['max_height']
+            })
+
+        # Mantener otras columnas en la fila
+        for i, other_col in enumerate(row['columns']):
+            if i != col_idx:
+                new_columns.append(other_col)
+
+        # Actualizar columnas de la fila
+        row['columns'] = new_columns
+
+        # 2. Crear espacio debajo de la pieza (nueva fila)
+        space_below_y = y + piece_height + separator
+        space_below_height = row['y'] + row['height'] - space_below_y
+
+        if space_below_height > 0:
+            # Buscar si existe una fila en esa posición Y
+            existing_row_idx = -1
+            for idx, exist_row in enumerate(self.panel_structure[panel_idx]):
+                if exist_row['y'] == space_below_y:
+                    existing_row_idx = idx
+                    break
+
+            if existing_row_idx >= 0:
+                # Añadir columna a la fila existente, fusionándola con una vecina
+                self._add_column(self.panel_structure[panel_idx][existing_row_idx], x, piece_width, space_below_height)
+            else:
+                # Crear nueva fila para el espacio debajo
+                new_row = {
+                    'y': space_below_y,
+                    'height': space_below_height,
+                    'columns': [{
+                        'x': x,
+                        'width': piece_width,
+                        'max_height': space_below_height
+                    }]
+                }
+                self.panel_structure[panel_idx].append(new_row)
+
+    def _add_column(self, row, x, width, max_height):
+        """Añade un espacio libre a la fila, fusionándolo con una columna contigua.
+
+        Dos columnas de la misma altura separadas como mucho por el corte
+        forman un único hueco, porque el canal del corte también está libre.
+        """
+        separator = self.separator
+        for col in row['columns']:
+            if col['max_height'] != max_height:
+                continue
+            # La nueva columna empieza justo después de una existente
+            if 0 <= x - (col['x'] + col['width']) <= separator:
+                col['width'] = x + width - col['x']
+                return
+            # La nueva columna termina justo antes de una existente
+            if 0 <= col['x'] - (x + width) <= separator:
+                col['width'] = col['x'] + col['width'] - x
+                col['x'] = x
+                return
+        row['columns'].append({
+            'x': x,
+            'width': width,
+            'max_height': max_height
+        })
+
+    def _create_new_row(self, panel_idx, x, y, piece_width, piece_height):
+        """Crea una nueva fila después de colocar una pieza, incluyendo una fila de 0.125 pulgadas."""
+        separator = self.separator
+
+        # 1. Crear la fila principal con la pieza
+        new_row = {
+            'y': y,
+            'height': piece_height,
+            'columns': []
+        }
+
+        # Añadir espacio a la derecha de la pieza
+        remaining_width = self.panel_width - (x + piece_width)
+        if remaining_width > 0:
+            new_row['columns'].append({
+                'x': x + piece_width + separator,
+                'width': remaining_width,
+                'max_height': piece_height
+            })
+
+        self.panel_structure[panel_idx].append(new_row)
+
+    def _calculate_utilization(self):
+        """Calcula el porcentaje de utilización de cada panel."""
+        self.panel_utilization = []  # Reiniciar para evitar duplicados
+        total_area = self.panel_width * self.panel_height
+        for pieces in self.panel_pieces:
+            used_area = sum(p[2] * p[3] for p in pieces)  # Suma de áreas
+            utilization = (used_area / total_area) * 100
+            self.panel_utilization.append(utilization)
+
+    def _convert_structure_to_panel_rows(self):
+        """Convierte la estructura interna a formato panel_rows para compatibilidad."""
+        self.panel_rows = []
+
+        for panel in self.panel_structure:
+            panel_rows = []
+
+            for row in panel:
+                # Convertir columnas al formato esperado (x, width) para compatibilidad
+                compatible_columns = [(col['x'], col['width']) for col in row['columns']]
+                panel_rows.append((row['y'], row['height'], compatible_columns))
+
+            self.panel_rows.append(panel_rows)
+
+    def result(self):
+        """Empaqueta el estado actual del motor en un ``NestResult``."""
+        return NestResult(
+            panel_pieces=self.panel_pieces,
+            panel_utilization=self.panel_utilization,
+            panel_structure=self.panel_structure,
+            panel_rows=self.panel_rows,
+            panel_width=self.panel_width,
+            panel_height=self.panel_height,
+            panel_cuts=self.panel_cuts,
+            panel_cut_length=self.panel_cut_length,
+            panel_repositionings=self.panel_repositionings,
+            panel_sheets=[self.sheet] * len(self.panel_pieces),
+            stats=self.stats,
+        )
+
+
+class MaxRectsBin:
+    """Lista de rectángulos libres máximos de un panel.
+
+    Los rectángulos se guardan como tuplas ``(x, y, ancho, alto)``. Tras cada
+    colocación se dividen los rectángulos afectados y se eliminan los que
+    quedan contenidos en otro, de modo que la lista solo tiene rectángulos
+    libres máximos.
+    """
+
+    def __init__(self, width, height):
+        self.free_rects = [(0, 0, width, height)]
+
+    def find_position(self, width, height, heuristic):
+        """Devuelve ``(score, x, y)`` del mejor hueco para la pieza, o ``None``."""
+        best = None
+        for fx, fy, fw, fh in self.free_rects:
+            if width > fw or height > fh:
+                continue
+            if heuristic == "bssf":
+                sobrante_x = fw - width
+                sobrante_y = fh - height
+                score = (min(sobrante_x, sobrante_y), max(sobrante_x, sobrante_y))
+            elif heuristic == "baf":
+                score = (fw * fh - width * height, min(fw - width, fh - height))
+            else:  # "bl"
+                score = (fy + height, fx)
+            if best is None or score < best[0]:
+                best = (score, fx, fy)
+        return best
+
+    def place(self, x, y, width, height):
+        """Ocupa el rectángulo indicado y actualiza la lista de libres."""
+        right = x + width
+        bottom = y + height
+        new_rects = []
+        for rect in self.free_rects:
+            fx, fy, fw, fh = rect
+            # Sin intersección, el rectángulo libre se conserva
+            if x >= fx + fw or right <= fx or y >= fy + fh or bottom <= fy:
+                new_rects.append(rect)
+                continue
+            # Dividir en los hasta cuatro rectángulos que rodean la pieza
+            if x > fx:
+                new_rects.append((fx, fy, x - fx, fh))
+            if right < fx + fw:
+                new_rects.append((right, fy, fx + fw - right, fh))
+            if y > fy:
+                new_rects.append((fx, fy, fw, y - fy))
+            if bottom < fy + fh:
+                new_rects.append((fx, bottom, fw, fy + fh - bottom))
+        self.free_rects = self._prune(new_rects)
+
+    @staticmethod
+    def _prune(rects):
+        """Elimina los rectángulos contenidos en otro de la lista."""
+        # Ordenar por área descendente para que los contenedores vayan primero
+        rects.sort(key=lambda r: r[2] * r[3], reverse=True)
+        kept = []
+        for rect in rects:
+            x, y, w, h = rect
+            contained = False
+            for kx, ky, kw, kh in kept:
+                if x >= kx and y >= ky and x + w <= kx + kw and y + h <= ky + kh:
+                    contained = True
+                    break
+            if not contained:
+                kept.append(rect)
+        return kept
+
+
+class MaxRectsEngine(NestingEngine):
+    """Algoritmo MaxRects con lista podada de rectángulos libres.
+
+    La separación se aplica inflando cada pieza y el panel en ``separator``,
+    de modo que entre dos piezas queda siempre el ancho del corte y las
+    piezas pueden tocar el borde del panel.
+    """
+
+    def __init__(self, sheet=None, options=None, heuristic="bssf"):
+        super().__init__(sheet, options)
+        self.heuristic = heuristic
+
+    def optimize_panels(self, pieces):
+        sort_pieces(pieces, self.sort_criteria)
+
+        self.panel_pieces = []
+        self.panel_utilization = []
+        self.panel_structure = []  # Un MaxRectsBin por panel
+
+        separator = self.separator
+        bin_width = self.panel_width + separator
+        bin_height = self.panel_height + separator
+
+        for piece in expand_pieces(pieces):
+            orientations = self._orientations(piece)
+
+            # Mejor hueco y orientación entre todos los paneles abiertos
+            best = None
+            best_panel = -1
+            for panel_idx, free_bin in enumerate(self.panel_structure):
+                for piece_width, piece_height, turned in orientations:
+                    found = free_bin.find_position(piece_width + separator, piece_height + separator, self.heuristic)
+                    if found is not None and (best is None or found[0] < best[0][0]):
+                        best = (found, turned)
+                        best_panel = panel_idx
+
+            # Abrir un panel nuevo si no cabe en ninguno
+            if best is None:
+                free_bin = MaxRectsBin(bin_width, bin_height)
+                for piece_width, piece_height, turned in orientations:
+                    found = free_bin.find_position(piece_width + separator, piece_height + separator, self.heuristic)
+                    if found is not None and (best is None or found[0] < best[0][0]):
+                        best = (found, turned)
+                # Una pieza mayor que el panel ocupa uno propio, como en "filas"
+                best = best or (((), 0, 0), False)
+                self.panel_structure.append(free_bin)
+                self.panel_pieces.append([])
+                best_panel = len(self.panel_structure) - 1
+
+            (_, x, y), turned = best
+            placement = self._placement(piece, x, y, turned)
+            self.panel_structure[best_panel].place(x, y, placement[2] + separator, placement[3] + separator)
+            self.panel_pieces[best_panel].append(placement)
+            self._report(1, placement[2] * placement[3])
+
+        self._calculate_utilization()
+        self._convert_structure_to_panel_rows()
+
+    def _convert_structure_to_panel_rows(self):
+        """Expone los rectángulos libres en formato panel_rows para depuración."""
+        self.panel_rows = []
+        for free_bin in self.panel_structure:
+            self.panel_rows.append([(fy, fh, [(fx, fw)]) for fx, fy, fw, fh in free_bin.free_rects])
+
+
+class SkylineBin:
+    """Contorno (skyline) superior ocupado de un panel.
+
+    ``segments`` es una lista de ``[x, y, ancho]`` ordenada por ``x`` que
+    cubre todo el ancho del panel; ``y`` es la primera coordenada libre
+    por debajo de lo ya colocado en ese tramo.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.segments = [[0, 0, width]]
+        self.rejected = None  # Última pieza (ancho, alto) que no cupo desde el último cambio
+
+    def find_position(self, width, height):
+        """Devuelve ``(score, indice, x, y)`` de la posición más alta y a la izquierda, o ``None``."""
+        # Si ya no cupo una pieza menor o igual, esta tampoco cabe
+        rejected = self.rejected
+        if rejected is not None and width >= rejected[0] and height >= rejected[1]:
+            return None
+        segments = self.segments
+        limit_y = self.height
+        limit_x = self.width
+        best = None
+        best_bottom = limit_y + 1
+        count = len(segments)
+        for i in range(count):
+            x = segments[i][0]
+            if x + width > limit_x:
+                break
+            # Altura de apoyo: la máxima de los tramos que cubre la pieza
+            y = 0
+            remaining = width
+            j = i
+            while remaining > 0 and j < count:
+                seg_y = segments[j][1]
+                if seg_y > y:
+                    y = seg_y
+                    if y + height >= best_bottom:
+                        break
+                remaining -= segments[j][2]
+                j += 1
+            else:
+                bottom = y + height
+                if bottom <= limit_y and bottom < best_bottom:
+                    best_bottom = bottom
+                    best = ((bottom, x), i, x, y)
+        if best is None:
+            self.rejected = (width, height)
+        return best
+
+    def free_height(self):
+        """Altura libre máxima bajo el contorno."""
+        return self.height - min(segment[1] for segment in self.segments)
+
+    def place(self, index, x, y, width, height):
+        """Coloca la pieza sobre el tramo ``index`` y actualiza el contorno."""
+        self.rejected = None
+        segments = self.segments
+        right = x + width
+        new_segment = [x, y + height, width]
+
+        # Recortar o eliminar los tramos cubiertos por la pieza
+        j = index
+        while j < len(segments) and segments[j][0] < right:
+            seg_right = segments[j][0] + segments[j][2]
+            if seg_right <= right:
+                j += 1
+            else:
+                segments[j][2] = seg_right - right
+                segments[j][0] = right
+                break
+        segments[index:j] = [new_segment]
+
+        # Fusionar tramos vecinos a la misma altura
+        if index + 1 < len(segments) and segments[index + 1][1] == new_segment[1]:
+            new_segment[2] += segments[index + 1][2]
+            del segments[index + 1]
+        if index > 0 and segments[index - 1][1] == new_segment[1]:
+            segments[index - 1][2] += new_segment[2]
+            del segments[index]
+
+
+class SkylineEngine(NestingEngine):
+    """Algoritmo skyline para pedidos con muchas piezas pequeñas.
+
+    Cada pieza va al primer panel abierto donde cabe (primer ajuste) y,
+    dentro del panel, a la posición más alta y a la izquierda del contorno.
+    Un panel se cierra en cuanto su altura libre es menor que la de la
+    pieza más baja que queda por colocar, y la búsqueda se reanuda en el
+    panel de la pieza anterior cuando esta no era mayor, de modo que el
+    coste por pieza es casi constante aunque el pedido crezca. La
+    separación se aplica como en ``MaxRectsEngine``.
+    """
+
+    def optimize_panels(self, pieces):
+        sort_pieces(pieces, self.sort_criteria)
+
+        self.panel_pieces = []
+        self.panel_utilization = []
+        self.panel_structure = []  # Un SkylineBin por panel
+
+        separator = self.separator
+        bin_width = self.panel_width + separator
+        bin_height = self.panel_height + separator
+        open_panels = []  # Índices de los paneles donde aún se busca hueco, en orden
+        resume = None  # (medidas en cada orientación, panel) de la última pieza colocada
+
+        # Altura mínima de las piezas pendientes a partir de cada posición
+        min_remaining = [0] * len(pieces)
+        lowest = float('inf')
+        for i in range(len(pieces) - 1, -1, -1):
+            lowest = min(lowest, min(h for _, h, _ in self._orientations(pieces[i])) + separator)
+            min_remaining[i] = lowest
+
+        placed = 0
+        for i, piece in enumerate(pieces):
+            # Medidas con la separación en cada orientación posible
+            orientations = [(w + separator, h + separator, turned) for w, h, turned in self._orientations(piece)]
+            sizes = [(width, height) for width, height, _ in orientations]
+
+            for _ in range(piece.get('cantidad', 1)):
+                # Cerrar paneles donde ya no cabe ninguna pieza pendiente
+                if open_panels and placed % SKYLINE_REVISION_CIERRE == 0:
+                    open_panels = [idx for idx in open_panels
+                                   if self.panel_structure[idx].free_height() >= min_remaining[i]]
+
+                # Los paneles anteriores al de la última pieza ya rechazaron una
+                # pieza menor o igual en todas sus orientaciones y no han
+                # cambiado, así que se saltan
+                start = 0
+                if resume is not None and all(any(width >= rw and height >= rh for rw, rh in resume[0])
+                                              for width, height in sizes):
+                    start = bisect_left(open_panels, resume[1])
+
+                found = None
+                panel_idx = -1
+                for pos in range(start, len(open_panels)):
+                    panel_idx = open_panels[pos]
+                    found = self._best_orientation(self.panel_structure[panel_idx], orientations)
+                    if found is not None:
+                        break
+
+                if found is None:
+                    skyline = SkylineBin(bin_width, bin_height)
+                    # Una pieza mayor que el panel ocupa uno propio, como en "filas"
+                    found = self._best_orientation(skyline, orientations) or (((), 0, 0, 0), orientations[0])
+                    self.panel_structure.append(skyline)
+                    self.panel_pieces.append([])
+                    panel_idx = len(self.panel_structure) - 1
+                    open_panels.append(panel_idx)
+
+                (_, index, x, y), (width, height, turned) = found
+                self.panel_structure[panel_idx].place(index, x, y, width, height)
+                self.panel_pieces[panel_idx].append(self._placement(piece, x, y, turned))
+                resume = (sizes, panel_idx)
+                placed += 1
+                self._report(1, (width - separator) * (height - separator))
+
+        self._calculate_utilization()
+        self._convert_structure_to_panel_rows()
+
+    @staticmethod
+    def _best_orientation(skyline, orientations):
+        """Posición más alta del contorno entre las orientaciones, con la orientación usada."""
+        best = None
+        for orientation in orientations:
+            found = skyline.find_position(orientation[0], orientation[1])
+            if found is not None and (best is None or found[0] < best[0][0]):
+                best = (found, orientation)
+        return best
+
+    def _convert_structure_to_panel_rows(self):
+        """Expone el espacio bajo el contorno en formato panel_rows para depuración."""
+        self.panel_rows = []
+        for skyline in self.panel_structure:
+            self.panel_rows.append([(y, self.panel_height - y, [(x, w)])
+                                    for x, y, w in skyline.segments if y < self.panel_height])
+
+
+class GuillotineEngine(NestingEngine):
+    """Nesting en tres etapas de guillotina para la sierra de paneles.
+
+    Cada panel se divide con cortes de lado a lado:
+
+    1. *rip*: cortes horizontales que separan franjas a todo el ancho.
+    2. *crosscut*: cortes verticales que dividen cada franja en pilas.
+    3. *recut*: cortes horizontales que separan las piezas de cada pila.
+
+    Si una pieza es más estrecha que su pila se añade un corte ``trim``.
+    ``panel_structure`` guarda el árbol de cortes de cada panel: una lista
+    de franjas ``{'y', 'height', 'used_width', 'stacks'}`` y, en cada
+    franja, pilas ``{'x', 'width', 'used_height', 'pieces'}`` con los
+    índices de sus piezas en ``panel_pieces``. Las medidas de franjas y
+    pilas incluyen la separación, que actúa como ancho de corte.
+    """
+
+    # Orden en que se ejecutan las etapas en la sierra
+    ETAPAS = ("rip", "crosscut", "recut", "trim")
+
+    def optimize_panels(self, pieces):
+        sort_pieces(pieces, self.sort_criteria)
+
+        self.panel_pieces = []
+        self.panel_utilization = []
+        self.panel_structure = []
+
+        separator = self.separator
+        bin_width = self.panel_width + separator
+        bin_height = self.panel_height + separator
+        used_heights = []  # Altura ocupada por las franjas de cada panel
+
+        for piece in expand_pieces(pieces):
+            # Una pieza girable se gira solo si así cabe en un panel abierto
+            orientations = [(w + separator, h + separator, turned) for w, h, turned in self._orientations(piece)]
+
+            stack = None
+            for panel_idx, strips in enumerate(self.panel_structure):
+                for width, height, turned in orientations:
+                    stack = self._place_in_panel(panel_idx, strips, used_heights, width, height, bin_width, bin_height)
+                    if stack is not None:
+                        break
+                if stack is not None:
+                    break
+
+            if stack is None:
+                width, height, turned = orientations[0]
+                self.panel_structure.append([])
+                self.panel_pieces.append([])
+                used_heights.append(0)
+                panel_idx = len(self.panel_structure) - 1
+                # Una pieza mayor que el panel ocupa uno propio, como en "filas"
+                stack = self._new_strip(panel_idx, self.panel_structure[panel_idx], used_heights, width, height)
+
+            x = stack['x']
+            y = stack['y'] + stack['used_height'] - height
+            stack['pieces'].append(len(self.panel_pieces[panel_idx]))
+            placement = self._placement(piece, x, y, turned)
+            self.panel_pieces[panel_idx].append(placement)
+            self._report(1, placement[2] * placement[3])
+
+        self._calculate_utilization()
+        self._convert_structure_to_panel_rows()
+        self._build_cut_plans()
+
+    def _place_in_panel(self, panel_idx, strips, used_heights, width, height, bin_width, bin_height):
+        """Busca sitio en el panel y devuelve la pila que recibe la pieza, o ``None``."""
+        # 1. Pila existente con el menor sobrante de ancho
+        best_stack = None
+        for strip in strips:
+            if height > strip['height']:
+                continue
+            for stack in strip['stacks']:
+                if width <= stack['width'] and stack['used_height'] + height <= strip['height']:
+                    if best_stack is None or stack['width'] < best_stack['width']:
+                        best_stack = stack
+        if best_stack is not None:
+            best_stack['used_height'] += height
+            return best_stack
+
+        # 2. Pila nueva en la franja más ajustada en altura
+        best_strip = None
+        for strip in strips:
+            if height <= strip['height'] and strip['used_width'] + width <= bin_width:
+                if best_strip is None or strip['height'] < best_strip['height']:
+                    best_strip = strip
+        if best_strip is not None:
+            return self._new_stack(best_strip, width, height)
+
+        # 3. Franja nueva
+        if used_heights[panel_idx] + height <= bin_height:
+            return self._new_strip(panel_idx, strips, used_heights, width, height)
+
+        return None
+
+    def _new_strip(self, panel_idx, strips, used_heights, width, height):
+        strip = {'y': used_heights[panel_idx], 'height': height, 'used_width': 0, 'stacks': []}
+        strips.append(strip)
+        used_heights[panel_idx] += height
+        return self._new_stack(strip, width, height)
+
+    @staticmethod
+    def _new_stack(strip, width, height):
+        stack = {'x': strip['used_width'], 'y': strip['y'], 'width': width, 'used_height': height, 'pieces': []}
+        strip['stacks'].append(stack)
+        strip['used_width'] += width
+        return stack
+
+    def _build_cut_plans(self):
+        """Genera la secuencia de cortes, su longitud y los reposicionamientos de cada panel.
+
+        Dentro de cada etapa los cortes se agrupan por medida, de modo que
+        la sierra solo se reposiciona cuando cambia la medida o la etapa.
+        """
+        separator = self.separator
+        self.panel_cuts = []
+        self.panel_cut_length = []
+        self.panel_repositionings = []
+
+        for strips, pieces in zip(self.panel_structure, self.panel_pieces):
+            cuts = {etapa: [] for etapa in self.ETAPAS}
+            for strip in strips:
+                strip_height = strip['height'] - separator
+                strip_bottom = strip['y'] + strip_height
+                if strip_bottom < self.panel_height:
+                    cuts["rip"].append((strip_height, 0, strip_bottom, self.panel_width, strip_bottom))
+                for stack in strip['stacks']:
+                    stack_width = stack['width'] - separator
+                    stack_right = stack['x'] + stack_width
+                    if stack_right < self.panel_width:
+                        cuts["crosscut"].append((stack_width, stack_right, strip['y'], stack_right, strip_bottom))
+                    for piece_idx in stack['pieces']:
+                        x, y, pw, ph = pieces[piece_idx][:4]
+                        if y + ph < strip_bottom:
+                            cuts["recut"].append((ph, stack['x'], y + ph, stack_right, y + ph))
+                        if pw < stack_width:
+                            cuts["trim"].append((pw, x + pw, y, x + pw, y + ph))
+
+            sequence = []
+            length = 0
+            repositionings = 0
+            setting = None
+            for etapa in self.ETAPAS:
+                for medida, x0, y0, x1, y1 in sorted(cuts[etapa], key=lambda cut: cut[0]):
+                    medida = medida / TICKS_POR_PULGADA
+                    if (etapa, medida) != setting:
+                        repositionings += 1
+                        setting = (etapa, medida)
+                    sequence.append({'etapa': etapa, 'medida': medida, 'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1})
+                    length += abs(x1 - x0) + abs(y1 - y0)
+
+            self.panel_cuts.append(sequence)
+            self.panel_cut_length.append(length / TICKS_POR_PULGADA)
+            self.panel_repositionings.append(repositionings)
+
+    def _convert_structure_to_panel_rows(self):
+        """Expone el sobrante de cada franja en formato panel_rows para depuración."""
+        self.panel_rows = []
+        for strips in self.panel_structure:
+            self.panel_rows.append([(strip['y'], strip['height'] - self.separator,
+                                     [(strip['used_width'], self.panel_width - strip['used_width'])])
+                                    for strip in strips])
+
+
+# Estrategias seleccionables mediante NestOptions.strategy
+ESTRATEGIAS = {
+    "filas": lambda sheet, options: NestingEngine(sheet, options),
+    "maxrects_bssf": lambda sheet, options: MaxRectsEngine(sheet, options, "bssf"),
+    "maxrects_baf": lambda sheet, options: MaxRectsEngine(sheet, options, "baf"),
+    "maxrects_bl": lambda sheet, options: MaxRectsEngine(sheet, options, "bl"),
+    "skyline": lambda sheet, options: SkylineEngine(sheet, options),
+    "guillotina": lambda sheet, options: GuillotineEngine(sheet, options),
+}
+
+
+def create_engine(sheet=None, options=None):
+    """Crea el motor correspondiente a ``options.strategy``."""
+    options = options or NestOptions()
+    if options.strategy not in ESTRATEGIAS:
+        raise ValueError(f"Estrategia de nesting desconocida: {options.strategy}")
+    return ESTRATEGIAS[options.strategy](sheet, options)
+
+
+def nest(pieces, sheet=None, options=None, progress=None):
+    """Anida ``pieces`` en láminas de tamaño ``sheet`` y devuelve un ``NestResult``.
+
+    ``pieces`` es una lista de diccionarios con ``width``, ``height``,
+    ``nombre``, ``gabinete_id`` y opcionalmente ``rotada`` y ``cantidad``
+    (medidas en pulgadas), como la que devuelve ``load_pieces``. La lista
+    se ordena en su lugar.
+
+    Si se indica, ``progress(colocadas, total, paneles, utilización)`` se
+    llama cada ``PROGRESO_CADA`` piezas y al terminar; puede lanzar
+    ``NestCancelled`` para abandonar el nesting.
+    """
+    engine = create_engine(sheet, options)
+    engine.progress = progress
+    engine.total = count_pieces(pieces)
+    engine.optimize_panels(pieces)
+    return engine.result()
+
+
+def apply_rotation_policy(pieces, piezas_girables, policy):
+    """Devuelve una copia de ``pieces`` con la política de rotación aplicada.
+
+    Solo cambian las piezas cuyo nombre está en ``piezas_girables``.
+    """
+    if policy == "operador":
+        return [dict(piece) for piece in pieces]
+
+    result = []
+    for piece in pieces:
+        piece = dict(piece)
+        if piece['nombre'] in piezas_girables:
+            # Recuperar la orientación de diseño
+            width, height = piece['width'], piece['height']
+            if piece.get('rotada', True):
+                width, height = height, width
+            rotada = policy == "horizontal" and width < height
+            if rotada:
+                width, height = height, width
+            piece['width'], piece['height'], piece['rotada'] = width, height, rotada
+        result.append(piece)
+    return result
+
+
+def _result_key(result):
+    """Clave de comparación: menos paneles y, a igualdad, paneles más llenos."""
+    return (result.panel_count, [-u for u in sorted(result.panel_utilization, reverse=True)])
+
+
+def _nest_variant(pieces, sheet, options, sort_criteria, policy):
+    options = NestOptions(**{**options.__dict__, 'sort_criteria': sort_criteria})
+    variant_pieces = apply_rotation_policy(pieces, options.piezas_girables, policy)
+    result = nest(variant_pieces, sheet, options)
+    result.variant = {'sort_criteria': sort_criteria, 'rotacion': policy}
+    return result
+
+
+def nest_best(pieces, sheet=None, options=None, workers=None, progress=None):
+    """Prueba todos los criterios de ordenación y políticas de rotación en paralelo.
+
+    Cada combinación se anida en un proceso distinto de un
+    ``ProcessPoolExecutor`` con ``workers`` procesos (por defecto, uno por
+    núcleo). Devuelve el ``NestResult`` con menos paneles y, a igualdad,
+    con la mayor utilización panel a panel; su campo ``variant`` indica
+    la combinación ganadora. En cuanto una combinación alcanza la cota L2
+    de ``lower_bounds`` ya no puede haber otra con menos paneles, y las
+    pendientes se cancelan.
+
+    ``progress`` recibe ``(combinaciones hechas, total, paneles,
+    utilización)`` del mejor resultado cada vez que termina una
+    combinación; si lanza ``NestCancelled`` se cancelan las pendientes.
+    """
+    sheet = sheet or Sheet()
+    options = options or NestOptions()
+    variants = [(sort_criteria, policy) for sort_criteria in SORT_CRITERIA for policy in POLITICAS_ROTACION]
+    bound = lower_bounds(pieces, sheet, options)['l2']
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_nest_variant, pieces, sheet, options, sort_criteria, policy)
+                   for sort_criteria, policy in variants]
+        best = None
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                if best is None or _result_key(result) < _result_key(best):
+                    best = result
+                if progress is not None:
+                    progress(done, len(futures), best.panel_count, best.total_utilization)
+                if best.panel_count <= bound:
+                    executor.shutdown(cancel_futures=True)
+                    break
+        except NestCancelled:
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    best.variant['combinaciones'] = done
+    return best
+
+
+# Campos de NestResult con un elemento por panel
+CAMPOS_POR_PANEL = (
+    "panel_pieces",
+    "panel_utilization",
+    "panel_structure",
+    "panel_rows",
+    "panel_cuts",
+    "panel_cut_length",
+    "panel_repositionings",
+    "panel_materials",
+    "panel_sheets",
+)
+
+# Tipo de material de MaterialManager que corresponde a cada familia de
+# material de las piezas
+TIPOS_MATERIAL = {
+    "Plywood": "Madera",
+    "Medex": "MDF",
+}
+
+# Área de piezas, en láminas, que se prueba en cada medida al elegir la
+# siguiente lámina en nest_min_cost
+LAMINAS_PRUEBA = 2
+
+# Utilización que se espera de una lámina al estimar el costo de lo que
+# queda por anidar
+LLENADO_ESTIMADO = 0.85
+
+# Valores de p y de q que se prueban como máximo en la cota L2
+COTA_VALORES_MAX = 32
+
+
+def load_stock(json_data):
+    """Lee las láminas en existencia de ``materiales.json``.
+
+    Devuelve una lista ``[(tipo, grosor, Sheet)]``. ``Ancho`` y ``Alto`` se
+    toman como el lado largo y el corto de la lámina, que el motor coloca
+    siempre apaisada, y ``Grano`` indica si la lámina tiene veta.
+    """
+    stock = []
+    for material in json_data.get("materiales", []):
+        try:
+            long_side = max(float(material["Ancho"]), float(material["Alto"]))
+            short_side = min(float(material["Ancho"]), float(material["Alto"]))
+            sheet = Sheet(long_side, short_side, float(material.get("Precio") or 0), bool(material.get("Grano")))
+            stock.append((material["Tipo"], float(material["Grosor"]), sheet))
+        except (KeyError, TypeError, ValueError):
+            print(f"Material sin medidas válidas en materiales.json: {material}")
+    return stock
+
+
+def stock_sheets(stock, key):
+    """Láminas de ``stock`` que sirven para el grupo ``(material, grosor)``.
+
+    El grosor debe coincidir y el tipo debe ser el nombre del material o
+    el que le asigna ``TIPOS_MATERIAL`` por su primera palabra.
+    """
+    material, grosor = key
+    family = material.split()[0] if material else ""
+    types = {material, family, TIPOS_MATERIAL.get(family)}
+    return [sheet for tipo, stock_grosor, sheet in stock
+            if tipo in types and abs(stock_grosor - grosor) < 1e-3]
+
+
+def apply_grain(pieces, stock):
+    """Devuelve una copia de ``pieces`` que marca ``girable`` según la veta del material.
+
+    Una pieza es girable si su material tiene láminas en ``stock`` y
+    ninguna tiene veta: el motor la gira 90 grados cuando así encaja
+    mejor. Las piezas de materiales con veta, o sin láminas en ``stock``,
+    conservan su orientación.
+    """
+    grain = {}
+    result = []
+    for piece in pieces:
+        key = material_key(piece)
+        if key not in grain:
+            sheets = stock_sheets(stock, key)
+            grain[key] = not sheets or any(sheet.grain for sheet in sheets)
+        result.append(dict(piece, girable=not grain[key]))
+    return result
+
+
+def material_key(piece):
+    """Grupo de material de una pieza: ``(material, grosor)``."""
+    return (piece.get('material') or "", piece.get('grosor') or 0)
+
+
+def group_pieces(pieces):
+    """Reparte las piezas en grupos ``{(material, grosor): piezas}`` ordenados.
+
+    Sin piezas devuelve un único grupo vacío, para que el resultado tenga
+    igualmente las medidas de la lámina.
+    """
+    groups = {}
+    for piece in pieces:
+        groups.setdefault(material_key(piece), []).append(piece)
+    return dict(sorted(groups.items())) or {material_key({}): []}
+
+
+def _group_summary(result):
+    """Paneles y utilización media de cada grupo de material de ``result``."""
+    utilizations = {}
+    costs = {}
+    for key, utilization, sheet in zip(result.panel_materials, result.panel_utilization, result.panel_sheets):
+        utilizations.setdefault(key, []).append(utilization)
+        costs[key] = costs.get(key, 0) + sheet.price
+    return [{'material': material, 'grosor': grosor, 'paneles': len(values),
+             'utilizacion': sum(values) / len(values), 'costo': costs[(material, grosor)]}
+            for (material, grosor), values in utilizations.items()]
+
+
+def merge_results(results):
+    """Une los ``NestResult`` de cada grupo de material en uno solo.
+
+    ``results`` es un diccionario ``{(material, grosor): NestResult}``. Los
+    paneles quedan en el orden de los grupos; ``panel_materials`` indica el
+    grupo de cada uno y ``variant['grupos']`` los paneles, la utilización
+    media, el costo y el ``variant`` de cada grupo. ``panel_width`` y
+    ``panel_height`` son los de la lámina más grande, y ``stats`` suma los
+    contadores de los grupos que los tienen.
+    """
+    merged = NestResult(**{name: [] for name in CAMPOS_POR_PANEL}, panel_width=0, panel_height=0)
+    groups = []
+    for (material, grosor), result in results.items():
+        for name in CAMPOS_POR_PANEL:
+            if name != "panel_materials":
+                getattr(merged, name).extend(getattr(result, name))
+        merged.panel_materials.extend([(material, grosor)] * result.panel_count)
+        if result.panel_width * result.panel_height > merged.panel_width * merged.panel_height:
+            merged.panel_width, merged.panel_height = result.panel_width, result.panel_height
+        groups.append({'material': material, 'grosor': grosor, 'paneles': result.panel_count,
+                       'utilizacion': result.total_utilization, 'costo': result.total_cost,
+                       'variant': result.variant})
+        if result.stats is not None:
+            if merged.stats is None:
+                merged.stats = NestStats()
+            merged.stats.merge(result.stats)
+    merged.variant = {'grupos': groups}
+    return merged
+
+
+def _trial_pieces(pieces, sheet):
+    """Primeras piezas de ``pieces`` (ya ordenadas) hasta ``LAMINAS_PRUEBA`` láminas de área."""
+    limit = LAMINAS_PRUEBA * sheet.width * sheet.height
+    trial = []
+    area = 0
+    for piece in pieces:
+        piece_area = piece['width'] * piece['height']
+        cantidad = piece.get('cantidad', 1)
+        if trial and area + piece_area > limit:
+            break
+        take = max(1, min(cantidad, int((limit - area) // piece_area)))
+        trial.append(dict(piece, cantidad=take))
+        area += take * piece_area
+    return trial
+
+
+def _stock_cost(area, prices, capacities):
+    """Costo estimado de anidar ``area`` pulgadas cuadradas en láminas.
+
+    Se llenan láminas enteras de una medida y lo que sobra va en la
+    lámina más barata donde cabe.
+    """
+    if area <= 0:
+        return 0
+    best = None
+    for price, capacity in zip(prices, capacities):
+        full, rest = divmod(area, capacity)
+        cost = full * price
+        if rest > 0:
+            cost += min(p for p, c in zip(prices, capacities) if c >= rest)
+        if best is None or cost < best:
+            best = cost
+    return best
+
+
+def nest_min_cost(pieces, sheets, options=None, progress=None):
+    """Anida ``pieces`` en láminas de varias medidas minimizando el costo.
+
+    Antes de abrir cada lámina se anidan de prueba, en cada medida de
+    ``sheets``, las siguientes piezas pendientes, y se elige la medida
+    con menor precio más el costo estimado (``_stock_cost``) de lo que
+    quedaría pendiente. El panel más lleno de la prueba ganadora se
+    conserva tal cual y sus piezas salen de las pendientes. Como la
+    elección es voraz, el resultado se compara al final con el de anidar
+    todo en cada medida por separado y se devuelve el más barato. Si
+    ninguna lámina tiene precio se minimiza el área total.
+
+    ``panel_sheets`` del resultado indica la lámina de cada panel, y
+    ``panel_width``/``panel_height`` son los de la lámina más grande.
+    ``progress`` recibe ``(colocadas, total, paneles, utilización)`` tras
+    cada panel de la elección voraz.
+    """
+    options = options or NestOptions()
+    if len(sheets) == 1 or not pieces:
+        return nest(pieces, sheets[0], options, progress)
+
+    if any(sheet.price for sheet in sheets):
+        prices = [sheet.price for sheet in sheets]
+    else:
+        prices = [sheet.width * sheet.height for sheet in sheets]
+
+    def cost(result):
+        return (sum(prices[sheets.index(sheet)] for sheet in result.panel_sheets), result.panel_count)
+
+    mixed = _nest_mixed_sheets(pieces, sheets, prices, options, progress)
+    # Anidar todo en una medida solo vale si en ella caben todas las piezas
+    single = [nest([dict(piece) for piece in pieces], sheet, options) for sheet in sheets
+              if all(_fits(piece, sheet) or not any(_fits(piece, other) for other in sheets) for piece in pieces)]
+    return min([mixed] + single, key=cost)
+
+
+def _nest_mixed_sheets(pieces, sheets, prices, options, progress):
+    """Elección voraz de la medida de cada lámina, ver ``nest_min_cost``."""
+    capacities = [sheet.width * sheet.height * LLENADO_ESTIMADO for sheet in sheets]
+    largest_sheet = max(sheets, key=lambda sheet: sheet.width * sheet.height)
+
+    # Las colocaciones no llevan material: se identifican por medidas,
+    # nombre, gabinete y giro
+    pending = Counter()
+    types = {}
+    for piece in pieces:
+        key = _piece_key(piece, options.piezas_girables)[:5]
+        pending[key] += piece.get('cantidad', 1)
+        types[key] = piece
+    total = sum(pending.values())
+    remaining_area = sum(key[0] * key[1] * cantidad for key, cantidad in pending.items())
+    # Medidas donde cabe cada pieza; la que no cabe en ninguna ocupa la mayor
+    fits = {key: [sheet for sheet in sheets if _fits(piece, sheet)] or [largest_sheet]
+            for key, piece in types.items()}
+
+    panels = {name: [] for name in CAMPOS_POR_PANEL}
+    placed = 0
+    while +pending:
+        remaining = [dict(types[key], cantidad=cantidad) for key, cantidad in pending.items() if cantidad > 0]
+        sort_pieces(remaining, options.sort_criteria)
+
+        best = None
+        for sheet, price in zip(sheets, prices):
+            fitting = [piece for piece in remaining
+                       if sheet in fits[_piece_key(piece, options.piezas_girables)[:5]]]
+            if not fitting:
+                continue
+            trial = nest(_trial_pieces(fitting, sheet), sheet, options)
+            idx = max(range(trial.panel_count), key=trial.panel_utilization.__getitem__)
+            area = sum(p[4] * p[5] for p in trial.panel_pieces[idx])
+            cost = price + _stock_cost(remaining_area - area, prices, capacities)
+            if best is None or (cost, -area) < best[:2]:
+                best = (cost, -area, trial, idx)
+
+        _, area, trial, idx = best
+        for name in CAMPOS_POR_PANEL:
+            values = getattr(trial, name)
+            if idx < len(values):
+                panels[name].append(values[idx])
+        for placement in trial.panel_pieces[idx]:
+            _take_placement(placement, pending, types)
+        remaining_area += area
+        placed += len(trial.panel_pieces[idx])
+        if progress is not None:
+            utilization = panels['panel_utilization']
+            progress(placed, total, len(utilization), sum(utilization) / len(utilization))
+
+    largest = max(panels['panel_sheets'], key=lambda sheet: sheet.width * sheet.height)
+    return NestResult(**panels, panel_width=to_ticks(largest.width), panel_height=to_ticks(largest.height))
+
+
+def _fits(piece, sheet):
+    """Indica si la pieza cabe en la lámina, girándola si es ``girable``."""
+    width, height = piece['width'], piece['height']
+    if width <= sheet.width and height <= sheet.height:
+        return True
+    return bool(piece.get('girable')) and height <= sheet.width and width <= sheet.height
+
+
+def fill_remnants(pieces, remnants, options=None, progress=None):
+    """Anida en los retazos ``remnants`` antes de abrir láminas nuevas.
+
+    Los retazos (``Sheet`` con ``remnant``) se prueban en el orden dado,
+    cada uno una vez: se anidan en él las siguientes piezas pendientes que
+    caben y se conserva su panel más lleno. Devuelve ``(NestResult,
+    piezas)`` con los paneles en retazos y las piezas que quedan por
+    anidar, con su ``cantidad``. ``progress`` recibe ``(colocadas, total,
+    paneles, utilización)`` tras cada retazo usado.
+    """
+    options = options or NestOptions()
+    pending = Counter()
+    types = {}
+    for piece in pieces:
+        key = _piece_key(piece, options.piezas_girables)[:5]
+        pending[key] += piece.get('cantidad', 1)
+        types[key] = piece
+    total = sum(pending.values())
+
+    panels = {name: [] for name in CAMPOS_POR_PANEL}
+    placed = 0
+    for remnant in remnants:
+        if not +pending:
+            break
+        remaining = [dict(types[key], cantidad=cantidad) for key, cantidad in pending.items()
+                     if cantidad > 0 and _fits(types[key], remnant)]
+        if not remaining:
+            continue
+        sort_pieces(remaining, options.sort_criteria)
+        trial = nest(_trial_pieces(remaining, remnant), remnant, options)
+        # Una pieza girable que el motor no giró queda sola en un panel, fuera del retazo
+        width, height = to_ticks(remnant.width), to_ticks(remnant.height)
+        inside = [i for i, placements in enumerate(trial.panel_pieces)
+                  if all(x + pw <= width and y + ph <= height for x, y, pw, ph, *_ in placements)]
+        if not inside:
+            continue
+        idx = max(inside, key=trial.panel_utilization.__getitem__)
+        for name in CAMPOS_POR_PANEL:
+            values = getattr(trial, name)
+            if idx < len(values):
+                panels[name].append(values[idx])
+        for placement in trial.panel_pieces[idx]:
+            _take_placement(placement, pending, types)
+        placed += len(trial.panel_pieces[idx])
+        if progress is not None:
+            utilization = panels['panel_utilization']
+            progress(placed, total, len(utilization), sum(utilization) / len(utilization))
+
+    used = NestResult(**panels, panel_width=0, panel_height=0)
+    rest = [dict(types[key], cantidad=cantidad) for key, cantidad in pending.items() if cantidad > 0]
+    return used, rest
+
+
+def _nest_group(pieces, sheets, options, progress=None, remnants=()):
+    """Anida un grupo de material en sus retazos y después en una o varias medidas de lámina."""
+    used = None
+    if remnants:
+        used, pieces = fill_remnants(pieces, remnants, options)
+    if len(sheets) == 1:
+        result = nest(pieces, sheets[0], options, progress)
+    else:
+        result = nest_min_cost(pieces, sheets, options, progress)
+    if used is None or not used.panel_count:
+        return result
+    # Los paneles en retazos van delante de los de láminas nuevas
+    for name in CAMPOS_POR_PANEL:
+        setattr(result, name, getattr(used, name) + getattr(result, name))
+    return result
+
+
+def nest_by_material(pieces, sheet=None, options=None, workers=None, progress=None, stock=None, remnants=None):
+    """Anida cada grupo de material y grosor en sus propias láminas.
+
+    Con más de un grupo, cada uno se anida en un proceso distinto de un
+    ``ProcessPoolExecutor`` con ``workers`` procesos; con ``workers=1`` se
+    anidan uno tras otro. ``progress`` recibe ``(colocadas, total,
+    paneles, utilización)`` del conjunto: pieza a pieza en secuencia y
+    grupo a grupo en paralelo. Devuelve el resultado de ``merge_results``.
+
+    ``stock`` es la lista de ``load_stock``: los grupos con láminas en
+    existencia se anidan con ``nest_min_cost`` en esas medidas y el resto
+    en ``sheet``. ``remnants`` es un diccionario ``{(material, grosor):
+    [Sheet]}`` de retazos que se llenan antes con ``fill_remnants``.
+    """
+    sheet = sheet or Sheet()
+    options = options or NestOptions()
+    groups = group_pieces(pieces)
+    total = count_pieces(pieces)
+    sheets = {key: stock_sheets(stock or [], key) or [sheet] for key in groups}
+    remnants = remnants or {}
+
+    if len(groups) == 1 or workers == 1:
+        results = {}
+        done = panels = 0
+        for key, group in groups.items():
+            group_progress = None if progress is None else (
+                lambda placed, _, group_panels, utilization, done=done, panels=panels:
+                progress(done + placed, total, panels + group_panels, utilization))
+            results[key] = _nest_group(group, sheets[key], options, group_progress, remnants.get(key, ()))
+            done += count_pieces(group)
+            panels += results[key].panel_count
+        return merge_results(results)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {key: executor.submit(_nest_group, group, sheets[key], options, None, remnants.get(key, ()))
+                   for key, group in groups.items()}
+        if progress is not None:
+            keys = {future: key for key, future in futures.items()}
+            done = panels = 0
+            utilizations = []
+            try:
+                for future in as_completed(keys):
+                    result = future.result()
+                    done += count_pieces(groups[keys[future]])
+                    panels += result.panel_count
+                    utilizations += result.panel_utilization
+                    progress(done, total, panels, sum(utilizations) / max(1, len(utilizations)))
+            except NestCancelled:
+                executor.shutdown(cancel_futures=True)
+                raise
+        results = {key: future.result() for key, future in futures.items()}
+    return merge_results(results)
+
+
+def nest_each_group(pieces, nest_group):
+    """Aplica ``nest_group(piezas)`` a cada grupo de material y une los resultados.
+
+    Sirve para anidar por material con ``nest_best`` o con el optimizador,
+    que ya reparten su propio trabajo entre procesos.
+    """
+    return merge_results({key: nest_group(group) for key, group in group_pieces(pieces).items()})
+
+
+def _bound_values(values, limit):
+    """Hasta ``limit`` valores repartidos de la lista ordenada ``values``."""
+    if len(values) <= limit:
+        return values
+    step = (len(values) - 1) / (limit - 1)
+    return sorted({values[round(i * step)] for i in range(limit)})
+
+
+def _group_lower_bounds(pieces, sheet, separator, piezas_girables=()):
+    """Cotas ``(L0, L2)`` de un grupo de piezas en láminas de tamaño ``sheet``.
+
+    Piezas y lámina se amplían en la separación, igual que en los
+    motores. Una pieza que no cabe en la lámina solo cuenta en L0 con la
+    parte que queda dentro, porque los motores colocan otras piezas a su
+    lado. Las piezas que alguien puede girar (``girable``, con ``rotada``
+    o en ``piezas_girables``, que giran ``nest_best`` y el optimizador)
+    solo cuentan en L0.
+    """
+    bin_width = to_ticks(sheet.width) + separator
+    bin_height = to_ticks(sheet.height) + separator
+    bin_area = bin_width * bin_height
+
+    area = 0
+    fixed = []  # (ancho, alto, cantidad) de las piezas que ninguna búsqueda gira
+    for piece in pieces:
+        width = to_ticks(piece['width']) + separator
+        height = to_ticks(piece['height']) + separator
+        cantidad = piece.get('cantidad', 1)
+        turnable = bool(piece.get('girable') or piece.get('rotada') or piece['nombre'] in piezas_girables)
+        if width <= bin_width and height <= bin_height:
+            area += width * height * cantidad
+        elif turnable and height <= bin_width and width <= bin_height:
+            area += width * height * cantidad
+        else:
+            area += min(width, bin_width) * min(height, bin_height) * cantidad
+            continue
+        if not turnable:
+            fixed.append((width, height, cantidad))
+    l0 = -(-area // bin_area)
+
+    # L2 de Martello y Vigo: para cada (p, q), I1 son las piezas que no
+    # dejan sitio a nada de al menos p x q, I2 las que ocupan más de media
+    # lámina en las dos direcciones (una por lámina) e I3 las pequeñas de
+    # al menos p x q, que solo caben en láminas nuevas o junto a las de I2
+    l2 = 0
+    ps = _bound_values(sorted({1} | {w for w, _, _ in fixed if 2 * w <= bin_width}), COTA_VALORES_MAX)
+    qs = _bound_values(sorted({1} | {h for _, h, _ in fixed if 2 * h <= bin_height}), COTA_VALORES_MAX)
+    for p in ps:
+        for q in qs:
+            large = 0
+            free_area = 0
+            small_area = 0
+            for width, height, cantidad in fixed:
+                if width > bin_width - p and height > bin_height - q:
+                    large += cantidad
+                elif 2 * width > bin_width and 2 * height > bin_height:
+                    large += cantidad
+                    free_area += (bin_area - width * height) * cantidad
+                elif 2 * width <= bin_width and 2 * height <= bin_height and width >= p and height >= q:
+                    small_area += width * height * cantidad
+            l2 = max(l2, large + max(0, -(-(small_area - free_area) // bin_area)))
+    return l0, max(l0, l2)
+
+
+def lower_bounds(pieces, sheet=None, options=None, stock=None):
+    """Cotas inferiores del número de paneles para anidar ``pieces``.
+
+    Devuelve ``{'area': L0, 'l2': L2}`` sumando los grupos de material:
+    L0 es la cota continua (área de las piezas entre la de la lámina) y
+    L2 la de Martello y Vigo, que nunca es menor. L2 no tiene en cuenta
+    las piezas que se pueden girar ni las que no caben en la lámina, pero
+    quitar piezas nunca aumenta la cota. Con ``stock`` cada grupo se mide con una
+    lámina que contiene a todas las suyas, así que la cota también vale
+    para los paneles en retazos, que salen de ellas.
+    """
+    sheet = sheet or Sheet()
+    options = options or NestOptions()
+    separator = to_ticks(options.separator)
+    bounds = {'area': 0, 'l2': 0}
+    for key, group in group_pieces(pieces).items():
+        sheets = stock_sheets(stock or [], key) or [sheet]
+        largest = Sheet(max(s.width for s in sheets), max(s.height for s in sheets))
+        l0, l2 = _group_lower_bounds(group, largest, separator, options.piezas_girables)
+        bounds['area'] += l0
+        bounds['l2'] += l2
+    return bounds
+
+
+def _piece_key(piece, piezas_girables):
+    """Identifica una pieza por medidas, nombre, gabinete, giro y material."""
+    rotada = piece.get('rotada')
+    if rotada is None:
+        rotada = piece['nombre'] in piezas_girables
+    return (piece['width'], piece['height'], piece['nombre'], piece['gabinete_id'], rotada) + material_key(piece)
+
+
+def _match_placement(placement, pending, types, material=()):
+    """Clave en ``pending`` de la pieza colocada, o ``None`` si no queda ninguna.
+
+    Si el motor giró una pieza ``girable``, la colocación tiene las
+    medidas cruzadas y la marca de giro invertida respecto a la pieza.
+    """
+    _, _, _, _, ancho, alto, nombre, rotada, gabinete_id = placement
+    key = (ancho, alto, nombre, gabinete_id, rotada) + material
+    if pending[key] > 0:
+        return key
+    turned = (alto, ancho, nombre, gabinete_id, not rotada) + material
+    if pending[turned] > 0 and types[turned].get('girable'):
+        return turned
+    return None
+
+
+def _take_placement(placement, pending, types):
+    """Descuenta de ``pending`` una colocación de un nesting de prueba.
+
+    La prueba solo anida piezas pendientes, así que la colocación siempre
+    debe tener pareja; si no la tiene, seguir dejaría la pieza pendiente
+    para siempre.
+    """
+    key = _match_placement(placement, pending, types)
+    if key is None:
+        raise RuntimeError(f"Colocación sin pieza pendiente: {placement[6]} (gabinete {placement[8]})")
+    pending[key] -= 1
+
+
+def renest(previous, pieces, sheet=None, options=None, progress=None, stock=None):
+    """Actualiza ``previous`` para que anide ``pieces`` sin rehacerlo todo.
+
+    Compara las piezas colocadas en ``previous`` con el multiconjunto
+    ``pieces`` (con ``cantidad``): los paneles que no pierden ninguna pieza
+    se conservan tal cual, y solo las piezas que quedan en los paneles que
+    sí cambian, junto con las piezas nuevas, se vuelven a anidar por
+    material con ``nest_by_material``. Los paneles reempacados van detrás
+    de los conservados.
+
+    El campo ``variant`` del resultado indica en ``paneles_conservados``
+    el índice en ``previous`` de cada panel conservado, para reutilizar
+    lo que ya se dibujó, y en ``paneles_reempacados`` cuántos paneles de
+    ``previous`` se rehicieron. ``progress`` y ``stock`` se pasan a
+    ``nest_by_material``.
+    """
+    options = options or NestOptions()
+    pending = Counter()
+    types = {}
+    for piece in pieces:
+        key = _piece_key(piece, options.piezas_girables)
+        pending[key] += piece.get('cantidad', 1)
+        types[key] = piece
+
+    # Las colocaciones no guardan el material: se toma el del panel
+    previous_materials = previous.panel_materials or [material_key({})] * previous.panel_count
+
+    # Quedarse con las colocaciones que siguen pedidas y marcar los paneles
+    # que pierden alguna
+    kept, dirty = [], []
+    for idx, placements in enumerate(previous.panel_pieces):
+        survivors = []
+        for placement in placements:
+            # Aquí None es normal: la pieza ya no está pedida y el panel cambia
+            key = _match_placement(placement, pending, types, previous_materials[idx])
+            if key is not None:
+                pending[key] -= 1
+                survivors.append(key)
+        if len(survivors) == len(placements):
+            kept.append(idx)
+        else:
+            dirty.append(survivors)
+
+    # Reanidar lo que queda en los paneles cambiados más las piezas nuevas
+    repack = {}
+    for survivors in dirty:
+        for key in survivors:
+            repack[key] = repack.get(key, 0) + 1
+    for key, cantidad in pending.items():
+        if cantidad > 0:
+            repack[key] = repack.get(key, 0) + cantidad
+    repack_pieces = [dict(types[key], cantidad=cantidad) for key, cantidad in repack.items()]
+    fresh = nest_by_material(repack_pieces, sheet, options, workers=1, progress=progress, stock=stock)
+
+    result = NestResult(
+        **{name: [getattr(previous, name)[idx] for idx in kept if idx < len(getattr(previous, name))]
+                 + getattr(fresh, name)
+           for name in CAMPOS_POR_PANEL},
+        panel_width=fresh.panel_width,
+        panel_height=fresh.panel_height,
+    )
+    result.panel_materials = [previous_materials[idx] for idx in kept] + fresh.panel_materials
+    result.variant = {'paneles_conservados': kept, 'paneles_reempacados': len(dirty),
+                      'grupos': _group_summary(result)}
+    return result
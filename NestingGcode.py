@@ -0,0 +1,215 @@
+"""Postprocesador de G-code para el router CNC.
+
+Convierte cada panel de un ``NestResult`` en G-code que corta el
+perímetro de cada pieza por fuera, compensando el radio de la fresa.
+El orden de corte minimiza los movimientos en vacío con un recorrido de
+vecino más cercano mejorado con 2-opt, y las piezas pequeñas se cortan
+antes que las grandes para que no se suelten de la mesa de vacío cuando
+el panel ya está casi libre. También estima el tiempo de máquina de
+cada lámina::
+
+    stats = export_gcode(result, "trabajo", Router(feed_rate=400))
+    print(sum(s['minutos'] for s in stats))
+"""
+from dataclasses import dataclass, replace
+import math
+
+from NestingEngine import SEPARADOR, TICKS_POR_PULGADA
+
+
+# Una pieza es "pequeña" si su lado menor no llega a esta medida (pulgadas)
+LADO_PIEZA_PEQUENA = 8
+
+# Pasadas completas de 2-opt como máximo por grupo de piezas
+PASADAS_2OPT = 20
+
+# Profundidad de corte por debajo del grosor del tablero (base de sacrificio)
+SOBRECORTE = 0.02
+
+
+@dataclass
+class Router:
+    """Parámetros de la máquina y del corte; medidas en pulgadas y pulgadas/minuto."""
+    tool_diameter: float = SEPARADOR  # La fresa abre la separación entre piezas
+    cut_depth: float = 0.75 + SOBRECORTE  # Si el panel tiene grosor, se usa el suyo
+    safe_z: float = 0.25
+    feed_rate: float = 300
+    plunge_rate: float = 60
+    rapid_rate: float = 1000
+    spindle_rpm: int = 18000
+
+
+def _distance(a, b):
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def _contour(placement, panel_height, radius):
+    """Esquinas del contorno exterior de una pieza en coordenadas de máquina.
+
+    El origen de la máquina es la esquina inferior izquierda de la lámina
+    y ``y`` crece hacia arriba. Las esquinas van en sentido horario
+    (corte en concordancia con husillo a derechas) empezando por la
+    inferior izquierda.
+    """
+    x, y, pw, ph = (v / TICKS_POR_PULGADA for v in placement[:4])
+    top = panel_height / TICKS_POR_PULGADA - y
+    x0, y0, x1, y1 = x - radius, top - ph - radius, x + pw + radius, top + radius
+    return [(x0, y0), (x0, y1), (x1, y1), (x1, y0)]
+
+
+def _tour_length(points, order, start):
+    total, current = 0, start
+    for idx in order:
+        total += _distance(current, points[idx])
+        current = points[idx]
+    return total
+
+
+def _order_group(contours, start):
+    """Ordena un grupo de contornos para minimizar el recorrido en vacío.
+
+    Cada contorno se puede empezar en cualquiera de sus esquinas; el
+    vecino más cercano elige orden y esquina, y 2-opt invierte tramos
+    del recorrido mientras lo acorte. Devuelve ``[(índice, esquina)]``.
+    """
+    remaining = set(range(len(contours)))
+    tour = []
+    current = start
+    while remaining:
+        idx, corner = min(((i, c) for i in remaining for c in range(4)),
+                          key=lambda choice: _distance(current, contours[choice[0]][choice[1]]))
+        remaining.remove(idx)
+        tour.append(idx)
+        current = contours[idx][corner]
+
+    # 2-opt sobre los puntos de entrada (el contorno acaba donde empieza)
+    entries = {idx: min(range(4), key=lambda c, idx=idx: _distance(start, contours[idx][c])) for idx in tour}
+    points = {idx: contours[idx][entries[idx]] for idx in tour}
+    for _ in range(PASADAS_2OPT):
+        improved = False
+        for i in range(len(tour) - 1):
+            before = start if i == 0 else points[tour[i - 1]]
+            for j in range(i + 1, len(tour)):
+                after = points[tour[j + 1]] if j + 1 < len(tour) else None
+                old = _distance(before, points[tour[i]]) + (_distance(points[tour[j]], after) if after else 0)
+                new = _distance(before, points[tour[j]]) + (_distance(points[tour[i]], after) if after else 0)
+                if new < old - 1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+
+    # Con el orden fijado, entrar por la esquina más cercana a la anterior
+    result = []
+    current = start
+    for idx in tour:
+        corner = min(range(4), key=lambda c: _distance(current, contours[idx][c]))
+        result.append((idx, corner))
+        current = contours[idx][corner]
+    return result
+
+
+def plan_toolpath(placements, panel_height, router=None):
+    """Orden de corte de un panel: ``[(colocación, contorno desde la entrada)]``.
+
+    Primero las piezas pequeñas y después las grandes, cada grupo con su
+    propio recorrido empezando donde terminó el anterior.
+    """
+    router = router or Router()
+    radius = router.tool_diameter / 2
+    small = [p for p in placements if min(p[4], p[5]) < LADO_PIEZA_PEQUENA]
+    large = [p for p in placements if min(p[4], p[5]) >= LADO_PIEZA_PEQUENA]
+
+    plan = []
+    current = (0.0, 0.0)
+    for group in (small, large):
+        contours = [_contour(p, panel_height, radius) for p in group]
+        for idx, corner in _order_group(contours, current):
+            contour = contours[idx][corner:] + contours[idx][:corner]
+            plan.append((group[idx], contour))
+            current = contour[0]
+    return plan
+
+
+def panel_gcode(placements, panel_height, router=None, title=""):
+    """G-code de un panel y sus estadísticas.
+
+    Devuelve ``(texto, stats)`` donde ``stats`` tiene ``corte`` y
+    ``vacio`` (pulgadas recorridas cortando y en rápido) y ``minutos``
+    (tiempo estimado de máquina, sin cambios de herramienta).
+    """
+    router = router or Router()
+    lines = [
+        f"({title})" if title else "(Panel)",
+        "G20 G90 G17",
+        f"M3 S{router.spindle_rpm}",
+        f"G0 Z{router.safe_z:.4f}",
+    ]
+    cut = rapid = 0.0
+    current = (0.0, 0.0)
+    for placement, contour in plan_toolpath(placements, panel_height, router):
+        nombre, gabinete_id = placement[6], placement[8]
+        start = contour[0]
+        rapid += _distance(current, start)
+        lines.append(f"({nombre} - Gabinete {gabinete_id})")
+        lines.append(f"G0 X{start[0]:.4f} Y{start[1]:.4f}")
+        lines.append(f"G1 Z{-router.cut_depth:.4f} F{router.plunge_rate:g}")
+        feed = f" F{router.feed_rate:g}"
+        for point in contour[1:] + contour[:1]:
+            lines.append(f"G1 X{point[0]:.4f} Y{point[1]:.4f}{feed}")
+            feed = ""
+        cut += 2 * (_distance(contour[0], contour[1]) + _distance(contour[1], contour[2]))
+        lines.append(f"G0 Z{router.safe_z:.4f}")
+        current = start
+    rapid += _distance(current, (0.0, 0.0))
+    lines += ["G0 X0 Y0", "M5", "M30"]
+
+    # Tiempo: rápidos, corte, bajadas a velocidad de penetración y subidas en rápido
+    plunges = len(placements) * (router.safe_z + router.cut_depth)
+    minutes = (rapid / router.rapid_rate + cut / router.feed_rate
+               + plunges / router.plunge_rate + plunges / router.rapid_rate)
+    return "\n".join(lines) + "\n", {'corte': cut, 'vacio': rapid, 'minutos': minutes}
+
+
+def panel_router(result, index, router=None):
+    """Router del panel ``index``: si se anidó por material, corta su grosor más ``SOBRECORTE``."""
+    router = router or Router()
+    if index < len(result.panel_materials):
+        grosor = result.panel_materials[index][1]
+        if grosor:
+            return replace(router, cut_depth=grosor + SOBRECORTE)
+    return router
+
+
+def panel_minutes(result, index, router=None):
+    """Minutos estimados de máquina del panel ``index``, con el mismo plan que ``export_gcode``.
+
+    Planificar el recorrido es mucho más caro que anidar: se calcula panel
+    a panel, cuando hace falta.
+    """
+    placements = result.panel_pieces[index]
+    return panel_gcode(placements, result.panel_size(index)[1], panel_router(result, index, router))[1]['minutos']
+
+
+def export_gcode(result, basename, router=None, progress=None):
+    """Escribe un archivo ``<basename>_NNN.nc`` por panel de ``result``.
+
+    La profundidad de cada panel la da ``panel_router``.
+    ``progress(hechas, total)`` se llama tras cada panel y puede lanzar
+    ``NestCancelled``. Devuelve las estadísticas de cada panel.
+    """
+    total = result.panel_count
+    stats = []
+    for i, placements in enumerate(result.panel_pieces):
+        title = f"Panel {i+1} de {total}"
+        if i < len(result.panel_materials):
+            material, grosor = result.panel_materials[i]
+            title += f" - {material} {grosor}"
+        text, panel_stats = panel_gcode(placements, result.panel_size(i)[1], panel_router(result, i, router),
+                                        title=title)
+        with open(f"{basename}_{i+1:03d}.nc", 'w') as file:
+            file.write(text)
+        stats.append(panel_stats)
+        if progress is not None:
+            progress(i + 1, total)
+    return stats
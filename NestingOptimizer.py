@@ -0,0 +1,207 @@
+"""Optimizador con tiempo límite sobre el orden y la rotación de las piezas.
+
+El nesting voraz de ``NestingEngine`` coloca las piezas en un orden fijo.
+Este módulo busca mejores órdenes con recocido simulado (simulated
+annealing) y usa el motor voraz como decodificador: cada solución es una
+permutación de las piezas más un giro opcional por pieza girable, y su
+coste se obtiene anidándola con la estrategia de ``options.strategy``.
+
+Es un algoritmo "anytime": se puede detener en cualquier momento y
+``on_improve`` recibe cada nueva mejor solución::
+
+    result = optimize(pieces, Sheet(), NestOptions(strategy="skyline"),
+                      time_budget=60, workers=4,
+                      on_improve=lambda r: print(r.panel_count))
+"""
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import Manager
+import math
+import queue
+import random
+import time
+
+from NestingEngine import SORT_CRITERIA, Sheet, NestOptions, expand_pieces, lower_bounds, nest, sort_pieces
+
+
+# Temperatura inicial y final del recocido, en unidades de coste (paneles)
+TEMPERATURA_INICIAL = 0.05
+TEMPERATURA_FINAL = 0.0005
+
+
+def solution_cost(result):
+    """Coste de un resultado: número de paneles menos un premio por llenarlos.
+
+    El premio es la media de los cuadrados de las utilizaciones (entre 0
+    y 1), de modo que nunca compensa un panel extra pero, a igual número
+    de paneles, se prefieren paneles muy llenos y un último panel casi
+    vacío, que es más fácil de vaciar en la siguiente iteración.
+    """
+    if not result.panel_utilization:
+        return 0
+    bonus = sum((u / 100) ** 2 for u in result.panel_utilization) / len(result.panel_utilization)
+    return result.panel_count - bonus
+
+
+def decode(pieces, order, flips, sheet, options):
+    """Anida las piezas en el orden ``order`` girando las marcadas en ``flips``."""
+    sequence = []
+    for idx in order:
+        piece = pieces[idx]
+        if flips[idx]:
+            piece = dict(piece)
+            piece['width'], piece['height'] = piece['height'], piece['width']
+            piece['rotada'] = not piece.get('rotada', False)
+        sequence.append(piece)
+    return nest(sequence, sheet, options)
+
+
+def _initial_order(pieces, sort_criteria):
+    """Orden de partida según uno de los criterios del motor voraz."""
+    indexed = [dict(piece, _idx=idx) for idx, piece in enumerate(pieces)]
+    sort_pieces(indexed, sort_criteria)
+    return [piece['_idx'] for piece in indexed]
+
+
+def _anneal(pieces, sheet, options, time_budget, seed, report, should_stop=None, bound=0):
+    """Recocido simulado hasta agotar ``time_budget`` segundos.
+
+    ``report(cost, order, flips, result)`` se llama con cada mejora y
+    ``should_stop()``, si se indica, permite terminar antes de tiempo.
+    También se termina en cuanto la mejor solución usa ``bound`` paneles,
+    porque ninguna puede usar menos. Devuelve ``(cost, order, flips,
+    iteraciones)`` de la mejor solución.
+    """
+    rnd = random.Random(seed)
+    decode_options = NestOptions(**{**options.__dict__, 'sort_criteria': "input"})
+    rotatable = [idx for idx, piece in enumerate(pieces)
+                 if piece['nombre'] in options.piezas_girables or piece.get('girable')]
+    count = len(pieces)
+
+    # Partir del mejor de los criterios voraces, así nunca se empeora
+    flips = [False] * count
+    cost = float('inf')
+    for sort_criteria in SORT_CRITERIA:
+        candidate = _initial_order(pieces, sort_criteria)
+        candidate_result = decode(pieces, candidate, flips, sheet, decode_options)
+        candidate_cost = solution_cost(candidate_result)
+        if candidate_cost < cost:
+            order, cost, result = candidate, candidate_cost, candidate_result
+    best = (cost, list(order), list(flips))
+    report(cost, order, flips, result)
+
+    start = time.perf_counter()
+    iterations = 0
+    best_panels = result.panel_count
+    while count > 1 and best_panels > bound:
+        elapsed = time.perf_counter() - start
+        if elapsed >= time_budget or (should_stop is not None and should_stop()):
+            break
+        # Enfriamiento exponencial a lo largo del tiempo disponible
+        temperature = TEMPERATURA_INICIAL * (TEMPERATURA_FINAL / TEMPERATURA_INICIAL) ** (elapsed / time_budget)
+
+        new_order = list(order)
+        new_flips = flips
+        move = rnd.random()
+        if rotatable and move < 0.2:
+            # Girar una pieza girable
+            new_flips = list(flips)
+            idx = rnd.choice(rotatable)
+            new_flips[idx] = not new_flips[idx]
+        elif move < 0.6:
+            # Intercambiar dos piezas
+            i, j = rnd.randrange(count), rnd.randrange(count)
+            new_order[i], new_order[j] = new_order[j], new_order[i]
+        else:
+            # Mover una pieza a otra posición
+            piece = new_order.pop(rnd.randrange(count))
+            new_order.insert(rnd.randrange(count), piece)
+
+        new_result = decode(pieces, new_order, new_flips, sheet, decode_options)
+        new_cost = solution_cost(new_result)
+        iterations += 1
+
+        delta = new_cost - cost
+        if delta <= 0 or rnd.random() < math.exp(-delta / temperature):
+            order, flips, cost = new_order, new_flips, new_cost
+            if cost < best[0]:
+                best = (cost, list(order), list(flips))
+                best_panels = new_result.panel_count
+                report(cost, order, flips, new_result)
+
+    return best + (iterations,)
+
+
+def _anneal_worker(pieces, sheet, options, time_budget, seed, improvements, stop, bound):
+    """Cadena de recocido en un proceso aparte; envía sus mejoras a la cola.
+
+    La cadena que alcanza la cota detiene también a las demás.
+    """
+    def report(cost, order, flips, result):
+        improvements.put((cost, list(order), list(flips)))
+        if result.panel_count <= bound:
+            stop.set()
+    return _anneal(pieces, sheet, options, time_budget, seed, report, stop.is_set, bound)
+
+
+def optimize(pieces, sheet=None, options=None, time_budget=5.0, workers=1, on_improve=None, seed=0,
+             cancel=None):
+    """Busca el mejor orden y giro de las piezas durante ``time_budget`` segundos.
+
+    Cada cadena parte del mejor orden voraz de ``SORT_CRITERIA``. Con
+    ``workers`` mayor que 1 se lanzan cadenas independientes, cada una con
+    su semilla, en un ``ProcessPoolExecutor``. Los tipos con ``cantidad``
+    se expanden a piezas sueltas, ya que cada copia puede ir en otro orden
+    o con otro giro.
+    ``on_improve(result)`` recibe cada ``NestResult`` que mejora al mejor
+    conocido. Si ``cancel()`` devuelve verdadero la búsqueda termina antes
+    de agotar el tiempo y ``variant['cancelado']`` lo indica; también
+    termina en cuanto se alcanza la cota L2 de ``lower_bounds``. Devuelve
+    el mejor ``NestResult``; su campo ``variant`` resume la búsqueda.
+    """
+    sheet = sheet or Sheet()
+    options = options or NestOptions()
+    decode_options = NestOptions(**{**options.__dict__, 'sort_criteria': "input"})
+    bound = lower_bounds(pieces, sheet, options)['l2']
+    pieces = [dict(piece, cantidad=1) for piece in expand_pieces(pieces)]
+    best = [float('inf'), None]  # [coste, resultado]
+
+    def publish(cost, result):
+        if cost < best[0]:
+            best[0], best[1] = cost, result
+            if on_improve is not None:
+                on_improve(result)
+
+    if workers <= 1:
+        cost, order, flips, iterations = _anneal(
+            pieces, sheet, options, time_budget, seed,
+            lambda cost, order, flips, result: publish(cost, result), cancel, bound)
+    else:
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            improvements = manager.Queue()
+            stop = manager.Event()
+            futures = [executor.submit(_anneal_worker, pieces, sheet, options, time_budget, seed + n,
+                                       improvements, stop, bound)
+                       for n in range(workers)]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel():
+                    stop.set()
+                # Reenviar las mejoras globales a medida que llegan
+                while True:
+                    try:
+                        cost, order, flips = improvements.get_nowait()
+                    except queue.Empty:
+                        break
+                    if cost < best[0]:
+                        publish(cost, decode(pieces, order, flips, sheet, decode_options))
+            chains = [future.result() for future in futures]
+        cost, order, flips, _ = min(chains, key=lambda chain: chain[0])
+        iterations = sum(chain[3] for chain in chains)
+
+    result = decode(pieces, order, flips, sheet, decode_options)
+    result.variant = {'optimizador': "recocido", 'iteraciones': iterations, 'coste': cost, 'cota': bound}
+    if cancel is not None and cancel():
+        # Resultado parcial: no equivale a buscar durante todo time_budget
+        result.variant['cancelado'] = True
+    return result
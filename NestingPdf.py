@@ -0,0 +1,104 @@
+"""Exportación a PDF de un resultado de nesting, página a página.
+
+Dibuja cada panel directamente desde ``NestResult.panel_pieces`` con
+``QPdfWriter``, sin construir escenas: cada página se escribe y se
+descarta antes de pasar a la siguiente, así que la memoria no crece con
+el número de paneles. No usa widgets y puede llamarse desde un hilo que
+no sea el de la interfaz::
+
+    export_pdf(result, "paneles.pdf")
+"""
+from PyQt5.QtCore import Qt, QSizeF, QRectF, QMarginsF
+from PyQt5.QtGui import QPdfWriter, QPainter, QPen, QColor, QFont, QPageSize, QPageLayout
+
+from NestingEngine import TICKS_POR_PULGADA
+
+
+# Resolución del PDF en puntos por pulgada
+RESOLUCION_PDF = 300
+
+# Tamaño de letra de las etiquetas de las piezas y del título, en puntos
+TAMANO_ETIQUETA = 7
+TAMANO_TITULO = 12
+
+
+def export_pdf(result, filename, progress=None):
+    """Escribe un PDF con una página por panel de ``result``.
+
+    Cada página tiene la medida de la lámina de su panel.
+    ``progress(hechas, total)`` se llama tras cada página y puede lanzar
+    ``NestCancelled``; en ese caso el PDF queda cerrado con las páginas
+    ya escritas y la excepción se propaga.
+    """
+    writer = QPdfWriter(filename)
+    writer.setResolution(RESOLUCION_PDF)
+    _set_page_size(writer, *result.panel_size(0))
+    writer.setPageMargins(QMarginsF(0, 0, 0, 0), QPageLayout.Millimeter)
+
+    # Puntos del PDF por unidad del motor
+    k = RESOLUCION_PDF / TICKS_POR_PULGADA
+    label_font = QFont()
+    label_font.setPointSize(TAMANO_ETIQUETA)
+    title_font = QFont()
+    title_font.setPointSize(TAMANO_TITULO)
+
+    painter = QPainter()
+    if not painter.begin(writer):
+        raise OSError(f"No se pudo escribir el PDF: {filename}")
+
+    total = result.panel_count
+    try:
+        for i, placements in enumerate(result.panel_pieces):
+            panel_width, panel_height = result.panel_size(i)
+            if i > 0:
+                # La medida se fija antes de abrir la página
+                _set_page_size(writer, panel_width, panel_height)
+                writer.newPage()
+            _draw_panel(painter, placements, k, label_font)
+
+            # Borde del panel
+            painter.setPen(QPen(Qt.red, 0))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(QRectF(0, 0, panel_width * k, panel_height * k))
+
+            # Información del panel en la esquina superior izquierda
+            utilization = result.panel_utilization[i] if i < len(result.panel_utilization) else 0
+            title = f"Panel {i+1} de {total} | Utilización: {utilization:.1f}%"
+            if i < len(result.panel_materials):
+                material, grosor = result.panel_materials[i]
+                title += f" | {material} ({grosor})"
+            painter.setPen(Qt.black)
+            painter.setFont(title_font)
+            painter.drawText(QRectF(0.1 * RESOLUCION_PDF, 0.1 * RESOLUCION_PDF, panel_width * k, RESOLUCION_PDF),
+                             Qt.AlignLeft | Qt.AlignTop, title)
+
+            if progress is not None:
+                progress(i + 1, total)
+    finally:
+        painter.end()
+
+
+def _set_page_size(writer, panel_width, panel_height):
+    """Ajusta la página a la lámina, con medidas en unidades del motor."""
+    width_mm = panel_width / TICKS_POR_PULGADA * 25.4
+    height_mm = panel_height / TICKS_POR_PULGADA * 25.4
+    writer.setPageSize(QPageSize(QSizeF(width_mm, height_mm), QPageSize.Millimeter))
+
+
+def _draw_panel(painter, placements, k, font):
+    """Dibuja las piezas de un panel con su etiqueta centrada."""
+    painter.setFont(font)
+    colors = {}
+    for x, y, pw, ph, aw, ah, nombre, rotated, gabinete_id in placements:
+        rect = QRectF(x * k, y * k, pw * k, ph * k)
+
+        # Color consistente para cada tipo de pieza, como en pantalla
+        if nombre not in colors:
+            colors[nombre] = QColor.fromHsv(hash(nombre) % 360, 10, 10, 10)
+        painter.setPen(QPen(Qt.black, 0))
+        painter.setBrush(colors[nombre])
+        painter.drawRect(rect)
+
+        rot_text = " (Rotada)" if rotated else ""
+        painter.drawText(rect, Qt.AlignCenter,
+                         f"{nombre}{rot_text}\nGabinete {gabinete_id}\n{aw:.1f} x {ah:.1f}")
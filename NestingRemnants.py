@@ -0,0 +1,202 @@
+"""Inventario de retazos (sobrantes de lámina) entre trabajos de nesting.
+
+Al terminar un trabajo, el sobrante de cada panel que se puede separar
+con uno o dos cortes de lado a lado y supera ``LADO_MINIMO_RETAZO`` y
+``AREA_MINIMA_RETAZO`` se guarda en un archivo JSON. El siguiente
+trabajo llena primero esos retazos y solo después abre láminas nuevas::
+
+    store = RemnantStore(ARCHIVO_RETAZOS)
+    result = nest_by_material(pieces, sheet, options,
+                              remnants=store.remnants_for(group_pieces(pieces)))
+    store.register(result)  # Cuando el trabajo se corta de verdad
+
+Los retazos de cada material y grosor se indexan por su lado menor, de
+modo que buscar los que admiten una pieza es una búsqueda binaria aunque
+el inventario tenga miles de retazos.
+"""
+from bisect import bisect_left, insort
+from dataclasses import dataclass, asdict
+import datetime
+import json
+import os
+import tempfile
+
+from NestingEngine import SEPARADOR, TICKS_POR_PULGADA, Sheet, to_ticks
+
+
+# Archivo del inventario, junto a materiales.json
+ARCHIVO_RETAZOS = "retazos.json"
+
+# Medidas mínimas de un retazo que vale la pena guardar, en pulgadas
+LADO_MINIMO_RETAZO = 6
+AREA_MINIMA_RETAZO = 288  # 2 pies cuadrados
+
+
+@dataclass
+class Remnant:
+    """Retazo guardado; ``width`` va en la dirección del largo de la lámina original."""
+    id: str
+    material: str
+    grosor: float
+    width: float
+    height: float
+    origen: str = ""  # Retazo del que salió, si no salió de una lámina nueva
+    fecha: str = ""
+
+    @property
+    def key(self):
+        return (self.material, self.grosor)
+
+    def sheet(self):
+        """Lámina para anidar en el retazo, sin precio porque ya está pagado."""
+        return Sheet(self.width, self.height, 0, remnant=self.id)
+
+
+def panel_remnants(placements, panel_width, panel_height, separator=None):
+    """Sobrantes de un panel que se separan con cortes de lado a lado.
+
+    Las medidas van en unidades del motor. Se prueba a cortar primero la
+    franja libre de la derecha o la de abajo, y se elige la opción cuyo
+    mayor sobrante es más grande. Devuelve ``[(ancho, alto)]`` en pulgadas
+    con los sobrantes que superan las medidas mínimas.
+    """
+    if separator is None:
+        separator = to_ticks(SEPARADOR)
+    if placements:
+        used_width = max(x + pw for x, _, pw, _, *_ in placements) + separator
+        used_height = max(y + ph for _, y, _, ph, *_ in placements) + separator
+    else:
+        used_width = used_height = 0
+    free_width = max(0, panel_width - used_width)
+    free_height = max(0, panel_height - used_height)
+
+    # Corte vertical primero: franja derecha entera y la de abajo hasta el corte
+    vertical = [(free_width, panel_height), (min(used_width, panel_width), free_height)]
+    # Corte horizontal primero: franja de abajo entera y la derecha hasta el corte
+    horizontal = [(panel_width, free_height), (free_width, min(used_height, panel_height))]
+    option = max(vertical, horizontal, key=lambda sizes: max(w * h for w, h in sizes))
+
+    remnants = []
+    for width, height in option:
+        width, height = width / TICKS_POR_PULGADA, height / TICKS_POR_PULGADA
+        if min(width, height) >= LADO_MINIMO_RETAZO and width * height >= AREA_MINIMA_RETAZO:
+            remnants.append((width, height))
+    return remnants
+
+
+class RemnantStore:
+    """Inventario de retazos en un archivo JSON con índice por lado menor."""
+
+    def __init__(self, path=ARCHIVO_RETAZOS):
+        self.path = path
+        self.remnants = {}  # id -> Remnant
+        self.index = {}  # (material, grosor) -> [(lado menor, lado mayor, id)] ordenada
+        self.next_id = 1
+        self.load()
+
+    def __len__(self):
+        return len(self.remnants)
+
+    def load(self):
+        """Lee el inventario; si no existe o está dañado se empieza vacío."""
+        self.remnants.clear()
+        self.index.clear()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+            for entry in data.get("retazos", []):
+                self._insert(Remnant(**entry))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error al cargar los retazos: {e}")
+
+    def save(self):
+        """Escribe el inventario en un temporal y lo renombra, como NestCache."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump({"retazos": [asdict(remnant) for remnant in self.remnants.values()]}, file, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error al guardar los retazos: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def add(self, material, grosor, width, height, origen=""):
+        """Añade un retazo y devuelve su identificador (no guarda el archivo)."""
+        remnant = Remnant(str(self.next_id), material, grosor, width, height, origen,
+                          datetime.date.today().isoformat())
+        self._insert(remnant)
+        return remnant.id
+
+    def remove(self, remnant_id):
+        """Quita un retazo del inventario (no guarda el archivo)."""
+        remnant = self.remnants.pop(remnant_id, None)
+        if remnant is None:
+            return
+        entries = self.index[remnant.key]
+        entry = self._entry(remnant)
+        pos = bisect_left(entries, entry)
+        if pos < len(entries) and entries[pos] == entry:
+            del entries[pos]
+
+    def candidates(self, key, min_side=0):
+        """Retazos del grupo ``(material, grosor)`` con lado menor de al menos ``min_side``.
+
+        Se devuelven de mayor a menor área, que es el orden en que se
+        llenan.
+        """
+        entries = self.index.get(key, [])
+        found = [self.remnants[remnant_id] for _, _, remnant_id in entries[bisect_left(entries, (min_side,)):]]
+        found.sort(key=lambda remnant: remnant.width * remnant.height, reverse=True)
+        return found
+
+    def remnants_for(self, groups):
+        """Retazos útiles para cada grupo ``{(material, grosor): piezas}``, como ``Sheet``.
+
+        Solo se ofrecen los que admiten al menos la pieza de lado menor
+        más pequeño del grupo.
+        """
+        result = {}
+        for key, pieces in groups.items():
+            if not pieces:
+                continue
+            smallest = min(min(piece['width'], piece['height']) for piece in pieces)
+            sheets = [remnant.sheet() for remnant in self.candidates(key, smallest)]
+            if sheets:
+                result[key] = sheets
+        return result
+
+    def register(self, result, separator=None):
+        """Actualiza el inventario con un trabajo ya cortado y lo guarda.
+
+        Quita los retazos que usó ``result`` y añade los sobrantes de cada
+        uno de sus paneles. Devuelve ``(usados, nuevos)``.
+        """
+        used = added = 0
+        for i, placements in enumerate(result.panel_pieces):
+            sheet = result.panel_sheets[i] if i < len(result.panel_sheets) else None
+            material, grosor = result.panel_materials[i] if i < len(result.panel_materials) else ("", 0)
+            origen = ""
+            if sheet is not None and sheet.remnant:
+                self.remove(sheet.remnant)
+                origen = sheet.remnant
+                used += 1
+            panel_width, panel_height = result.panel_size(i)
+            for width, height in panel_remnants(placements, panel_width, panel_height, separator):
+                self.add(material, grosor, width, height, origen)
+                added += 1
+        self.save()
+        return used, added
+
+    @staticmethod
+    def _entry(remnant):
+        return (min(remnant.width, remnant.height), max(remnant.width, remnant.height), remnant.id)
+
+    def _insert(self, remnant):
+        self.remnants[remnant.id] = remnant
+        insort(self.index.setdefault(remnant.key, []), self._entry(remnant))
+        if remnant.id.isdigit():
+            self.next_id = max(self.next_id, int(remnant.id) + 1)
@@ -0,0 +1,75 @@
+"""Pruebas de NestingCache::
+
+    python -m pytest -q test_NestingCache.py
+"""
+import os
+import pickle
+import random
+
+from NestingCache import NestCache, cache_key
+from NestingEngine import Sheet, NestOptions, nest
+
+
+PIECES = [
+    {"nombre": "Lateral", "width": 23.5, "height": 30, "cantidad": 2, "gabinete_id": 1},
+    {"nombre": "Techo", "width": 40, "height": 23.5, "gabinete_id": 1},
+    {"nombre": "Puerta", "width": 15, "height": 30, "cantidad": 3, "gabinete_id": 2, "material": "MDF"},
+]
+
+
+def test_clave_no_depende_del_orden_ni_del_reparto():
+    options = NestOptions()
+    key = cache_key(PIECES, Sheet(), options)
+    shuffled = list(PIECES)
+    random.Random(1).shuffle(shuffled)
+    assert cache_key(shuffled, Sheet(), options) == key
+    # Dos entradas de un mismo tipo equivalen a una con la cantidad sumada
+    split = PIECES[1:] + [dict(PIECES[0], cantidad=1), dict(PIECES[0], cantidad=1)]
+    assert cache_key(split, Sheet(), options) == key
+    # spatial_index no cambia el resultado ni la clave
+    assert cache_key(PIECES, Sheet(), NestOptions(spatial_index=True)) == key
+
+
+def test_clave_cambia_con_las_entradas():
+    key = cache_key(PIECES, Sheet(), NestOptions())
+    assert cache_key(PIECES[:2], Sheet(), NestOptions()) != key
+    assert cache_key(PIECES, Sheet(60, 48.5), NestOptions()) != key
+    assert cache_key(PIECES, Sheet(), NestOptions(strategy="skyline")) != key
+    assert cache_key(PIECES, Sheet(), NestOptions(piezas_girables=["Techo"])) != key
+    assert cache_key(PIECES, Sheet(), NestOptions(), mode="optimize:5") != key
+
+
+def test_disco_sobrevive_a_otra_instancia(tmp_path):
+    result = nest([dict(piece) for piece in PIECES])
+    key = cache_key(PIECES, Sheet(), NestOptions())
+    NestCache(str(tmp_path)).put(key, result)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    cached = NestCache(str(tmp_path)).get(key)
+    assert cached is not None and cached.panel_pieces == result.panel_pieces
+
+
+def test_pickle_danado_es_un_fallo(tmp_path):
+    cache = NestCache(str(tmp_path))
+    good = pickle.dumps(nest([dict(piece) for piece in PIECES]), protocol=pickle.HIGHEST_PROTOCOL)
+    rnd = random.Random(3)
+    damaged = [b"", b"basura", good[:len(good) // 2], pickle.dumps({"no": "es un NestResult"})]
+    for _ in range(100):
+        data = bytearray(good)
+        for _ in range(3):
+            data[rnd.randrange(len(data))] = rnd.randrange(256)
+        damaged.append(bytes(data))
+    for data in damaged:
+        with open(cache._path("clave"), 'wb') as file:
+            file.write(data)
+        cache.entries.clear()
+        result = cache.get("clave")
+        assert result is None or result.panel_count >= 0
+
+
+def test_lru_en_memoria():
+    cache = NestCache(capacity=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("a") == 1 and cache.get("b") is None and cache.get("c") == 3
@@ -0,0 +1,294 @@
+"""Pruebas de NestingEngine.
+
+Cubren las propiedades que toda estrategia debe cumplir (sin solapes,
+dentro de la lámina con la separación, sin perder piezas) y las cotas
+inferiores: una cota mayor que el número de paneles que consigue algún
+motor haría que ``nest_best`` y el optimizador se detuvieran antes de
+tiempo::
+
+    python -m pytest -q test_NestingEngine.py
+"""
+from collections import Counter
+import random
+
+import pytest
+
+import NestingEngine
+from NestingEngine import (SEPARADOR, ESTRATEGIAS, Sheet, NestOptions, MaxRectsBin, count_pieces, load_pieces,
+                           lower_bounds, nest, nest_best, nest_by_material, nest_min_cost, renest, to_ticks)
+from NestingOptimizer import optimize
+
+
+def _random_pieces(rnd, types=12):
+    return [{"nombre": f"P{i}", "width": rnd.choice([3, 12, 24.5, 40, 49, 60]),
+             "height": rnd.choice([4, 10, 23, 30, 48.4]), "cantidad": rnd.randint(1, 6),
+             "gabinete_id": i % 3, "girable": rnd.random() < 0.3}
+            for i in range(types)]
+
+
+def _check_layout(result, pieces, sheet, separator=SEPARADOR):
+    """Comprueba que no se pierden piezas, que caben en la lámina y que no se solapan."""
+    width, height, gap = to_ticks(sheet.width), to_ticks(sheet.height), to_ticks(separator)
+    placed = [placement for panel in result.panel_pieces for placement in panel]
+    assert len(placed) == result.piece_count == count_pieces(pieces)
+    expected = Counter()
+    for piece in pieces:
+        expected[(piece['nombre'], piece['gabinete_id'])] += piece.get('cantidad', 1)
+    assert Counter((nombre, gabinete_id) for *_, nombre, _, gabinete_id in placed) == expected
+
+    for panel in result.panel_pieces:
+        for x, y, pw, ph, *_ in panel:
+            assert x >= 0 and y >= 0 and x + pw <= width and y + ph <= height
+        # Entre dos piezas queda al menos el ancho del corte
+        for i, (x, y, pw, ph, *_) in enumerate(panel):
+            for ox, oy, ow, oh, *_ in panel[i + 1:]:
+                assert (x + pw + gap <= ox or ox + ow + gap <= x or
+                        y + ph + gap <= oy or oy + oh + gap <= y)
+
+
+def _best_panel_count(pieces, options):
+    """Menos paneles que consigue cualquier estrategia, con y sin girar las piezas por nombre."""
+    counts = []
+    for strategy in ESTRATEGIAS:
+        for piezas_girables in (options.piezas_girables, []):
+            variant = NestOptions(sort_criteria=options.sort_criteria, piezas_girables=piezas_girables,
+                                  strategy=strategy)
+            counts.append(nest([dict(piece, rotada=None) for piece in pieces], Sheet(), variant).panel_count)
+    return min(counts)
+
+
+def test_cota_girable_por_nombre():
+    # Sin girar, las dos piezas caben en una lámina
+    data = {"gabinetes": [], "piezas": [{"nombre": "A", "ancho": 40, "alto": 48.4, "gabinete_id": 1}] * 2}
+    options = NestOptions(piezas_girables=["A"])
+    pieces = load_pieces(data, piezas_girables=["A"])
+    assert lower_bounds(pieces, Sheet(), options)['l2'] == 1
+    assert nest_best(pieces, Sheet(), options, workers=1).panel_count == 1
+    assert optimize(pieces, Sheet(), options, time_budget=0.5, workers=1).panel_count == 1
+
+
+def test_cota_pieza_que_no_cabe():
+    # La pieza larga sobresale de la lámina, pero las pequeñas van a su lado
+    pieces = [
+        {"nombre": "Larga", "width": 100, "height": 10, "gabinete_id": 1},
+        {"nombre": "Cuadrada", "width": 20, "height": 20, "cantidad": 3, "gabinete_id": 1},
+    ]
+    bounds = lower_bounds(pieces)
+    assert bounds['l2'] == 1
+    for strategy in ESTRATEGIAS:
+        result = nest([dict(piece) for piece in pieces], Sheet(), NestOptions(strategy=strategy))
+        assert bounds['l2'] <= result.panel_count
+
+
+def test_cota_nunca_supera_los_paneles():
+    rnd = random.Random(7)
+    for _ in range(25):
+        names = [f"P{i}" for i in range(rnd.randint(1, 8))]
+        pieces = [{"nombre": name, "width": rnd.choice([3, 12, 24.5, 40, 49, 60, 100]),
+                   "height": rnd.choice([4, 10, 23, 30, 48.4, 50]), "cantidad": rnd.randint(1, 6),
+                   "gabinete_id": 1, "girable": rnd.random() < 0.2}
+                  for name in names]
+        options = NestOptions(piezas_girables=rnd.sample(names, rnd.randint(0, len(names))))
+        bounds = lower_bounds(pieces, Sheet(), options)
+        assert bounds['area'] <= bounds['l2'] <= _best_panel_count(pieces, options)
+
+
+@pytest.mark.parametrize("strategy", sorted(ESTRATEGIAS))
+def test_colocaciones_validas(strategy):
+    rnd = random.Random(3)
+    for separator in (SEPARADOR, 0.25, 0):
+        pieces = _random_pieces(rnd)
+        options = NestOptions(strategy=strategy, separator=separator, piezas_girables=["P1", "P2"])
+        result = nest([dict(piece) for piece in pieces], Sheet(), options)
+        _check_layout(result, pieces, Sheet(), separator)
+
+
+@pytest.mark.parametrize("strategy", sorted(ESTRATEGIAS))
+def test_pieza_mayor_que_la_lamina(strategy):
+    # La pieza que no cabe ocupa un panel propio en el origen y las demás siguen
+    pieces = [{"nombre": "Larga", "width": 100, "height": 10, "gabinete_id": 1},
+              {"nombre": "Cuadrada", "width": 20, "height": 20, "cantidad": 5, "gabinete_id": 1}]
+    result = nest([dict(piece) for piece in pieces], Sheet(), NestOptions(strategy=strategy))
+    assert result.piece_count == count_pieces(pieces)
+    oversized = [panel for panel in result.panel_pieces if any(p[6] == "Larga" for p in panel)]
+    assert len(oversized) == 1
+    assert [p[:2] for p in oversized[0] if p[6] == "Larga"] == [(0, 0)]
+    for panel in result.panel_pieces:
+        for x, y, pw, ph, _, _, nombre, _, _ in panel:
+            if nombre != "Larga":
+                assert x + pw <= to_ticks(Sheet.width) and y + ph <= to_ticks(Sheet.height)
+
+
+def test_maxrects_poda_rectangulos_libres():
+    # En una rejilla pequeña, los libres cubren justo lo no ocupado y ninguno contiene a otro
+    rnd = random.Random(5)
+    for _ in range(30):
+        width, height = rnd.randint(5, 14), rnd.randint(5, 14)
+        free_bin = MaxRectsBin(width, height)
+        used = set()
+        for _ in range(rnd.randint(1, 8)):
+            w, h = rnd.randint(1, 5), rnd.randint(1, 5)
+            found = free_bin.find_position(w, h, rnd.choice(["bssf", "baf", "bl"]))
+            if found is None:
+                continue
+            _, x, y = found
+            cells = {(cx, cy) for cx in range(x, x + w) for cy in range(y, y + h)}
+            assert not cells & used
+            used |= cells
+            free_bin.place(x, y, w, h)
+
+            rects = free_bin.free_rects
+            covered = {(cx, cy) for fx, fy, fw, fh in rects
+                       for cx in range(fx, fx + fw) for cy in range(fy, fy + fh)}
+            everything = {(cx, cy) for cx in range(width) for cy in range(height)}
+            assert covered == everything - used
+            for i, (fx, fy, fw, fh) in enumerate(rects):
+                assert fx >= 0 and fy >= 0 and fx + fw <= width and fy + fh <= height
+                for j, (ox, oy, ow, oh) in enumerate(rects):
+                    if i != j:
+                        assert not (fx >= ox and fy >= oy and fx + fw <= ox + ow and fy + fh <= oy + oh)
+
+
+def test_skyline_cierre_de_paneles_no_pierde_piezas(monkeypatch):
+    # Cerrar paneles solo evita búsquedas: con o sin cierre la colocación es la misma
+    rnd = random.Random(11)
+    pieces = [{"nombre": f"P{i}", "width": rnd.uniform(2, 30), "height": rnd.uniform(2, 20),
+               "cantidad": rnd.randint(1, 40), "gabinete_id": 1, "girable": rnd.random() < 0.5}
+              for i in range(40)]
+    options = NestOptions(strategy="skyline", sort_criteria="height_desc")
+
+    def layout():
+        result = nest([dict(piece) for piece in pieces], Sheet(), options)
+        _check_layout(result, pieces, Sheet())
+        return result.panel_pieces
+
+    monkeypatch.setattr(NestingEngine, "SKYLINE_REVISION_CIERRE", 1)
+    closing = layout()
+    monkeypatch.setattr(NestingEngine.SkylineBin, "free_height", lambda self: float('inf'))
+    assert layout() == closing
+
+
+def _guillotine(rects):
+    """Indica si los rectángulos se separan con cortes de lado a lado, recursivamente."""
+    if len(rects) <= 1:
+        return True
+    for axis in (0, 1):
+        for line in sorted({rect[axis] + rect[axis + 2] for rect in rects}):
+            first = [rect for rect in rects if rect[axis] + rect[axis + 2] <= line]
+            second = [rect for rect in rects if rect[axis] >= line]
+            if first and second and len(first) + len(second) == len(rects):
+                return _guillotine(first) and _guillotine(second)
+    return False
+
+
+def test_guillotina_cortes_de_lado_a_lado():
+    rnd = random.Random(13)
+    pieces = _random_pieces(rnd, types=20)
+    result = nest([dict(piece) for piece in pieces], Sheet(), NestOptions(strategy="guillotina"))
+    _check_layout(result, pieces, Sheet())
+    width = to_ticks(Sheet.width)
+    for panel, cuts in zip(result.panel_pieces, result.panel_cuts):
+        assert _guillotine([placement[:4] for placement in panel])
+        for cut in cuts:
+            x0, y0, x1, y1 = cut['x0'], cut['y0'], cut['x1'], cut['y1']
+            assert x0 == x1 or y0 == y1
+            if cut['etapa'] == "rip":
+                assert (x0, x1) == (0, width)
+            # Ningún corte atraviesa una pieza
+            for x, y, pw, ph, *_ in panel:
+                if y0 == y1:
+                    assert not (y < y0 < y + ph and x < x1 and x + pw > x0)
+                else:
+                    assert not (x < x0 < x + pw and y < y1 and y + ph > y0)
+
+
+def _check_sheets(result, pieces):
+    """Como ``_check_layout``, pero cada panel con su propia lámina (``panel_sheets``)."""
+    placed = Counter((p[6], p[8]) for panel in result.panel_pieces for p in panel)
+    expected = Counter()
+    for piece in pieces:
+        expected[(piece['nombre'], piece['gabinete_id'])] += piece.get('cantidad', 1)
+    assert placed == expected
+    for panel, sheet in zip(result.panel_pieces, result.panel_sheets):
+        for x, y, pw, ph, *_ in panel:
+            assert x + pw <= to_ticks(sheet.width) and y + ph <= to_ticks(sheet.height)
+
+
+def test_costo_minimo_conserva_piezas_y_no_encarece():
+    rnd = random.Random(17)
+    sheets = [Sheet(96.5, 48.5, price=60), Sheet(60, 48.5, price=40), Sheet(48.5, 48.5, price=35)]
+    for _ in range(5):
+        pieces = _random_pieces(rnd)
+        result = nest_min_cost([dict(piece) for piece in pieces], sheets)
+        _check_sheets(result, pieces)
+        assert len(result.panel_sheets) == result.panel_count
+        cost = sum(sheet.price for sheet in result.panel_sheets)
+        for sheet in sheets:
+            assert cost <= nest([dict(piece) for piece in pieces], sheet).panel_count * sheet.price
+
+
+def test_costo_minimo_falla_si_una_colocacion_no_tiene_pieza(monkeypatch):
+    # Antes se descontaba pending[None] y el bucle no terminaba
+    pieces = [{"nombre": "A", "width": 20, "height": 20, "cantidad": 4, "gabinete_id": 1}]
+    monkeypatch.setattr(NestingEngine, "_match_placement", lambda *args, **kwargs: None)
+    with pytest.raises(RuntimeError):
+        nest_min_cost(pieces, [Sheet(96.5, 48.5, price=60), Sheet(48.5, 48.5, price=35)])
+
+
+def _kitchen(rnd, cabinets=8):
+    """Piezas de varios gabinetes en dos materiales, como las de ``load_pieces``."""
+    pieces = []
+    for cabinet in range(cabinets):
+        for i in range(rnd.randint(2, 5)):
+            pieces.append({"nombre": f"P{i}", "width": rnd.choice([12, 23.5, 30, 40]),
+                           "height": rnd.choice([4, 10, 23, 30]), "cantidad": rnd.randint(1, 3),
+                           "gabinete_id": cabinet, "material": rnd.choice(["MDF", "Triplay"]), "grosor": 0.75})
+    return pieces
+
+
+def _placed_multiset(result):
+    return Counter((p[4], p[5], p[6], p[8]) for panel in result.panel_pieces for p in panel)
+
+
+def _requested_multiset(pieces):
+    counts = Counter()
+    for piece in pieces:
+        counts[(piece['width'], piece['height'], piece['nombre'], piece['gabinete_id'])] += piece.get('cantidad', 1)
+    return counts
+
+
+def test_reanidado_conserva_paneles_y_piezas():
+    rnd = random.Random(19)
+    pieces = _kitchen(rnd)
+    previous = nest_by_material([dict(piece) for piece in pieces], Sheet(), NestOptions(), workers=1)
+
+    # Quitar un gabinete, añadir otro y volver a anidar solo lo afectado
+    changed = [piece for piece in pieces if piece['gabinete_id'] != 3] + _kitchen(random.Random(23), 1)
+    changed[-1]['gabinete_id'] = 99
+    result = renest(previous, [dict(piece) for piece in changed], Sheet(), NestOptions())
+
+    kept = result.variant['paneles_conservados']
+    assert kept and result.variant['paneles_reempacados'] > 0
+    for i, old_idx in enumerate(kept):
+        assert result.panel_pieces[i] == previous.panel_pieces[old_idx]
+        assert result.panel_materials[i] == previous.panel_materials[old_idx]
+        assert all(p[8] != 3 for p in result.panel_pieces[i])
+    assert _placed_multiset(result) == _requested_multiset(changed)
+    assert len(result.panel_materials) == result.panel_count
+
+
+def test_reanidado_sin_cambios_conserva_todo():
+    pieces = _kitchen(random.Random(29))
+    previous = nest_by_material([dict(piece) for piece in pieces], Sheet(), NestOptions(), workers=1)
+    result = renest(previous, [dict(piece) for piece in pieces], Sheet(), NestOptions())
+    assert result.variant['paneles_conservados'] == list(range(previous.panel_count))
+    assert result.panel_pieces == previous.panel_pieces
+
+
+def test_optimizador_cancelado_queda_marcado():
+    pieces = _random_pieces(random.Random(31))
+    stopped = optimize(pieces, Sheet(), NestOptions(), time_budget=5, cancel=lambda: True)
+    assert stopped.variant['cancelado']
+    assert stopped.piece_count == count_pieces(pieces)
+    finished = optimize(pieces, Sheet(), NestOptions(), time_budget=0.05)
+    assert 'cancelado' not in finished.variant
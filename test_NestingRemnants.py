@@ -0,0 +1,120 @@
+"""Pruebas de NestingRemnants y de ``fill_remnants``::
+
+    python -m pytest -q test_NestingRemnants.py
+"""
+from collections import Counter
+import os
+import random
+
+import pytest
+
+import NestingEngine
+import NestingRemnants
+from NestingEngine import Sheet, NestOptions, fill_remnants, nest_by_material, to_ticks
+from NestingRemnants import RemnantStore, panel_remnants
+
+
+def _store(tmp_path, rnd, count=200):
+    store = RemnantStore(str(tmp_path / "retazos.json"))
+    for _ in range(count):
+        store.add(rnd.choice(["MDF", "Triplay"]), rnd.choice([0.5, 0.75]),
+                  rnd.randint(6, 96), rnd.randint(6, 48))
+    return store
+
+
+def test_candidatos_por_busqueda_binaria(tmp_path):
+    rnd = random.Random(2)
+    store = _store(tmp_path, rnd)
+    for remnant_id in rnd.sample(sorted(store.remnants), 50):
+        store.remove(remnant_id)
+    assert len(store) == 150
+    for key in [("MDF", 0.5), ("MDF", 0.75), ("Triplay", 0.75), ("Otro", 1)]:
+        for min_side in (0, 6, 12.5, 30, 48, 49):
+            expected = {remnant.id for remnant in store.remnants.values()
+                        if remnant.key == key and min(remnant.width, remnant.height) >= min_side}
+            found = store.candidates(key, min_side)
+            assert {remnant.id for remnant in found} == expected
+            areas = [remnant.width * remnant.height for remnant in found]
+            assert areas == sorted(areas, reverse=True)
+
+
+def test_guardar_y_cargar(tmp_path):
+    store = _store(tmp_path, random.Random(4), count=20)
+    store.save()
+    loaded = RemnantStore(store.path)
+    assert loaded.remnants == store.remnants
+    assert loaded.index == store.index
+    assert loaded.add("MDF", 0.75, 10, 10) not in store.remnants
+
+
+def test_escritura_atomica(tmp_path, monkeypatch):
+    store = _store(tmp_path, random.Random(6), count=5)
+    store.save()
+    with open(store.path) as file:
+        before = file.read()
+
+    def broken_dump(data, file, **kwargs):
+        file.write('{"retazos": [')
+        raise OSError("disco lleno")
+
+    store.add("MDF", 0.75, 30, 30)
+    monkeypatch.setattr(NestingRemnants.json, "dump", broken_dump)
+    store.save()
+    with open(store.path) as file:
+        assert file.read() == before
+    assert os.listdir(tmp_path) == ["retazos.json"]
+
+
+def test_sobrantes_de_un_panel():
+    width, height = to_ticks(96.5), to_ticks(48.5)
+    # Un panel vacío deja la lámina entera
+    assert panel_remnants([], width, height) == [(96.5, 48.5)]
+    # Una pieza en la esquina deja la franja derecha y la de abajo
+    placement = (0, 0, to_ticks(40), to_ticks(20), 40, 20, "A", False, 1)
+    remnants = panel_remnants([placement], width, height)
+    assert remnants and all(min(w, h) >= NestingRemnants.LADO_MINIMO_RETAZO for w, h in remnants)
+    assert sum(w * h for w, h in remnants) <= 96.5 * 48.5 - 40 * 20
+
+
+def _pieces(rnd):
+    return [{"nombre": f"P{i}", "width": rnd.choice([8, 12, 23.5, 30, 60]), "height": rnd.choice([6, 10, 23]),
+             "cantidad": rnd.randint(1, 4), "gabinete_id": i % 3, "girable": rnd.random() < 0.3}
+            for i in range(10)]
+
+
+def test_llenar_retazos_conserva_piezas():
+    rnd = random.Random(8)
+    for _ in range(5):
+        pieces = _pieces(rnd)
+        remnants = [Sheet(rnd.randint(20, 70), rnd.randint(12, 40), remnant=str(i)) for i in range(4)]
+        used, rest = fill_remnants([dict(piece) for piece in pieces], remnants)
+
+        placed = Counter((p[6], p[8]) for panel in used.panel_pieces for p in panel)
+        placed.update({(piece['nombre'], piece['gabinete_id']): piece['cantidad'] for piece in rest})
+        expected = Counter()
+        for piece in pieces:
+            expected[(piece['nombre'], piece['gabinete_id'])] += piece['cantidad']
+        assert placed == expected
+
+        # Cada retazo se usa como mucho una vez y las piezas caben en él
+        ids = [sheet.remnant for sheet in used.panel_sheets]
+        assert len(ids) == len(set(ids)) == used.panel_count
+        for panel, sheet in zip(used.panel_pieces, used.panel_sheets):
+            for x, y, pw, ph, *_ in panel:
+                assert x + pw <= to_ticks(sheet.width) and y + ph <= to_ticks(sheet.height)
+
+
+def test_retazos_antes_que_laminas_nuevas():
+    pieces = [{"nombre": "A", "width": 20, "height": 10, "cantidad": 6, "gabinete_id": 1}]
+    remnant = Sheet(50, 30, remnant="7")
+    result = nest_by_material([dict(piece) for piece in pieces], Sheet(), NestOptions(), workers=1,
+                              remnants={NestingEngine.material_key({}): [remnant]})
+    assert result.panel_sheets[0].remnant == "7"
+    assert sum(len(panel) for panel in result.panel_pieces) == 6
+
+
+def test_llenar_retazos_falla_si_una_colocacion_no_tiene_pieza(monkeypatch):
+    pieces = [{"nombre": "A", "width": 20, "height": 10, "cantidad": 3, "gabinete_id": 1}]
+    monkeypatch.setattr(NestingEngine, "_match_placement", lambda *args, **kwargs: None)
+    with pytest.raises(RuntimeError):
+        fill_remnants(pieces, [Sheet(50, 30, remnant="1")])